@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+取り込み層・キャッシュ層の負荷試験（合成フィード使用）
+記事件数ごとに次のシナリオを実行し、処理件数・スループット・メモリピーク（tracemalloc）を記録する
+
+- parse: RSS XML の解析（feedparser → 配信日時の解析 → RssEntry）
+- process_cold: process_rss_entry（空のキャッシュ、URL解決はローカルで置き換え）
+- process_warm: 同じエントリをもう一度（キャッシュ済み）
+- collect: collect_news_from_rss（ローカルスタブからHTTPで取得、処理上限 MAX_URL_PROCESS あり）
+- poll_cycle: 常駐モードの2回目以降のポーリング（process_* のキャッシュ・URL索引を保持したまま、
+  新規記事なしで poll_feeds_once）、URL解決は起きずフィードの取得・パース（parse）とほぼ同じ時間になる
+- cache_save / cache_load / cache_clean: 全記事を載せたキャッシュの保存・読み込み・クリーニング
+
+process_* は --max-seconds で打ち切り、打ち切るまでに処理した件数で評価する
+tracemalloc は計測対象の処理を遅くするため、スループットだけを見る場合は --no-tracemalloc
+
+使い方:
+    python benchmarks/bench_ingestion.py [--entries 10000,100000] [--duplicate-rate 0.3] ...
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_pipeline import prepare_run_dir
+from offline_backends import RssStubServer
+from synthetic_feeds import (
+    SyntheticFeedGenerator, resolve_synthetic_url, add_profile_arguments, profile_from_args)
+
+SCENARIOS = ['parse', 'process_cold', 'process_warm', 'collect', 'poll_cycle',
+             'cache_save', 'cache_load', 'cache_clean']
+
+# 本体のキャッシュファイル（実行ディレクトリ内）
+CACHE_FILE = '.taiwan_stock_news_cache_v5.json'
+
+# シナリオ結果に含める STATS のカウンタ
+REPORTED_STATS = ['cache_hit', 'cache_miss', 'sns_domain_excluded', 'unknown_publisher_excluded',
+                  'duplicate_excluded', 'near_duplicate_collapsed']
+
+
+def empty_cache():
+    return {'news': {}, 'topics': {}, 'relevance': {}, 'aux': {}}
+
+
+def measure(scenario, func, trace=True):
+    """
+    シナリオを1回実行して計測（func は処理件数を返す、ログは抑制）
+    """
+    import taiwan_stock_news_system_v5 as system
+
+    gc.collect()
+    stats_before = dict(system.STATS)
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        items = func()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'scenario': scenario,
+        'items': items,
+        'elapsed_sec': round(elapsed, 3),
+        'items_per_sec': round(items / elapsed, 1) if elapsed > 0 else None,
+        'peak_mb': round(peak / 1024 / 1024, 2) if peak is not None else None,
+        'stats': {key: system.STATS.get(key, 0) - stats_before.get(key, 0)
+                  for key in REPORTED_STATS if system.STATS.get(key, 0) != stats_before.get(key, 0)}
+    }
+
+
+def parse_feeds(xml_feeds):
+    """collect_news_from_rss と同じ手順でRSSを解析（日付フィルタなし）"""
+    import feedparser
+    from news_record import RssEntry
+    from taiwan_stock_news_system_v5 import parse_published, TW_TZ
+
+    entries = []
+    for xml in xml_feeds:
+        for entry in feedparser.parse(xml).entries:
+            pub_date = None
+            if "published" in entry:
+                try:
+                    pub_date = parse_published(entry.published).astimezone(TW_TZ)
+                except BaseException:
+                    pass
+            entries.append(RssEntry.from_feedparser(entry, pub_date))
+    return entries
+
+
+def process_entries(entries, cache, max_seconds):
+    """process_rss_entry を順に実行（max_seconds で打ち切り）、処理件数を返す"""
+    from taiwan_stock_news_system_v5 import process_rss_entry
+
+    stop_at = time.perf_counter() + max_seconds if max_seconds else None
+    for count, entry in enumerate(entries, 1):
+        process_rss_entry(entry, cache)
+        if stop_at and time.perf_counter() > stop_at:
+            return count
+    return len(entries)
+
+
+def build_full_cache(entries):
+    """
+    全エントリを載せたキャッシュを直接作成（process_rss_entry の打ち切りに左右されないように）
+    SNS・出典不明の除外は process_rss_entry と同じ
+    """
+    from datetime import datetime
+    from news_record import NewsArticle
+    from snippet_normalizer import normalize_snippet, SNIPPET_VERSION
+    import taiwan_stock_news_system_v5 as system
+
+    cache = empty_cache()
+    cached_at = datetime.now(system.TW_TZ).isoformat()
+    for entry in entries:
+        final_url = resolve_synthetic_url(entry.link)
+        if system.is_sns_domain(final_url):
+            continue
+        publisher = system.extract_publisher_from_url(final_url) or entry.source_title
+        if not publisher:
+            continue
+        pub_date = entry.pub_date or datetime.now(system.TW_TZ)
+        snippet, snippet_links = normalize_snippet(entry.summary)
+        signature = system.generate_article_signature(entry.title, publisher, pub_date, snippet)
+        cache['news'][signature] = NewsArticle(
+            title=entry.title, url=final_url, publisher=publisher, date=pub_date.isoformat(),
+            snippet=snippet, signature=signature, cached_at=cached_at,
+            snippet_links=snippet_links, snippet_version=SNIPPET_VERSION)
+    return cache
+
+
+def run_size(entry_count, profile, args):
+    """記事件数 entry_count で全シナリオを実行"""
+    import taiwan_stock_news_system_v5 as system
+
+    feeds = max(1, entry_count // profile['items_per_feed'])
+    generator = SyntheticFeedGenerator(**dict(profile, feeds=feeds))
+    stub = RssStubServer(renderer=generator.render_feed).start()
+    generator.base_url = stub.base_url
+    trace = not args.no_tracemalloc
+    selected = [name for name in args.scenarios.split(',') if name]
+
+    rows = []
+    state = {}
+    try:
+        xml_feeds = [generator.render_feed_index(i) for i in range(feeds)]
+
+        def parse():
+            state['entries'] = parse_feeds(xml_feeds)
+            return len(state['entries'])
+
+        # 後続シナリオの入力なので parse は常に実行する
+        rows.append(measure('parse', parse, trace))
+        del xml_feeds
+        entries = state['entries']
+
+        def process():
+            return process_entries(entries, state.setdefault('cache', empty_cache()), args.max_seconds)
+
+        def collect():
+            return len(system.collect_news_from_rss(
+                days=args.collect_days, cache=empty_cache(), feed_plan=generator.feed_plan()))
+
+        def poll_cycle():
+            # 1回目（保持中の記事の作成）は計測前に済ませる
+            system.poll_feeds_once(state['cache'], state['store'], {'feeds': {}},
+                                   {'enabled': False}, generator.feed_plan(), args.collect_days)
+            return len(state['store'])
+
+        def cache_save():
+            system.save_cache(state['full_cache'])
+            return len(state['full_cache']['news'])
+
+        def cache_load():
+            state['loaded'] = system.load_cache()
+            return len(state['loaded']['news'])
+
+        def cache_clean():
+            return len(system.clean_cache(state['loaded'])['news'])
+
+        scenarios = {
+            'process_cold': process,
+            'process_warm': process,
+            'collect': collect,
+            'poll_cycle': poll_cycle,
+            'cache_save': cache_save,
+            'cache_load': cache_load,
+            'cache_clean': cache_clean,
+        }
+        for name in SCENARIOS[1:]:
+            if name not in selected:
+                continue
+            if name == 'cache_save':
+                state['full_cache'] = build_full_cache(entries)
+            if name == 'poll_cycle':
+                if 'cache' not in state:
+                    process_entries(entries, state.setdefault('cache', empty_cache()), 0)
+                state['store'] = {}
+                with redirect_stdout(io.StringIO()):
+                    system.poll_feeds_once(
+                        state['cache'], state['store'], {'feeds': {}}, {'enabled': False},
+                        generator.feed_plan(), args.collect_days)
+            if name in ('cache_load', 'cache_clean') and not os.path.exists(CACHE_FILE):
+                continue
+            if name == 'cache_clean' and 'loaded' not in state:
+                state['loaded'] = system.load_cache()
+            rows.append(measure(name, scenarios[name], trace))
+            if name == 'cache_save':
+                del state['full_cache']
+    finally:
+        stub.stop()
+
+    for row in rows:
+        row['entries'] = entry_count
+    if os.path.exists(CACHE_FILE):
+        rows.append({'scenario': 'cache_file', 'entries': entry_count,
+                     'bytes': os.path.getsize(CACHE_FILE)})
+    return rows
+
+
+def print_table(rows):
+    print(f"{'記事数':>8} {'シナリオ':<14} {'処理件数':>9} {'時間(秒)':>9} {'件/秒':>10} "
+          f"{'ピーク(MB)':>11}  カウンタ")
+    for row in rows:
+        if row['scenario'] == 'cache_file':
+            print(f"{row['entries']:>8} {'(cache size)':<14} {'':>9} {'':>9} {'':>10} "
+                  f"{row['bytes'] / 1024 / 1024:>11.2f}")
+            continue
+        peak = f"{row['peak_mb']:.2f}" if row['peak_mb'] is not None else '-'
+        rate = f"{row['items_per_sec']:.1f}" if row['items_per_sec'] is not None else '-'
+        print(f"{row['entries']:>8} {row['scenario']:<14} {row['items']:>9} "
+              f"{row['elapsed_sec']:>9.2f} {rate:>10} {peak:>11}  {row['stats'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="取り込み層・キャッシュ層の負荷試験（合成フィード）")
+    parser.add_argument('--entries', default='10000,100000', help="記事件数（カンマ区切り）")
+    add_profile_arguments(parser)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS[1:]),
+                        help=f"実行するシナリオ（parse は常に実行）: {','.join(SCENARIOS[1:])}")
+    parser.add_argument('--max-seconds', type=float, default=60,
+                        help="process_* シナリオの打ち切り時間（秒、0で打ち切りなし）")
+    parser.add_argument('--collect-days', type=int, default=7, help="collect シナリオの収集日数")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="メモリピークを計測しない")
+    parser.add_argument('--output', help="結果をJSONで保存するパス")
+    parser.add_argument('--keep', action='store_true', help="実行ディレクトリを残す")
+    args = parser.parse_args()
+
+    try:
+        profile = profile_from_args(args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    # キャッシュファイル等は一時ディレクトリに書く（本体は import 時に stocks.json を読む）
+    run_dir = tempfile.mkdtemp(prefix="bench_ingestion_")
+    original_dir = os.getcwd()
+    rows = []
+    try:
+        prepare_run_dir(run_dir, 4)
+        os.chdir(run_dir)
+        import taiwan_stock_news_system_v5 as system
+        system.resolve_final_url = resolve_synthetic_url
+
+        for entry_count in [int(value) for value in args.entries.split(',') if value]:
+            print(f"⏱️ {entry_count}件で計測中...")
+            if os.path.exists(CACHE_FILE):
+                os.remove(CACHE_FILE)
+            rows.extend(run_size(entry_count, profile, args))
+    finally:
+        os.chdir(original_dir)
+        if args.keep:
+            print(f"  📁 実行ディレクトリ: {run_dir}")
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    print()
+    print(f"プロファイル: {json.dumps(profile, ensure_ascii=False)}")
+    print_table(rows)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'profile': profile, 'rows': rows}, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
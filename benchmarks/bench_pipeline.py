@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配信パイプラインのオフラインベンチマーク
+Google News / OpenAI / yfinance / SendGrid をローカルのスタブ・フェイクに置き換えて main() を実行し、
+銘柄数ごとの全体時間と段階ごとの時間（run_report.json）を比較する
+
+- 銘柄数ごとに一時ディレクトリ・子プロセスで実行（キャッシュ・統計は毎回空から）
+- 4銘柄は stocks.json そのもの、それ以上は stocks.json の銘柄を雛形に合成銘柄を追加
+- 実行期限（run_deadline_policy）は無効化して、縮退せずに最後まで処理させる
+- 送信は SendGridStandInServer（SENDGRID_API_HOST）で受け、sendgrid クライアントの経路も通す
+- --profiles を指定すると、銘柄を分け合う配信プロファイル（宛先 --recipients 件ずつ）で配信する
+
+使い方:
+    python benchmarks/bench_pipeline.py [--stocks 4,100,1000] [--llm-latency 0.05] ...
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+# 実行ディレクトリにコピーする設定ファイル
+CONFIG_FILES = ['twse_calendar.json', 'system_config.json']
+# 子プロセスが実行ディレクトリに書き出す計測結果
+RESULT_FILE = 'bench_result.json'
+
+
+def build_stocks(count):
+    """stocks.json の銘柄を雛形に、指定数の銘柄プロファイルを作成"""
+    with open(os.path.join(REPO_ROOT, 'stocks.json'), 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    base = {stock_id: info for stock_id, info in data['stocks'].items()
+            if not stock_id.startswith('_')}
+    templates = list(base.values())
+
+    stocks = dict(list(base.items())[:count])
+    for i in range(len(stocks), count):
+        template = templates[i % len(templates)]
+        name = f"合成{i:04d}號"
+        stocks[str(10000 + i)] = {
+            'name': name,
+            'business_type': template.get('business_type', ''),
+            'feed_queries': {
+                locale: f"{name} OR SYN{i:04d}" for locale in template.get('feed_queries', {})},
+            'drivers': template.get('drivers', []),
+            'sectors': template.get('sectors', [])
+        }
+    data['stocks'] = stocks
+    return data
+
+
+def build_delivery_profiles(stock_ids, profile_count, recipients):
+    """
+    配信プロファイルを合成（銘柄を順に割り振り、隣のプロファイルと1銘柄ずつ重ねる）
+    最後のプロファイルは全銘柄を受け取る
+    """
+    profiles = []
+    size = max(1, len(stock_ids) // profile_count)
+    for i in range(profile_count):
+        stocks = 'all' if i == profile_count - 1 else stock_ids[i * size:(i + 1) * size + 1]
+        profiles.append({
+            'name': f"watchlist{i:02d}",
+            'recipients': [f"reader{i:02d}-{r:03d}@example.com" for r in range(recipients)],
+            'stocks': stocks
+        })
+    return {'profiles': profiles}
+
+
+def prepare_run_dir(run_dir, stock_count, profile_count=0, recipients=1):
+    """実行ディレクトリに設定ファイルと銘柄プロファイル（配信プロファイル）を用意"""
+    for name in CONFIG_FILES:
+        shutil.copy(os.path.join(REPO_ROOT, name), run_dir)
+
+    stocks = build_stocks(stock_count)
+    with open(os.path.join(run_dir, 'stocks.json'), 'w', encoding='utf-8') as f:
+        json.dump(stocks, f, ensure_ascii=False, indent=2)
+
+    if profile_count:
+        with open(os.path.join(run_dir, 'delivery_profiles.json'), 'w', encoding='utf-8') as f:
+            json.dump(build_delivery_profiles(list(stocks['stocks']), profile_count, recipients),
+                      f, ensure_ascii=False, indent=2)
+
+    config_path = os.path.join(run_dir, 'system_config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    config['run_deadline_policy'] = dict(config.get('run_deadline_policy', {}), enabled=False)
+    config['metrics_export'] = {'enabled': True, 'textfile_path': 'metrics.prom'}
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def run_worker(args):
+    """
+    子プロセス側: スタブ・フェイクを組み込んで main() を1回実行し、結果をJSONで出力
+    （カレントディレクトリは prepare_run_dir 済みの実行ディレクトリ）
+    """
+    sys.path.insert(0, REPO_ROOT)
+    sys.path.insert(0, BENCH_DIR)
+    from offline_backends import RssStubServer, FakeOpenAI, FakeTicker, SendGridStandInServer
+
+    stub = RssStubServer(
+        items_per_feed=args.items_per_feed,
+        feed_latency=args.feed_latency,
+        redirect_latency=args.redirect_latency).start()
+    mail = SendGridStandInServer(latency=args.mail_latency).start()
+
+    # フィードURLをスタブに向けてから本体を import（FEED_PLAN は import 時に生成される）
+    import feed_plan
+    feed_plan.GOOGLE_NEWS_RSS = stub.base_url + "/rss/search?q={query}&{locale_params}"
+
+    import llm_client
+    import stock_price_analyzer
+    import taiwan_stock_news_system_v5 as system
+
+    fake_llm = FakeOpenAI(latency=args.llm_latency)
+    llm_client.set_openai_client(fake_llm)
+    stock_price_analyzer.get_ticker = lambda symbol: FakeTicker(symbol, latency=args.price_latency)
+    os.environ['SENDGRID_API_HOST'] = mail.base_url
+    os.environ['SENDGRID_API_KEY'] = 'SG.bench'
+    os.environ['RECIPIENT_EMAIL'] = 'bench@example.com'
+    os.environ['SENDER_EMAIL'] = 'digest@example.com'
+
+    log = io.StringIO()
+    started = time.perf_counter()
+    try:
+        if args.verbose:
+            system.main()
+        else:
+            with redirect_stdout(log):
+                system.main()
+    finally:
+        stub.stop()
+        mail.stop()
+    elapsed = time.perf_counter() - started
+
+    with open('run_report.json', 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    # 配信プロファイルごとのプレビュー（email_preview*.html）の合計
+    html_bytes = sum(os.path.getsize(name) for name in os.listdir('.')
+                     if name.startswith('email_preview') and name.endswith('.html'))
+
+    # 計測結果はファイルで親プロセスに渡す（--verbose では標準出力が main() のログになるため）
+    with open(RESULT_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            'stocks': len([s for s in system.STOCKS if not s.startswith('_')]),
+            'feeds': len(system.FEED_PLAN),
+            'elapsed_sec': round(elapsed, 3),
+            'stages': report['stages'],
+            'delivered_stocks': report['delivered_stocks'],
+            'llm_calls': fake_llm.calls,
+            'mails_sent': len(mail.sent),
+            'recipients': len(mail.recipients()),
+            'delivery': report['delivery']['status'],
+            'html_bytes': html_bytes,
+            'stub_requests': stub.requests
+        }, f, ensure_ascii=False)
+
+
+def run_scale(stock_count, args):
+    """親プロセス側: 一時ディレクトリを用意して子プロセスで1回実行"""
+    run_dir = tempfile.mkdtemp(prefix=f"bench_pipeline_{stock_count}_")
+    try:
+        prepare_run_dir(run_dir, stock_count, args.profiles, args.recipients)
+        command = [
+            sys.executable, os.path.abspath(__file__), '--worker',
+            '--items-per-feed', str(args.items_per_feed),
+            '--feed-latency', str(args.feed_latency),
+            '--redirect-latency', str(args.redirect_latency),
+            '--llm-latency', str(args.llm_latency),
+            '--price-latency', str(args.price_latency),
+            '--mail-latency', str(args.mail_latency)]
+        if args.verbose:
+            command.append('--verbose')
+        env = {key: value for key, value in os.environ.items()
+               if key not in ('OPENAI_API_KEY', 'SENDGRID_API_KEY', 'METRICS_TEXTFILE_PATH')}
+        try:
+            result = subprocess.run(
+                command, cwd=run_dir, env=env, capture_output=not args.verbose, text=True,
+                timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            print(f"  ⏳ {stock_count}銘柄: {args.timeout:.0f}秒以内に終わらなかったため打ち切りました")
+            return {'stocks': stock_count, 'timeout_sec': args.timeout}
+        if result.returncode != 0:
+            raise RuntimeError(f"{stock_count}銘柄の実行に失敗しました:\n{result.stderr or ''}")
+        with open(os.path.join(run_dir, RESULT_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        if args.keep:
+            print(f"  📁 実行ディレクトリ: {run_dir}")
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def print_table(rows):
+    stages = []
+    for row in rows:
+        for stage in row.get('stages', {}):
+            if stage not in stages:
+                stages.append(stage)
+
+    header = f"{'銘柄数':>6} {'フィード':>8} {'全体(秒)':>9} " + " ".join(
+        f"{stage + '(秒)':>12}" for stage in stages) + \
+        f" {'LLM':>6} {'配信銘柄':>8} {'HTML(KB)':>9} {'送信':>5} {'宛先':>5}"
+    print(header)
+    for row in rows:
+        if 'timeout_sec' in row:
+            print(f"{row['stocks']:>6} {'-':>8} {'>' + str(int(row['timeout_sec'])):>9}  （打ち切り）")
+            continue
+        print(f"{row['stocks']:>6} {row['feeds']:>8} {row['elapsed_sec']:>9.2f} " + " ".join(
+            f"{row['stages'].get(stage, {}).get('wall_sec', 0):>12.2f}" for stage in stages) +
+            f" {row['llm_calls']:>6} {row['delivered_stocks'] or 0:>8} {row['html_bytes'] / 1024:>9.1f}"
+            f" {row['mails_sent']:>5} {row['recipients']:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="配信パイプラインのオフラインベンチマーク")
+    parser.add_argument('--stocks', default='4,100,1000', help="銘柄数（カンマ区切り）")
+    parser.add_argument('--items-per-feed', type=int, default=10, help="フィードあたりの記事数")
+    parser.add_argument('--feed-latency', type=float, default=0.02, help="フィード応答の遅延（秒）")
+    parser.add_argument('--redirect-latency', type=float, default=0.005, help="リダイレクト応答の遅延（秒）")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="LLM応答の遅延（秒）")
+    parser.add_argument('--price-latency', type=float, default=0.01, help="株価取得の遅延（秒）")
+    parser.add_argument('--mail-latency', type=float, default=0.05, help="メール送信の遅延（秒）")
+    parser.add_argument('--profiles', type=int, default=0,
+                        help="配信プロファイル数（0 なら RECIPIENT_EMAIL 宛てに全銘柄）")
+    parser.add_argument('--recipients', type=int, default=1, help="配信プロファイルあたりの宛先数")
+    parser.add_argument('--timeout', type=float, help="銘柄数ごとの実行時間の上限（秒）")
+    parser.add_argument('--output', help="結果をJSONで保存するパス")
+    parser.add_argument('--keep', action='store_true', help="実行ディレクトリを残す")
+    parser.add_argument('--verbose', action='store_true', help="main() のログを表示")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    rows = []
+    for stock_count in [int(value) for value in args.stocks.split(',') if value]:
+        print(f"⏱️ {stock_count}銘柄で計測中...")
+        try:
+            rows.append(run_scale(stock_count, args))
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return 1
+
+    print()
+    print_table(rows)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTMLメールレンダリングのベンチマーク
+合成した銘柄結果（銘柄数 × クラスタ × 補足ニュース）で次を比較し、銘柄数に対して線形に伸びるかを確認する
+
+- join: generate_html_email（断片を1回で連結して文字列を返す）
+- stream: write_html_email（断片ごとにファイルへ書き出す、本文全体を保持しない）
+- stream_cached: stream と同じだが、銘柄セクションキャッシュが温まった状態（再送・複数宛先）
+
+join / stream はセクションキャッシュを空にしてから計測する
+
+それぞれ経過時間・1銘柄あたりの時間・メモリピーク（tracemalloc）を記録し、
+join と stream の出力が一致することも確認する
+
+使い方:
+    python benchmarks/bench_render.py [--stocks 100,300,1000] [--clusters 3] [--supplementary 2]
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from email_section_cache import SECTION_CACHE
+from email_template_v5 import generate_html_email, write_html_email
+
+TAIPEI_TIME = '2026-01-22 07:30'
+
+
+def build_stock_results(stock_count, clusters=3, supplementary=2):
+    """テンプレートに渡す銘柄結果（build_stock_result と同じ項目）を合成"""
+    results = {}
+    for i in range(stock_count):
+        stock_id = str(10000 + i)
+        news = []
+        for c in range(clusters):
+            news.append({
+                'title': f"合成{i:04d}號 營收創新高 第{c}則",
+                'title_ja': f"合成{i:04d}號 売上高が過去最高 その{c}",
+                'link': f"https://news.cnyes.com/news/id/{i}{c:02d}",
+                'publisher': '鉅亨網',
+                'published': '2026-01-21 18:30',
+                'relevance_score': 8,
+                'relevance_reason': '月次売上の発表',
+                'cluster_theme': f"論点{c + 1}",
+                'representative_reason': '具体的な数値を含む一次報道',
+                'supplementary_news': [{
+                    'title': f"合成{i:04d}號 補足{c}-{s}",
+                    'title_ja': f"合成{i:04d}號 補足記事 {c}-{s}",
+                    'link': f"https://www.ctee.com.tw/news/{i}{c:02d}{s}"
+                } for s in range(supplementary)],
+                'supplementary_perspectives': ['市場反応'] * supplementary
+            })
+        results[stock_id] = {
+            'stock_info': {'name': f"合成{i:04d}號", 'business_type': '半導体'},
+            'topic': f"合成{i:04d}號: 月次売上と先端パッケージの増産",
+            'news': news,
+            'is_single_event': i % 10 == 0,
+            'event_description': '法説会' if i % 10 == 0 else None
+        }
+    return results
+
+
+def measure(func, setup):
+    """経過時間とメモリピーク（tracemalloc は別計測で、時間には含めない）"""
+    setup()
+    gc.collect()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+
+    setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_size(stock_count, args, work_dir):
+    results = build_stock_results(stock_count, args.clusters, args.supplementary)
+    path = os.path.join(work_dir, f"email_{stock_count}.html")
+
+    def join():
+        return generate_html_email(results, TAIPEI_TIME)
+
+    def stream():
+        with open(path, 'w', encoding='utf-8') as f:
+            write_html_email(results, TAIPEI_TIME, f)
+
+    def cold():
+        SECTION_CACHE.clear()
+
+    def warm():
+        SECTION_CACHE.clear()
+        generate_html_email(results, TAIPEI_TIME)
+
+    rows = []
+    for name, func, setup in [('join', join, cold), ('stream', stream, cold),
+                              ('stream_cached', stream, warm)]:
+        elapsed, peak = measure(func, setup)
+        rows.append({
+            'stocks': stock_count,
+            'mode': name,
+            'elapsed_sec': round(elapsed, 4),
+            'ms_per_stock': round(elapsed * 1000 / stock_count, 4),
+            'peak_mb': round(peak / 1024 / 1024, 2)
+        })
+
+    html = join()
+    with open(path, 'r', encoding='utf-8') as f:
+        if f.read() != html:
+            raise RuntimeError(f"{stock_count}銘柄: join と stream の出力が一致しません")
+    for row in rows:
+        row['html_mb'] = round(len(html.encode('utf-8')) / 1024 / 1024, 2)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTMLメールレンダリングのベンチマーク")
+    parser.add_argument('--stocks', default='100,300,1000', help="銘柄数（カンマ区切り）")
+    parser.add_argument('--clusters', type=int, default=3, help="銘柄あたりのクラスタ数")
+    parser.add_argument('--supplementary', type=int, default=2, help="クラスタあたりの補足ニュース数")
+    parser.add_argument('--output', help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="bench_render_") as work_dir:
+        for stock_count in [int(value) for value in args.stocks.split(',') if value]:
+            print(f"⏱️ {stock_count}銘柄で計測中...")
+            try:
+                rows.extend(run_size(stock_count, args, work_dir))
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                return 1
+
+    print()
+    print(f"{'銘柄数':>6} {'方式':<13} {'時間(秒)':>9} {'ms/銘柄':>9} {'ピーク(MB)':>11} {'HTML(MB)':>9}")
+    for row in rows:
+        print(f"{row['stocks']:>6} {row['mode']:<13} {row['elapsed_sec']:>9.3f} "
+              f"{row['ms_per_stock']:>9.3f} {row['peak_mb']:>11.2f} {row['html_mb']:>9.2f}")
+
+    # 線形性: 1銘柄あたりの時間が銘柄数によらずほぼ一定か（最大 / 最小）
+    for mode in ('join', 'stream', 'stream_cached'):
+        per_stock = [row['ms_per_stock'] for row in rows if row['mode'] == mode]
+        if len(per_stock) > 1 and min(per_stock) > 0:
+            print(f"📏 {mode}: 1銘柄あたりの時間 最大/最小 = {max(per_stock) / min(per_stock):.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果を保存しました: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
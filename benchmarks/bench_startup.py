@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間ベンチマーク
+taiwan_stock_news_system_v5 の import 時間を計測し、起動予算を超えたら失敗する
+
+- APIキーなしのクリーンな子プロセスで import する（import時にクライアントを作らないことの確認）
+- 重い依存（openai, sendgrid, feedparser など）が import 時に読み込まれていないことを確認
+- -X importtime で所要時間の大きいモジュールを表示
+
+使い方:
+    python benchmarks/bench_startup.py [--runs 5] [--budget 0.5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGET_MODULE = "taiwan_stock_news_system_v5"
+
+# import時に読み込まれてはいけない重い依存
+HEAVY_MODULES = [
+    "openai",
+    "sendgrid",
+    "feedparser",
+    "requests",
+    "dateutil",
+    "yfinance",
+    "pandas",
+    "numpy",
+    "tiktoken",
+]
+
+_MEASURE_CODE = f"""
+import json, sys, time
+start = time.perf_counter()
+import {TARGET_MODULE}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+
+def _clean_env():
+    """APIキーを除いた環境変数（キーなしでも import できることを確認するため）"""
+    env = {
+        key: value for key, value in os.environ.items()
+        if key not in ("OPENAI_API_KEY", "SENDGRID_API_KEY", "RECIPIENT_EMAIL")}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def measure_import(python=sys.executable):
+    """子プロセスで1回 import し、(秒, 読み込まれた重い依存) を返す"""
+    import json
+
+    result = subprocess.run(
+        [python, "-c", _MEASURE_CODE],
+        cwd=REPO_ROOT, env=_clean_env(),
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import に失敗しました:\n{result.stderr.strip()}")
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    return data["elapsed"], data["heavy"]
+
+
+def import_time_top(python=sys.executable, top=10):
+    """-X importtime の出力から累積時間の大きいモジュールを返す [(μs, モジュール名)]"""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {TARGET_MODULE}"],
+        cwd=REPO_ROOT, env=_clean_env(),
+        capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative), name.strip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間ベンチマーク")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（中央値を使用）")
+    parser.add_argument("--budget", type=float, default=0.5, help="import時間の予算（秒）")
+    parser.add_argument("--top", type=int, default=10, help="表示するモジュール数")
+    args = parser.parse_args()
+
+    print(f"⏱️ {TARGET_MODULE} の import 時間を計測中... ({args.runs}回)")
+    timings = []
+    heavy = []
+    try:
+        for _ in range(args.runs):
+            elapsed, heavy = measure_import()
+            timings.append(elapsed)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+
+    median = statistics.median(timings)
+    print(f"  中央値: {median * 1000:.1f}ms  (最小 {min(timings) * 1000:.1f}ms / "
+          f"最大 {max(timings) * 1000:.1f}ms)")
+
+    print(f"📊 累積 import 時間の上位{args.top}モジュール:")
+    for cumulative, name in import_time_top(top=args.top):
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"❌ import 時に重い依存が読み込まれています: {', '.join(heavy)}")
+        failed = True
+    if median > args.budget:
+        print(f"❌ 起動予算超過: {median * 1000:.1f}ms > {args.budget * 1000:.0f}ms")
+        failed = True
+
+    if failed:
+        return 1
+    print(f"✅ 起動予算内: {median * 1000:.1f}ms <= {args.budget * 1000:.0f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
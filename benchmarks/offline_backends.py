@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+オフラインベンチマーク用のバックエンド
+- RssStubServer: Google News RSS とリダイレクトを返すローカルHTTPスタブ
+    /rss/search?q=...  記録済みRSS（fixtures/recorded/<キー>.xml）があればそのまま返し、
+                       なければ fixtures のテンプレートからクエリごとに決定的な記事を生成
+    /articles/<id>     302 で /final/<id>（?url= があればそのURL）へリダイレクト（URL解決の経路を通すため）
+- FakeOpenAI: クラスタリング・投資判断補助に決定的なJSONを返す
+- FakeTicker: 営業日ごとの決定的な株価バー（pandas.DataFrame）を返す
+- SendGridStandInServer: SendGrid の /v3/mail/send を受けて 202 を返すローカルHTTPサーバー
+    SENDGRID_API_HOST に base_url を指定すると、本物の sendgrid クライアントがここへ送信する
+    受け取ったリクエスト（personalizations・本文）を記録し、宛先ごとの配信を確認できる
+
+いずれもレイテンシ（秒）を指定でき、実際のAPI待ち時間を模擬できる
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import urlparse, parse_qs, quote_plus
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RECORDED_DIR = os.path.join(FIXTURES_DIR, 'recorded')
+
+# 生成する記事タイトルに含める語（関連性判定・類型判定を通すため業績・需給系の語を混ぜる）
+TITLE_TOPICS = ['營收', 'HBM', '關稅', '法說會', 'CoWoS', '產能', '毛利率', 'AI伺服器', '市況', '股價']
+PUBLISHERS = ['鉅亨網', '工商時報', '經濟日報', 'MoneyDJ理財網', 'TechNews 科技新報']
+
+
+def _digest(text, length=12):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:length]
+
+
+def recorded_feed_key(query, locale_params):
+    """記録済みRSSのファイル名（クエリと地域パラメータのハッシュ）"""
+    return _digest(f"{query}|{locale_params}", 16)
+
+
+def _load_template(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return Template(f.read().strip())
+
+
+class RssStubServer:
+    """Google News RSS とリダイレクトを返すローカルHTTPスタブ（別スレッドで起動）"""
+
+    def __init__(self, items_per_feed=10, feed_latency=0.0, redirect_latency=0.0, now=None,
+                 renderer=None):
+        self.items_per_feed = items_per_feed
+        # renderer(query, locale_params) -> RSS XML（合成フィードなど、既定の生成を差し替える場合）
+        self.renderer = renderer
+        self.feed_latency = feed_latency
+        self.redirect_latency = redirect_latency
+        self.now = now or datetime.now(timezone.utc).replace(microsecond=0)
+        self.channel_template = _load_template('google_news_channel.xml')
+        self.item_template = _load_template('google_news_item.xml')
+        self.requests = {'rss': 0, 'redirect': 0, 'final': 0}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='text/plain', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def _handle(self):
+                parsed = urlparse(self.path)
+                if parsed.path.startswith('/rss/'):
+                    stub._count('rss')
+                    time.sleep(stub.feed_latency)
+                    body = stub.render_feed(parsed.query).encode('utf-8')
+                    self._send(200, body, 'application/rss+xml; charset=utf-8')
+                elif parsed.path.startswith('/articles/'):
+                    stub._count('redirect')
+                    time.sleep(stub.redirect_latency)
+                    article_id = parsed.path.rsplit('/', 1)[-1]
+                    location = parse_qs(parsed.query).get(
+                        'url', [f"{stub.base_url}/final/{article_id}"])[0]
+                    self._send(302, headers={'Location': location})
+                elif parsed.path.startswith('/final/'):
+                    stub._count('final')
+                    self._send(200, b'ok')
+                else:
+                    self._send(404, b'not found')
+
+            do_GET = _handle
+            do_HEAD = _handle
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def render_feed(self, query_string):
+        """クエリのRSSを返す（記録済みがあればそれを再生）"""
+        params = parse_qs(query_string)
+        query = params.get('q', [''])[0]
+        locale_params = '&'.join(
+            f"{key}={value[0]}" for key, value in sorted(params.items()) if key != 'q')
+
+        recorded = os.path.join(RECORDED_DIR, f"{recorded_feed_key(query, locale_params)}.xml")
+        if os.path.exists(recorded):
+            with open(recorded, 'r', encoding='utf-8') as f:
+                return f.read()
+        if self.renderer is not None:
+            return self.renderer(query, locale_params)
+
+        # クエリの先頭語（銘柄名・ドライバー語）を見出しに含める
+        subject = re.split(r'\s+OR\s+|\s+', query.strip())[0] or query
+        items = []
+        for i in range(self.items_per_feed):
+            article_id = _digest(f"{query}|{locale_params}|{i}")
+            publisher = PUBLISHERS[int(article_id[:4], 16) % len(PUBLISHERS)]
+            topic = TITLE_TOPICS[(i + int(article_id[4:8], 16)) % len(TITLE_TOPICS)]
+            items.append(self.item_template.substitute(
+                title=f"{subject} {topic} 動向 #{article_id[:6]}",
+                publisher=publisher,
+                publisher_url=f"https://{_digest(publisher, 8)}.example.com",
+                link=f"{self.base_url}/articles/{article_id}",
+                guid=article_id,
+                pub_date=format_datetime(self.now - timedelta(hours=3 * i), usegmt=True)))
+
+        return self.channel_template.substitute(
+            query=query,
+            query_url=quote_plus(query),
+            build_date=format_datetime(self.now, usegmt=True),
+            items=''.join(items))
+
+
+class _Namespace:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeOpenAI:
+    """OpenAIクライアントの代替（chat.completions.create のみ）"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = _Namespace(completions=_Namespace(create=self.create))
+
+    def create(self, model=None, messages=None, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        prompt = messages[-1]['content'] if messages else ''
+
+        if 'response_format' in kwargs:
+            content = json.dumps({
+                "phase": "レンジ推移",
+                "price_movement": "直近は小幅な値動き",
+                "news_correlation": "ニュースへの反応は限定的",
+                "caution_point": "次回の月次売上発表"
+            }, ensure_ascii=False)
+        else:
+            content = json.dumps(self._clusters(prompt), ensure_ascii=False)
+
+        return _Namespace(
+            choices=[_Namespace(message=_Namespace(content=content))],
+            usage=_Namespace(
+                prompt_tokens=len(prompt) // 2,
+                completion_tokens=len(content) // 2,
+                total_tokens=(len(prompt) + len(content)) // 2))
+
+    @staticmethod
+    def _clusters(prompt):
+        """ニュース番号を3件ずつのクラスタにまとめる（最大3クラスタ）"""
+        indices = [int(number) for number in re.findall(r'^\[(\d+)\]', prompt, re.MULTILINE)]
+        clusters = []
+        for cluster_id, start in enumerate(range(0, len(indices), 3), 1):
+            group = indices[start:start + 3]
+            clusters.append({
+                "cluster_id": cluster_id,
+                "theme": f"論点{cluster_id}",
+                "representative_index": group[0],
+                "representative_reason": "具体的な数値を含む一次報道",
+                "supplementary_indices": group[1:],
+                "supplementary_perspectives": ["市場反応"] * len(group[1:])
+            })
+            if cluster_id == 3:
+                break
+        return {"clusters": clusters, "is_single_event": False, "event_description": None}
+
+
+class FakeTicker:
+    """yfinance.Ticker の代替（history のみ、営業日ごとの決定的な株価）"""
+
+    def __init__(self, symbol, latency=0.0):
+        self.symbol = symbol
+        self.latency = latency
+
+    def history(self, start=None, end=None, **kwargs):
+        import pandas as pd
+        from trading_calendar import is_trading_day
+
+        time.sleep(self.latency)
+        start_day = datetime.strptime(start, '%Y-%m-%d').date()
+        end_day = datetime.strptime(end, '%Y-%m-%d').date()
+        base = 50 + int(_digest(self.symbol, 6), 16) % 900
+
+        days = []
+        day = start_day
+        while day < end_day:
+            if is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+
+        closes = [base * (1 + 0.01 * ((i * 7) % 11 - 5) / 5 + 0.002 * i) for i in range(len(days))]
+        index = pd.DatetimeIndex([pd.Timestamp(day, tz='Asia/Taipei') for day in days])
+        return pd.DataFrame({
+            'Open': closes,
+            'High': [close * 1.01 for close in closes],
+            'Low': [close * 0.99 for close in closes],
+            'Close': closes,
+            'Volume': [1_000_000 + i * 1000 for i in range(len(days))]
+        }, index=index)
+
+
+class SendGridStandInServer:
+    """SendGrid v3 Mail Send API のローカル代替（別スレッドで起動、送信せず 202 を返す）"""
+
+    def __init__(self, latency=0.0, status=202):
+        self.latency = latency
+        self.status = status
+        # 受け取ったリクエストのJSON（受信順）
+        self.sent = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if urlparse(self.path).path != '/v3/mail/send':
+                    status, response = 404, b'{"errors":[{"message":"not found"}]}'
+                else:
+                    time.sleep(stand_in.latency)
+                    with stand_in._lock:
+                        stand_in.sent.append(json.loads(body or b'{}'))
+                    status = stand_in.status
+                    response = b'' if status < 300 else b'{"errors":[{"message":"stand-in error"}]}'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def recipients(self):
+        """受け取った宛先（personalization ごと）→ 件名"""
+        with self._lock:
+            return {to['email']: message.get('subject')
+                    for message in self.sent
+                    for personalization in message.get('personalizations', [])
+                    for to in personalization.get('to', [])}
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Google News 形式の合成RSSジェネレーター（取り込み・キャッシュ層の負荷試験用）
+
+プロファイルで次の性質を制御できる（同じ seed なら常に同じフィードを生成）
+- duplicate_rate: 他フィードと共有する記事の割合（同一リンク・同一内容の完全重複）
+- near_duplicate_rate: 転載記事の割合（見出しを微修正して別媒体から配信）
+- locale_mix: フィードの地域の構成比（zh-TW / en-US / ja）
+- date_spread_days: 配信日時のばらつき（現在から何日前までに分布させるか）
+- sns_share: 最終URLがSNS（YouTube・Threads など）の記事の割合
+- unknown_publisher_share: 最終URLが未知ドメインで <source> もない記事の割合
+
+記事リンクは /articles/<id>?url=<最終URL> の形で、RssStubServer に renderer として渡すと
+リダイレクトで最終URLへ飛ぶ。resolve_synthetic_url で同じ最終URLをHTTPなしで得られる
+
+使い方（ローカルで配信し、フィードURL一覧を表示）:
+    python benchmarks/synthetic_feeds.py --feeds 200 --items-per-feed 100 --duplicate-rate 0.4
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from urllib.parse import urlparse, parse_qs, quote, quote_plus
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from feed_plan import LOCALES
+from offline_backends import RssStubServer, _digest, _load_template
+
+DEFAULT_PROFILE = {
+    "feeds": 50,
+    "items_per_feed": 100,
+    "duplicate_rate": 0.3,
+    "near_duplicate_rate": 0.05,
+    "locale_mix": {"zh-TW": 0.7, "en-US": 0.2, "ja": 0.1},
+    "date_spread_days": 10,
+    "sns_share": 0.05,
+    "unknown_publisher_share": 0.05,
+    "seed": 42
+}
+
+# 共有記事1件あたりの平均出現フィード数（共有プールの大きさを決める）
+SHARED_APPEARANCES = 3
+
+# 既知の媒体（extract_publisher_from_url で出典名が取れるドメイン）
+KNOWN_PUBLISHERS = [
+    ('news.cnyes.com', '鉅亨網'),
+    ('www.ctee.com.tw', '工商時報'),
+    ('money.udn.com', '經濟日報'),
+    ('technews.tw', 'TechNews 科技新報'),
+    ('www.moneydj.com', 'MoneyDJ'),
+    ('www.digitimes.com.tw', 'DIGITIMES'),
+    ('www.cna.com.tw', '中央社 CNA'),
+    ('www.reuters.com', 'Reuters'),
+    ('www.bloomberg.com', 'Bloomberg'),
+    ('www.nikkei.com', '日經中文網'),
+]
+SNS_PUBLISHERS = [
+    ('https://www.youtube.com/watch?v={id}', 'YouTube'),
+    ('https://www.threads.net/@syn/post/{id}', 'Threads'),
+    ('https://www.linkedin.com/posts/{id}', 'LinkedIn'),
+]
+
+# 地域ごとの見出しの語
+TITLE_WORDS = {
+    "zh-TW": (['台積電', '聯發科', '鴻海', '廣達', '日月光'],
+              ['營收', 'HBM', '關稅', '法說會', 'CoWoS', '產能', '毛利率', 'AI伺服器']),
+    "en-US": (['TSMC', 'MediaTek', 'Foxconn', 'Quanta', 'ASE'],
+              ['revenue', 'HBM', 'tariff', 'earnings call', 'CoWoS', 'capacity', 'margin']),
+    "ja": (['TSMC', 'メディアテック', '鴻海', '広達', 'ASE'],
+           ['売上高', 'HBM', '関税', '決算説明会', 'CoWoS', '生産能力', '粗利率']),
+}
+NEAR_DUPLICATE_SUFFIXES = ['（更新）', '（快訊）', ' | 獨家', '（圖）']
+
+
+def resolve_synthetic_url(url, timeout=None):
+    """
+    合成記事リンクの最終URL（resolve_final_url の代替、HTTPを使わない）
+    """
+    from taiwan_stock_news_system_v5 import clean_url
+    target = parse_qs(urlparse(url).query).get('url')
+    return clean_url(target[0]) if target else None
+
+
+class SyntheticFeedGenerator:
+    """プロファイルに従って Google News 形式のRSSを決定的に生成する"""
+
+    def __init__(self, base_url='http://127.0.0.1', now=None, **profile):
+        unknown = set(profile) - set(DEFAULT_PROFILE)
+        if unknown:
+            raise ValueError(f"未対応のプロファイル項目: {sorted(unknown)}")
+        self.profile = dict(DEFAULT_PROFILE, **profile)
+        self.base_url = base_url
+        self.now = now or datetime.now(timezone.utc).replace(microsecond=0)
+        self.channel_template = _load_template('google_news_channel.xml')
+        self.item_template = _load_template('google_news_item.xml')
+
+        seed = self.profile['seed']
+        rng = random.Random(f"{seed}:feeds")
+        locales = list(self.profile['locale_mix'])
+        weights = [self.profile['locale_mix'][locale] for locale in locales]
+        self.feeds = []
+        for index in range(self.profile['feeds']):
+            locale = rng.choices(locales, weights)[0]
+            self.feeds.append({'index': index, 'query': f"SYNFEED{index:05d}", 'locale': locale})
+        self._feed_by_query = {feed['query']: feed for feed in self.feeds}
+
+        total = self.profile['feeds'] * self.profile['items_per_feed']
+        pool_size = max(1, int(total * self.profile['duplicate_rate'] / SHARED_APPEARANCES))
+        rng = random.Random(f"{seed}:shared")
+        self.shared_pool = [
+            self._article(f"shared:{i}", rng.choices(locales, weights)[0], rng)
+            for i in range(pool_size)]
+
+    def feed_plan(self, base_url=None):
+        """FEED_PLAN と同じ形のフィード定義（合成フィードは全て direct、購読銘柄なし）"""
+        base_url = base_url or self.base_url
+        return [{
+            'url': f"{base_url}/rss/search?q={quote_plus(feed['query'])}&{LOCALES[feed['locale']]}",
+            'query': feed['query'],
+            'locale': feed['locale'],
+            'category': 'direct',
+            'key': feed['query'],
+            'stocks': []
+        } for feed in self.feeds]
+
+    def _article(self, key, locale, rng):
+        """記事1件（最終URL・媒体・見出し・配信日時）"""
+        profile = self.profile
+        article_id = _digest(f"{profile['seed']}|{key}")
+        roll = rng.random()
+        if roll < profile['sns_share']:
+            url_template, publisher = rng.choice(SNS_PUBLISHERS)
+            final_url = url_template.format(id=article_id)
+        elif roll < profile['sns_share'] + profile['unknown_publisher_share']:
+            publisher = None
+            final_url = f"https://blog{rng.randrange(1000)}.example.net/posts/{article_id}"
+        else:
+            domain, publisher = rng.choice(KNOWN_PUBLISHERS)
+            # トラッキングパラメータは clean_url で除去される
+            final_url = f"https://{domain}/news/{article_id}?utm_source=google&utm_medium=rss"
+
+        subjects, topics = TITLE_WORDS.get(locale, TITLE_WORDS['zh-TW'])
+        title = f"{rng.choice(subjects)} {rng.choice(topics)} {rng.randrange(1, 100)}% #{article_id[:6]}"
+        published = self.now - timedelta(seconds=rng.uniform(0, profile['date_spread_days'] * 86400))
+        return {
+            'id': article_id,
+            'title': title,
+            'publisher': publisher,
+            'final_url': final_url,
+            'published': published
+        }
+
+    def _near_duplicate(self, original, key, rng):
+        """転載記事（見出しを微修正し、別媒体・別URLから配信）"""
+        article_id = _digest(f"{self.profile['seed']}|{key}")
+        domain, publisher = rng.choice(KNOWN_PUBLISHERS)
+        return dict(
+            original,
+            id=article_id,
+            title=original['title'] + rng.choice(NEAR_DUPLICATE_SUFFIXES),
+            publisher=publisher,
+            final_url=f"https://{domain}/news/{article_id}",
+            published=original['published'] + timedelta(minutes=rng.randrange(5, 180)))
+
+    def articles_for_feed(self, index):
+        """フィード index の記事リスト（新しい順）"""
+        profile = self.profile
+        feed = self.feeds[index]
+        rng = random.Random(f"{profile['seed']}:feed:{index}")
+        articles = []
+        for i in range(profile['items_per_feed']):
+            roll = rng.random()
+            if roll < profile['duplicate_rate']:
+                articles.append(rng.choice(self.shared_pool))
+            elif roll < profile['duplicate_rate'] + profile['near_duplicate_rate']:
+                articles.append(self._near_duplicate(
+                    rng.choice(self.shared_pool), f"near:{index}:{i}", rng))
+            else:
+                articles.append(self._article(f"{index}:{i}", feed['locale'], rng))
+        articles.sort(key=lambda article: article['published'], reverse=True)
+        return articles
+
+    def _render_item(self, article):
+        link = f"{self.base_url}/articles/{article['id']}?url={quote(article['final_url'], safe='')}"
+        publisher = article['publisher']
+        item = self.item_template.substitute(
+            title=article['title'],
+            publisher=publisher or '',
+            publisher_url=f"https://{_digest(publisher or '', 8)}.example.com",
+            link=link.replace('&', '&amp;'),
+            guid=article['id'],
+            pub_date=format_datetime(article['published'], usegmt=True))
+        if publisher is None:
+            # 出典不明: 見出しの媒体名と <source> を付けない
+            item = item.replace(' - </title>', '</title>')
+            item = item[:item.index('<source ')] + '</item>'
+        return item
+
+    def render_feed_index(self, index):
+        """フィード index のRSS XML"""
+        feed = self.feeds[index]
+        return self.channel_template.substitute(
+            query=feed['query'],
+            query_url=quote_plus(feed['query']),
+            build_date=format_datetime(self.now, usegmt=True),
+            items=''.join(self._render_item(article) for article in self.articles_for_feed(index)))
+
+    def render_feed(self, query, locale_params=''):
+        """RssStubServer の renderer（未知のクエリはハッシュでフィードに割り当てる）"""
+        feed = self._feed_by_query.get(query)
+        index = feed['index'] if feed else int(_digest(query, 8), 16) % len(self.feeds)
+        return self.render_feed_index(index)
+
+    def summary(self):
+        """生成される記事の内訳（件数）"""
+        counts = {'items': 0, 'unique_links': 0, 'sns': 0, 'unknown_publisher': 0,
+                  'locales': {}}
+        seen = set()
+        sns_hosts = tuple(urlparse(template).netloc for template, _ in SNS_PUBLISHERS)
+        for feed in self.feeds:
+            counts['locales'][feed['locale']] = counts['locales'].get(feed['locale'], 0) + 1
+            for article in self.articles_for_feed(feed['index']):
+                counts['items'] += 1
+                if article['id'] in seen:
+                    continue
+                seen.add(article['id'])
+                counts['unique_links'] += 1
+                if urlparse(article['final_url']).netloc in sns_hosts:
+                    counts['sns'] += 1
+                elif article['publisher'] is None:
+                    counts['unknown_publisher'] += 1
+        return counts
+
+
+def add_profile_arguments(parser):
+    """プロファイル項目のコマンドライン引数（ベンチマークと共用）"""
+    parser.add_argument('--feeds', type=int, default=DEFAULT_PROFILE['feeds'], help="フィード数")
+    parser.add_argument('--items-per-feed', type=int, default=DEFAULT_PROFILE['items_per_feed'],
+                        help="フィードあたりの記事数")
+    parser.add_argument('--duplicate-rate', type=float, default=DEFAULT_PROFILE['duplicate_rate'],
+                        help="フィード間で共有する記事の割合")
+    parser.add_argument('--near-duplicate-rate', type=float,
+                        default=DEFAULT_PROFILE['near_duplicate_rate'], help="転載記事の割合")
+    parser.add_argument('--locale-mix', default='zh-TW:0.7,en-US:0.2,ja:0.1',
+                        help="地域の構成比（例: zh-TW:0.7,en-US:0.2,ja:0.1）")
+    parser.add_argument('--date-spread-days', type=float,
+                        default=DEFAULT_PROFILE['date_spread_days'], help="配信日時のばらつき（日）")
+    parser.add_argument('--sns-share', type=float, default=DEFAULT_PROFILE['sns_share'],
+                        help="SNSリンクの割合")
+    parser.add_argument('--unknown-publisher-share', type=float,
+                        default=DEFAULT_PROFILE['unknown_publisher_share'], help="出典不明リンクの割合")
+    parser.add_argument('--seed', type=int, default=DEFAULT_PROFILE['seed'], help="乱数シード")
+
+
+def profile_from_args(args):
+    """コマンドライン引数からプロファイルを作成"""
+    locale_mix = {}
+    for part in args.locale_mix.split(','):
+        locale, _, weight = part.partition(':')
+        if locale not in LOCALES:
+            raise ValueError(f"未対応の地域: {locale}")
+        locale_mix[locale] = float(weight or 1)
+    return {
+        'feeds': args.feeds,
+        'items_per_feed': args.items_per_feed,
+        'duplicate_rate': args.duplicate_rate,
+        'near_duplicate_rate': args.near_duplicate_rate,
+        'locale_mix': locale_mix,
+        'date_spread_days': args.date_spread_days,
+        'sns_share': args.sns_share,
+        'unknown_publisher_share': args.unknown_publisher_share,
+        'seed': args.seed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成Google News RSSをローカルで配信")
+    add_profile_arguments(parser)
+    parser.add_argument('--feed-latency', type=float, default=0.0, help="フィード応答の遅延（秒）")
+    parser.add_argument('--list', type=int, default=5, help="表示するフィードURLの数")
+    args = parser.parse_args()
+
+    try:
+        profile = profile_from_args(args)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    stub = RssStubServer(feed_latency=args.feed_latency)
+    generator = SyntheticFeedGenerator(**profile)
+    stub.renderer = generator.render_feed
+    stub.start()
+    generator.base_url = stub.base_url
+
+    print(f"📡 合成フィードを配信中: {stub.base_url}（Ctrl+C で終了）")
+    print(f"  内訳: {generator.summary()}")
+    for feed in generator.feed_plan()[:args.list]:
+        print(f"  - {feed['url']}")
+    try:
+        stub._thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+候補ニュースのローカルスコアリング
+LLMクラスタリングに渡す前に、安価な指標で候補を順位付けし、
+トークン予算内で情報量の多い記事から選ぶ
+（記事のトークン数はクラスタリングプロンプトと同じ整形・切り詰めで数えるため、
+選んだ記事はすべてプロンプトに入る）
+
+【スコア要素】
+- キーワード一致（件数と位置: タイトル > 概要、先頭ほど高い）
+- 遅れても価値がある類型（業績 > 技術・需給 / 政策）
+- 出典メディアの格付け
+- 新しさ（半減期3日の指数減衰）
+"""
+
+from datetime import datetime
+import pytz
+from delayed_valuable_news import delayed_value_categories
+from prompt_builder import CLUSTER_TOTAL_TOKENS, cluster_article_tokens
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+# スコアの重み
+WEIGHTS = {
+    "title_hit": 3.0,
+    "snippet_hit": 1.0,
+    "title_position": 2.0,
+    "recency": 4.0,
+}
+
+CATEGORY_SCORES = {
+    "earnings": 3.0,
+    "tech_supply": 2.0,
+    "policy": 2.0,
+}
+
+# 出典メディアの格付け（未掲載は0点）
+PUBLISHER_TIERS = {
+    # 一次報道・専門メディア
+    "中央社 CNA": 3.0,
+    "工商時報": 3.0,
+    "經濟日報": 3.0,
+    "鉅亨網": 3.0,
+    "MoneyDJ": 3.0,
+    "DIGITIMES": 3.0,
+    "Reuters": 3.0,
+    "Bloomberg": 3.0,
+    "Financial Times": 3.0,
+    "Wall Street Journal": 3.0,
+    "日經中文網": 3.0,
+    # 一般紙・業界誌
+    "聯合新聞網": 1.5,
+    "自由時報": 1.5,
+    "中時新聞網": 1.5,
+    "TechNews 科技新報": 1.5,
+    "EE Times Taiwan": 1.5,
+    "財訊": 1.5,
+    "商業周刊": 1.5,
+    "天下雜誌": 1.5,
+    "今周刊": 1.5,
+}
+
+RECENCY_HALF_LIFE_HOURS = 72
+
+
+def score_candidate(news, keywords, now=None):
+    """候補ニュース1件のローカルスコア"""
+    if now is None:
+        now = datetime.now(TW_TZ)
+
+    title = news['title'].lower()
+    snippet = news['snippet'].lower()
+    score = 0.0
+
+    # キーワード一致（件数と位置）
+    first_position = None
+    for keyword in keywords:
+        keyword = keyword.lower()
+        if not keyword:
+            continue
+        title_hits = title.count(keyword)
+        score += WEIGHTS["title_hit"] * title_hits
+        score += WEIGHTS["snippet_hit"] * snippet.count(keyword)
+        if title_hits:
+            position = title.find(keyword)
+            if first_position is None or position < first_position:
+                first_position = position
+    if first_position is not None and title:
+        score += WEIGHTS["title_position"] * (1 - first_position / len(title))
+
+    # 遅れても価値がある類型
+    for category in delayed_value_categories(news['title'], news['snippet']):
+        score += CATEGORY_SCORES[category]
+
+    # 出典メディア
+    score += PUBLISHER_TIERS.get(news.get('publisher'), 0.0)
+
+    # 新しさ
+    try:
+        age_hours = max(
+            (now - datetime.fromisoformat(news['date'])).total_seconds() / 3600, 0)
+        score += WEIGHTS["recency"] * 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+    except (ValueError, TypeError):
+        pass
+
+    return round(score, 4)
+
+
+def rank_candidates(candidates, keywords, token_budget=CLUSTER_TOTAL_TOKENS, now=None):
+    """
+    候補ニュースをスコア順に並べ、トークン予算内に収まる上位を選ぶ
+
+    Args:
+        candidates (list): 候補ニュース（関連性判定の注釈 relevance_score / relevance_reason 付き）
+        keywords (list): 銘柄の検索キーワード
+        token_budget (int): 選択する記事の合計トークン数の上限
+            （クラスタリングプロンプトのニュースリストの上限）
+        now (datetime): 新しさの基準時刻
+
+    Returns:
+        list: [(スコア, ニュース), ...]（スコア降順、同点は署名順）
+            残りの予算に収まらない記事は飛ばす（1件で予算を超える記事は選ばない）
+    """
+    scored = sorted(
+        ((score_candidate(news, keywords, now), news) for news in candidates),
+        key=lambda pair: (-pair[0], pair[1]['signature']))
+
+    selected = []
+    used_tokens = 0
+    for score, news in scored:
+        tokens = cluster_article_tokens(news, len(selected) + 1)
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append((score, news))
+        used_tokens += tokens
+
+    return selected
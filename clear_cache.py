@@ -31,11 +31,13 @@ def clear_cache():
             news_count = len(cache.get('news', {}))
             topic_count = len(cache.get('topics', {}))
             url_count = len(cache.get('url_to_signature', {}))
+            relevance_count = len(cache.get('relevance', {}))
             
             print(f"\n現在のキャッシュ:")
             print(f"  ニュースキャッシュ: {news_count}件")
             print(f"  論点キャッシュ: {topic_count}件")
             print(f"  URLマッピング: {url_count}件")
+            print(f"  関連性判定キャッシュ: {relevance_count}件")
             
         except Exception as e:
             print(f"⚠️  キャッシュ読み込みエラー: {e}")
@@ -49,6 +51,7 @@ def clear_cache():
         "news": {},
         "topics": {},
         "url_to_signature": {},
+        "relevance": {},
         "cleared_at": datetime.now().isoformat(),
         "cleared_by": "clear_cache.py"
     }
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常駐モードのスケジュール
+一定間隔でフィードをポーリングし、配信時刻（台湾時間）に配信処理を行う
+
+設定は system_config.json の daemon_policy で上書きできる
+"""
+
+import json
+from datetime import datetime, timedelta
+import pytz
+
+from trading_calendar import is_trading_day
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+DEFAULT_DAEMON_POLICY = {
+    # フィードのポーリング間隔（分、低歩留まりフィードは feed_polling_policy の間隔で間引く）
+    "poll_interval_min": 30,
+    # 配信時刻（台湾時間 "HH:MM"）
+    "delivery_times": ["07:30"],
+    # TWSEの休場日は配信しない
+    "trading_days_only": False,
+    # 配信対象として保持する記事の期間（日、通常実行の収集期間と同じ）
+    "retention_days": 7,
+    # キャッシュの期限切れ削除・保存の間隔（保存は配信時にも行う）
+    "cache_clean_interval_hours": 24,
+    "cache_save_interval_min": 60
+}
+
+
+def load_daemon_policy():
+    """system_config.jsonから常駐モード設定を読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_DAEMON_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('daemon_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def next_delivery_time(policy, now=None):
+    """
+    now より後の次の配信時刻（trading_days_only なら営業日のみ）
+
+    Returns:
+        datetime: 台湾時間（配信時刻が未設定ならNone）
+    """
+    if not policy['delivery_times']:
+        return None
+    now = now or datetime.now(TW_TZ)
+    times = sorted(tuple(int(part) for part in value.split(':'))
+                   for value in policy['delivery_times'])
+
+    day = now.date()
+    # 長期休場でも見つかるよう、営業日探索と同じく30日先まで探す
+    for _ in range(31):
+        if not policy['trading_days_only'] or is_trading_day(day):
+            for hour, minute in times:
+                candidate = TW_TZ.localize(datetime(day.year, day.month, day.day, hour, minute))
+                if candidate > now:
+                    return candidate
+        day += timedelta(days=1)
+    return None
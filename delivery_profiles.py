@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配信プロファイルモジュール（宛先ごとの銘柄リスト）
+収集・分析は全プロファイルの銘柄の和集合で1回だけ行い、プロファイルごとに
+その銘柄だけのメールをレンダリングして送信する
+
+delivery_profiles.json（環境変数 DELIVERY_PROFILES_FILE で変更可能）:
+    {
+      "profiles": [
+        {"name": "semiconductor", "recipients": ["a@example.com", "b@example.com"],
+         "stocks": ["2330", "2451"]},
+        {"name": "all", "recipients": ["c@example.com"], "stocks": "all"}
+      ]
+    }
+
+ファイルがない場合は従来どおり RECIPIENT_EMAIL 宛てに全銘柄を送る（プロファイル名 default）
+送信元はプロファイルの sender か SENDER_EMAIL（どちらもないプロファイルは除外する）
+送信は SendGrid の personalizations でまとめ、宛先ごとに個別のメールとして届ける
+（1リクエストあたり最大 MAX_PERSONALIZATIONS 件）
+"""
+
+import json
+import os
+import re
+
+DELIVERY_PROFILES_FILE = 'delivery_profiles.json'
+
+# 宛先が1つで全銘柄を送る既定のプロファイル名
+DEFAULT_PROFILE = 'default'
+
+# SendGrid の1リクエストあたりの personalizations 上限
+MAX_PERSONALIZATIONS = 1000
+
+_PROFILE_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def _default_profiles(stock_ids):
+    recipient = os.environ.get('RECIPIENT_EMAIL')
+    return [{
+        'name': DEFAULT_PROFILE,
+        'recipients': [recipient] if recipient else [],
+        'stocks': list(stock_ids)
+    }]
+
+
+def load_delivery_profiles(stock_ids):
+    """
+    配信プロファイルを読み込む（未定義の銘柄・不正なプロファイルは除外して警告）
+
+    Args:
+        stock_ids (list): stocks.json の証券コード（この順にプロファイルの銘柄を並べる）
+
+    Returns:
+        list: [{'name', 'recipients': [メールアドレス], 'stocks': [証券コード], 'sender'(任意)}]
+    """
+    path = os.environ.get('DELIVERY_PROFILES_FILE', DELIVERY_PROFILES_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            definitions = json.load(f).get('profiles', [])
+    except FileNotFoundError:
+        return _default_profiles(stock_ids)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ 配信プロファイル読み込みエラー: {e}（RECIPIENT_EMAIL 宛てに全銘柄を送ります）")
+        return _default_profiles(stock_ids)
+
+    profiles = []
+    seen_names = set()
+    for definition in definitions:
+        name = definition.get('name', '')
+        if not _PROFILE_NAME_RE.match(name) or name in seen_names:
+            print(f"⚠️ 配信プロファイル名が不正または重複: {name!r}（スキップ）")
+            continue
+        seen_names.add(name)
+
+        stocks = definition.get('stocks', 'all')
+        if stocks == 'all':
+            stocks = list(stock_ids)
+        else:
+            unknown = [stock_id for stock_id in stocks if stock_id not in stock_ids]
+            if unknown:
+                print(f"⚠️ 配信プロファイル {name}: 未定義の銘柄 {unknown}（スキップ）")
+            stocks = [stock_id for stock_id in stock_ids if stock_id in stocks]
+
+        if not definition.get('sender') and not os.environ.get('SENDER_EMAIL'):
+            print(f"⚠️ 配信プロファイル {name}: 送信元がありません（sender か SENDER_EMAIL を設定、スキップ）")
+            continue
+
+        profile = {
+            'name': name,
+            'recipients': list(dict.fromkeys(definition.get('recipients', []))),
+            'stocks': stocks
+        }
+        if definition.get('sender'):
+            profile['sender'] = definition['sender']
+        profiles.append(profile)
+
+    if not profiles:
+        print("⚠️ 有効な配信プロファイルがありません（RECIPIENT_EMAIL 宛てに全銘柄を送ります）")
+        return _default_profiles(stock_ids)
+    return profiles
+
+
+def union_stock_ids(profiles, stock_ids):
+    """全プロファイルの銘柄の和集合（stocks.json の順）"""
+    wanted = {stock_id for profile in profiles for stock_id in profile['stocks']}
+    return [stock_id for stock_id in stock_ids if stock_id in wanted]
+
+
+def feed_plan_for_stocks(feed_plan, stock_ids):
+    """購読銘柄に stock_ids を含むフィードだけに絞る（全銘柄なら元のプランのまま）"""
+    wanted = set(stock_ids)
+    return [feed for feed in feed_plan if wanted.intersection(feed['stocks'])]
+
+
+def profile_results(profile, results):
+    """プロファイルの銘柄だけの結果（結果の順序は保つ）"""
+    wanted = set(profile['stocks'])
+    return {stock_id: result for stock_id, result in results.items() if stock_id in wanted}
+
+
+def profile_sender(profile):
+    """
+    送信元アドレス（プロファイルの sender → SENDER_EMAIL）
+    既定のプロファイル（RECIPIENT_EMAIL 宛て）だけは、どちらもなければ従来どおり自分自身から送る
+    （他の宛先のアドレスを送信元に使わない）
+    """
+    sender = profile.get('sender') or os.environ.get('SENDER_EMAIL')
+    if sender:
+        return sender
+    if profile['name'] == DEFAULT_PROFILE:
+        return profile['recipients'][0]
+    raise ValueError(f"配信プロファイル {profile['name']} の送信元がありません（sender か SENDER_EMAIL を設定）")
+
+
+def build_digest_messages(profile, html_content, subject):
+    """
+    プロファイルの送信メッセージ（宛先ごとに1 personalization、上限ごとに1メッセージ）
+    """
+    from sendgrid.helpers.mail import Mail, Personalization, To
+
+    messages = []
+    recipients = profile['recipients']
+    for start in range(0, len(recipients), MAX_PERSONALIZATIONS):
+        message = Mail(
+            from_email=profile_sender(profile),
+            subject=subject,
+            html_content=html_content)
+        for index, recipient in enumerate(recipients[start:start + MAX_PERSONALIZATIONS]):
+            personalization = Personalization()
+            personalization.add_to(To(recipient))
+            message.add_personalization(personalization, index=index)
+        messages.append(message)
+    return messages
+
+
+def send_profile_digest(client, profile, html_content, subject, sent_batches=(), on_sent=None):
+    """
+    プロファイルのメールを送信（personalizations の上限ごとのバッチ単位）
+    途中のバッチで失敗しても送信済みのバッチを再送しないよう、
+    sent_batches のバッチは飛ばし、送信できたバッチごとに on_sent(バッチ番号, ステータスコード) を呼ぶ
+
+    Returns:
+        int: 最後に送信したリクエストのステータスコード（すべて送信済みならNone、失敗時は例外）
+    """
+    status_code = None
+    for batch, message in enumerate(build_digest_messages(profile, html_content, subject)):
+        if batch in sent_batches:
+            continue
+        response = client.send(message)
+        status_code = response.status_code
+        if on_sent:
+            on_sent(batch, status_code)
+    return status_code
+
+
+def summarize_deliveries(deliveries):
+    """
+    プロファイルごとの送信結果を実行全体の結果にまとめる（run_report の delivery）
+    いずれかが失敗なら failed、アウトボックスで再送待ちなら queued、送信があれば sent、
+    すべて送信済みなら already_sent
+    """
+    statuses = [delivery['status'] for delivery in deliveries.values()]
+    if not statuses:
+        status = 'no_results'
+    elif 'failed' in statuses:
+        status = 'failed'
+    elif 'queued' in statuses:
+        status = 'queued'
+    elif 'sent' in statuses:
+        status = 'sent'
+    elif all(value == 'already_sent' for value in statuses):
+        status = 'already_sent'
+    else:
+        status = 'skipped'
+
+    summary = {'status': status, 'profiles': deliveries}
+    status_codes = [delivery['status_code'] for delivery in deliveries.values()
+                    if delivery.get('status_code') is not None]
+    if status_codes:
+        # 失敗があればそのコードを優先
+        failed = [delivery['status_code'] for delivery in deliveries.values()
+                  if delivery['status'] == 'failed' and delivery.get('status_code') is not None]
+        summary['status_code'] = (failed or status_codes)[-1]
+    return summary
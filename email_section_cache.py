@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メールの銘柄セクションキャッシュ
+銘柄セクションのレンダリング結果を「差し込む値 + テンプレート」のハッシュで保持し、
+内容が変わっていない銘柄は再レンダリングせずに再利用する（日中の再送・複数宛先の配信）
+
+プロセス内では SECTION_CACHE を共有し、実行の前後で .email_section_cache.json に読み書きする
+メモリ上も max_entries 件までのLRUにし、再利用できない場合（保存しない・1回しか使わない）は保持しない
+設定は system_config.json の section_cache_policy で上書きできる
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import pytz
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+DEFAULT_SECTION_CACHE_POLICY = {
+    "enabled": True,
+    "path": ".email_section_cache.json",
+    # 保存する最大件数（最後に使った日時の新しい順に残す）
+    "max_entries": 2000,
+    # 最後に使ってからの保持日数
+    "max_age_days": 3
+}
+
+# キー → {'html', 'used_at'}（最後に使った順、先頭が最も古い）
+SECTION_CACHE = OrderedDict()
+SECTION_STATS = {'hit': 0, 'miss': 0}
+# メモリ上に保持する最大件数（load_section_cache でポリシーの max_entries に合わせる）
+SECTION_CACHE_LIMIT = {'max_entries': DEFAULT_SECTION_CACHE_POLICY['max_entries']}
+_lock = threading.Lock()
+
+
+def load_section_cache_policy():
+    """system_config.jsonからセクションキャッシュ設定を読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_SECTION_CACHE_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('section_cache_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def section_key(template_fingerprint, inputs):
+    """テンプレートの指紋と差し込む値からキャッシュキーを生成"""
+    # inputs は常に同じ順序で組み立てるため sort_keys は不要
+    payload = json.dumps([template_fingerprint, inputs], ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _evict():
+    """最も古く使われたセクションから SECTION_CACHE_LIMIT を超えた分を捨てる（_lock 内で呼ぶ）"""
+    while len(SECTION_CACHE) > SECTION_CACHE_LIMIT['max_entries']:
+        SECTION_CACHE.popitem(last=False)
+
+
+def cached_section(key, render, store=True, count=True):
+    """
+    キャッシュ済みならそのHTML、なければ render() の結果を返す
+    store=False の場合（再利用の見込みがない）は結果を保持しない
+    count=False の場合（同じメールの中での測り直しなど）は SECTION_STATS に数えない
+    """
+    now = datetime.now(TW_TZ).isoformat()
+    with _lock:
+        entry = SECTION_CACHE.get(key)
+        if entry is not None:
+            entry['used_at'] = now
+            SECTION_CACHE.move_to_end(key)
+            if count:
+                SECTION_STATS['hit'] += 1
+            return entry['html']
+
+    html = render()
+    with _lock:
+        if store:
+            SECTION_CACHE[key] = {'html': html, 'used_at': now}
+            _evict()
+        if count:
+            SECTION_STATS['miss'] += 1
+    return html
+
+
+def load_section_cache(policy=None):
+    """保存済みのセクションを読み込む（期限切れは除外）、読み込んだ件数を返す"""
+    policy = policy or load_section_cache_policy()
+    SECTION_CACHE_LIMIT['max_entries'] = policy['max_entries']
+    if not policy['enabled']:
+        return 0
+    try:
+        with open(policy['path'], 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except json.JSONDecodeError as e:
+        print(f"⚠️ セクションキャッシュ読み込みエラー: {e}")
+        return 0
+
+    cutoff = (datetime.now(TW_TZ) - timedelta(days=policy['max_age_days'])).isoformat()
+    with _lock:
+        # 新しく使われた順に先頭へ入れていき、プロセス内で使ったセクションより前（古い側）に並べる
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get('used_at', ''),
+                                 reverse=True):
+            if entry.get('used_at', '') > cutoff and key not in SECTION_CACHE:
+                SECTION_CACHE[key] = entry
+                SECTION_CACHE.move_to_end(key, last=False)
+        _evict()
+    return len(SECTION_CACHE)
+
+
+def save_section_cache(policy=None):
+    """最近使ったセクションから max_entries 件を保存（一時ファイル経由で置き換え）"""
+    policy = policy or load_section_cache_policy()
+    if not policy['enabled']:
+        return
+    with _lock:
+        entries = sorted(
+            SECTION_CACHE.items(), key=lambda item: item[1]['used_at'], reverse=True)
+    entries = dict(entries[:policy['max_entries']])
+
+    tmp_path = f"{policy['path']}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(tmp_path, policy['path'])
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メールサイズ最適化モジュール（レンダリング後の後処理）
+Gmail は本文HTMLが約102KBを超えると「メッセージの一部が表示されています」で切り詰めるため、
+上限（max_bytes）に収まるよう次の順に縮める
+
+1. マークアップの圧縮（どのクライアントでも表示は変わらない）
+    - HTMLコメントの削除
+    - table系タグの前後の空白除去、連続する空白を1つに
+    - style 属性の正規化（"a:1; b:2;" → "a:1;b:2"）
+2. 繰り返し出る style 属性を <style> のクラスにまとめる（style_classes: true の場合のみ）
+   <style> を解釈しないクライアントでは装飾が外れるため、既定では無効
+3. 銘柄ごとの掲載件数の上限（その時点で最も大きい銘柄から、補足ニュース → ニュースクラスタの順に減らす）
+   リンクのない項目（投資判断補助）は減らさない
+   サイズを測るだけの段階では本文を保持せず、最後に断片ごとに生成して書き出す
+
+設定は system_config.json の email_size_policy で上書きできる
+"""
+
+import heapq
+import itertools
+import json
+import re
+from collections import Counter
+
+from email_template_v5 import render_header, render_footer, render_stock_section
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+DEFAULT_EMAIL_SIZE_POLICY = {
+    "enabled": True,
+    # 本文HTMLの上限（バイト、Gmailの切り詰め 102KB に余裕を持たせる）
+    "max_bytes": 100000,
+    "collapse_whitespace": True,
+    "strip_comments": True,
+    "normalize_styles": True,
+    # 繰り返し出る style 属性をクラスにまとめる（<style> 対応クライアントのみの配信で有効化）
+    "style_classes": False,
+    # クラスにまとめる style 属性の最小出現回数
+    "style_class_min_count": 3,
+    # 件数を減らしても銘柄ごとに残すニュースクラスタ数
+    "min_items_per_stock": 1
+}
+
+_COMMENT_RE = re.compile(r'<!--.*?-->', re.DOTALL)
+_BLOCK_TAG_RE = re.compile(
+    r'\s*(</?(?:html|head|meta|body|style|table|tr|td)\b[^>]*>)\s*', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_STYLE_ATTR_RE = re.compile(r'style="([^"]*)"')
+_STYLE_SEPARATOR_RE = re.compile(r'\s*([:;])\s*')
+
+
+def load_email_size_policy():
+    """system_config.jsonからサイズ最適化設定を読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_EMAIL_SIZE_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('email_size_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def _normalize_style(match):
+    style = _STYLE_SEPARATOR_RE.sub(r'\1', match.group(1)).strip().rstrip(';')
+    return f'style="{style}"'
+
+
+def optimize_markup(html, policy):
+    """マークアップを圧縮（断片ごとに適用できる）"""
+    if policy['strip_comments']:
+        html = _COMMENT_RE.sub('', html)
+    if policy['collapse_whitespace']:
+        html = _WHITESPACE_RE.sub(' ', html)
+        html = _BLOCK_TAG_RE.sub(r'\1', html)
+    if policy['normalize_styles']:
+        html = _STYLE_ATTR_RE.sub(_normalize_style, html)
+    return html
+
+
+def build_style_classes(chunks, min_count):
+    """繰り返し出る style 属性 → クラス名"""
+    counts = Counter(style for chunk in chunks for style in _STYLE_ATTR_RE.findall(chunk))
+    frequent = [style for style, count in counts.most_common()
+                if count >= min_count and len(style) > len('class="s00"')]
+    return {style: f"s{i}" for i, style in enumerate(frequent)}
+
+
+def apply_style_classes(html, classes):
+    """style 属性をクラスに置き換え（クラスのないものはそのまま）"""
+    def replace(match):
+        name = classes.get(match.group(1))
+        return f'class="{name}"' if name else match.group(0)
+    return _STYLE_ATTR_RE.sub(replace, html)
+
+
+def style_block(classes):
+    return '<style>' + ''.join(f".{name}{{{style}}}" for style, name in classes.items()) + '</style>'
+
+
+def _is_pinned(item):
+    """件数の上限で減らさない項目（リンクのない投資判断補助）"""
+    return item.get('link') == '#'
+
+
+def trim_stock_result(data, supplementary_cap=None, cluster_cap=None):
+    """
+    銘柄結果の掲載件数を上限まで減らした複製（元の結果・記事ビューは変更しない）
+
+    Args:
+        supplementary_cap: ニュースクラスタあたりの補足ニュース数の上限
+        cluster_cap: ニュースクラスタ数の上限（リンクのない項目は数えない）
+    """
+    news = data['news']
+    if cluster_cap is not None:
+        regular = [item for item in news if not _is_pinned(item)]
+        if len(regular) > cluster_cap:
+            keep = {id(item) for item in regular[:cluster_cap]}
+            news = [item for item in news if _is_pinned(item) or id(item) in keep]
+    if supplementary_cap is not None:
+        trimmed = []
+        for item in news:
+            supplementary_news = item.get('supplementary_news', [])
+            if len(supplementary_news) > supplementary_cap:
+                item = item.copy()
+                item['supplementary_news'] = supplementary_news[:supplementary_cap]
+            trimmed.append(item)
+        news = trimmed
+    return dict(data, news=news)
+
+
+def _trim_steps(data, min_items):
+    """銘柄の掲載件数の上限の候補（緩い順）: 補足ニュースを1件ずつ減らし、次にクラスタを減らす"""
+    max_supplementary = max(
+        (len(item.get('supplementary_news', [])) for item in data['news']), default=0)
+    clusters = sum(1 for item in data['news'] if not _is_pinned(item))
+
+    steps = [(cap, None) for cap in range(max_supplementary - 1, -1, -1)]
+    steps += [(0, cap) for cap in range(clusters - 1, max(0, min_items) - 1, -1)]
+    return steps
+
+
+def _byte_len(html):
+    return len(html.encode('utf-8'))
+
+
+def render_email_within_budget(stock_results, taipei_time, policy=None, store_sections=True):
+    """
+    最適化したメール本文を断片のイテレータで返す（上限に収まるまで大きい銘柄から掲載件数を減らす）
+
+    まず各銘柄セクションのサイズだけを測り（本文は保持しない）、上限を超えていれば
+    その時点で最も大きい銘柄の掲載件数を1段階ずつ減らして測り直す
+    本文は最後に断片ごとに生成するため、書き出し先へそのまま流せる
+    掲載件数を減らしたセクションはセクションキャッシュに残さない
+
+    Returns:
+        tuple: (断片のイテレータ, サイズレポート)
+            サイズレポート: {'bytes', 'max_bytes', 'fits', 'original_bytes',
+                             'caps': {証券コード: {'supplementary', 'clusters'}}（減らした銘柄のみ）,
+                             'sections': [{'section', 'bytes'}]}
+    """
+    policy = policy or load_email_size_policy()
+    max_bytes = policy['max_bytes']
+    raw_header = render_header(taipei_time)
+    raw_footer = render_footer()
+
+    # 再利用・生成の集計は銘柄ごとに最初の1回だけ数える（測り直し・最終生成は数えない）
+    counted = set()
+
+    def section(stock_id, caps=None):
+        data = stock_results[stock_id]
+        if caps is None:
+            count = stock_id not in counted
+            counted.add(stock_id)
+            return render_stock_section(stock_id, data, store_sections, count)
+        return render_stock_section(stock_id, trim_stock_result(data, *caps), False, False)
+
+    classes = {}
+    if policy['style_classes']:
+        # 繰り返し出る style 属性はメール全体で数える（セクションは1つずつ生成して捨てる）
+        classes = build_style_classes(
+            (optimize_markup(html, policy) for html in itertools.chain(
+                (raw_header, raw_footer), (section(stock_id) for stock_id in stock_results))),
+            policy['style_class_min_count'])
+
+    def finish(html):
+        html = optimize_markup(html, policy)
+        return apply_style_classes(html, classes) if classes else html
+
+    header = finish(raw_header)
+    if classes:
+        head, _, rest = header.partition('</head>')
+        header = f"{head}{style_block(classes)}</head>{rest}"
+    footer = finish(raw_footer)
+
+    original_bytes = _byte_len(raw_header) + _byte_len(raw_footer)
+    sizes = {}
+    for stock_id in stock_results:
+        html = section(stock_id)
+        original_bytes += _byte_len(html)
+        sizes[stock_id] = _byte_len(finish(html))
+    total = _byte_len(header) + _byte_len(footer) + sum(sizes.values())
+
+    # 上限を超えている間、最も大きい銘柄の掲載件数を1段階減らす（減らせない銘柄は候補から外す）
+    caps = {}
+    steps = {}
+    largest = [(-size, stock_id) for stock_id, size in sizes.items()]
+    heapq.heapify(largest)
+    while total > max_bytes and largest:
+        _, stock_id = heapq.heappop(largest)
+        if stock_id not in steps:
+            steps[stock_id] = _trim_steps(
+                stock_results[stock_id], policy['min_items_per_stock'])
+        if not steps[stock_id]:
+            continue
+        caps[stock_id] = steps[stock_id].pop(0)
+        size = _byte_len(finish(section(stock_id, caps[stock_id])))
+        total += size - sizes[stock_id]
+        sizes[stock_id] = size
+        heapq.heappush(largest, (-size, stock_id))
+
+    def iter_chunks():
+        yield header
+        for stock_id in stock_results:
+            yield finish(section(stock_id, caps.get(stock_id)))
+        yield footer
+
+    report = {
+        'bytes': total,
+        'max_bytes': max_bytes,
+        'fits': total <= max_bytes,
+        'original_bytes': original_bytes,
+        'caps': {stock_id: {'supplementary': supplementary_cap, 'clusters': cluster_cap}
+                 for stock_id, (supplementary_cap, cluster_cap) in caps.items()},
+        'sections': [{'section': 'header', 'bytes': _byte_len(header)}] +
+                    [{'section': stock_id, 'bytes': size} for stock_id, size in sizes.items()] +
+                    [{'section': 'footer', 'bytes': _byte_len(footer)}]
+    }
+    return iter_chunks(), report
+
+
+def print_email_size_report(report):
+    """サイズレポートを表示"""
+    print(f"📏 メールサイズ: {report['bytes'] / 1024:.1f}KB "
+          f"（最適化前 {report['original_bytes'] / 1024:.1f}KB、上限 {report['max_bytes'] / 1024:.1f}KB）")
+    for size in report['sections']:
+        caps = report['caps'].get(size['section'])
+        label = ""
+        if caps:
+            cluster_label = caps['clusters'] if caps['clusters'] is not None else '制限なし'
+            label = f"（✂️ 補足ニュース {caps['supplementary']}件 / ニュースクラスタ {cluster_label}）"
+        print(f"  - {size['section']}: {size['bytes'] / 1024:.1f}KB{label}")
+    if not report['fits']:
+        print("  ⚠️ 掲載件数を最小まで減らしても上限を超えています（Gmailで切り詰められる可能性）")
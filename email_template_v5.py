@@ -1,14 +1,39 @@
 """
 HTMLメールテンプレート生成関数 v5.1（ニュースクラスタリング対応）
+- テンプレート断片は import 時に1回だけ固定部分と差し込み項目に分解する
+- 銘柄セクションは差し込む値のハッシュでキャッシュし、内容が同じなら再利用する（email_section_cache）
 """
 
+import hashlib
+from string import Formatter
+
+from email_section_cache import section_key, cached_section
+
 VERSION = "v5.1-frozen-20260113-0320"
 
-def generate_html_email(stock_results, taipei_time):
-    """tableベースでiOS Mailのダークモードに完全対応したHTMLメール本文を生成"""
-    
-    # HTMLヘッダー
-    html = """
+
+def _compile(template):
+    """
+    テンプレート断片を固定部分と差し込み項目の列に分解（偶数番目が固定文字列、奇数番目が項目名）
+    """
+    parts = []
+    for literal, field, _, _ in Formatter().parse(template):
+        parts.append(literal)
+        if field is not None:
+            parts.append(field)
+    return tuple(parts)
+
+
+def _render(fragment, values):
+    """分解済みの断片に値を差し込む"""
+    parts = list(fragment)
+    for i in range(1, len(parts), 2):
+        parts[i] = str(values[parts[i]])
+    return ''.join(parts)
+
+
+# HTMLヘッダー
+_HEAD = """
     <html>
     <head>
         <meta charset="UTF-8">
@@ -20,9 +45,9 @@ def generate_html_email(stock_results, taipei_time):
                 <td align="center" style="padding:20px;">
                     <table width="100%" cellpadding="0" cellspacing="0" border="0" style="max-width:800px;">
     """
-    
-    # ヘッダー
-    html += f"""
+
+# ヘッダー
+_HEADER = _compile("""
                         <!-- ヘッダー -->
                         <tr>
                             <td bgcolor="#0ea5e9" style="padding:20px; border-bottom:3px solid #0284c7;">
@@ -33,7 +58,7 @@ def generate_html_email(stock_results, taipei_time):
                                                 🇹🇼 台湾株ニュース配信
                                             </font>
                                             <font face="Arial, sans-serif" size="3" color="#ffffff" style="background-color:#16a34a; padding:4px 12px; border-radius:4px; margin-left:10px; font-weight:bold;">
-                                                {VERSION}
+                                                {version}
                                             </font>
                                         </td>
                                     </tr>
@@ -48,48 +73,45 @@ def generate_html_email(stock_results, taipei_time):
                             </td>
                         </tr>
                         <tr><td style="height:30px;"></td></tr>
-    """
-    
-    # 各銘柄のセクション
-    for stock_id, data in stock_results.items():
-        # 単一イベント集中の警告
-        single_event_warning = ""
-        if data.get('is_single_event', False):
-            single_event_warning = f"""
+    """)
+
+# 単一イベント集中の警告
+_SINGLE_EVENT_WARNING = _compile("""
                         <!-- 単一イベント警告 -->
                         <tr>
                             <td bgcolor="#dc2626" style="padding:12px 20px; border-radius:8px; border-left:4px solid #991b1b;">
                                 <font face="Arial, sans-serif" size="2" color="#ffffff" style="font-weight:bold;">
-                                    ⚠️ 本日は重要イベントが集中しています: {data.get('event_description', '詳細不明')}
+                                    ⚠️ 本日は重要イベントが集中しています: {event_description}
                                 </font>
                             </td>
                         </tr>
                         <tr><td style="height:15px;"></td></tr>
-            """
-        
-        html += f"""
-                        <!-- 銘柄セクション: {data['stock_info']['name']} -->
+            """)
+
+# 銘柄セクション（見出し・論点ボックス）
+_STOCK_HEADER = _compile("""
+                        <!-- 銘柄セクション: {name} -->
                         <tr>
                             <td style="border-left:4px solid #0ea5e9; padding-left:20px;">
                                 <table width="100%" cellpadding="0" cellspacing="0" border="0">
                                     <tr>
                                         <td>
                                             <font face="Arial, sans-serif" size="5" color="#000000" style="font-weight:bold;">
-                                                {data['stock_info']['name']} ({stock_id})
+                                                {name} ({stock_id})
                                             </font>
                                         </td>
                                     </tr>
                                     <tr>
                                         <td style="padding-top:8px;">
                                             <font face="Arial, sans-serif" size="2" color="#64748b">
-                                                {data['stock_info']['business_type']}
+                                                {business_type}
                                             </font>
                                         </td>
                                     </tr>
                                     <tr>
                                         <td style="padding-top:5px;">
                                             <font face="Arial, sans-serif" size="2" color="#64748b">
-                                                ニュースクラスタ数: {len(data['news'])}個
+                                                ニュースクラスタ数: {cluster_count}個
                                             </font>
                                         </td>
                                     </tr>
@@ -114,7 +136,7 @@ def generate_html_email(stock_results, taipei_time):
                                     <tr>
                                         <td style="padding-top:8px;">
                                             <font face="Arial, sans-serif" size="3" color="#ffffff" style="line-height:1.6;">
-                                                {data['topic']}
+                                                {topic}
                                             </font>
                                         </td>
                                     </tr>
@@ -122,20 +144,10 @@ def generate_html_email(stock_results, taipei_time):
                             </td>
                         </tr>
                         <tr><td style="height:25px;"></td></tr>
-        """
-        
-        # ニュース一覧（クラスタ対応）
-        if data['news']:
-            for item in data['news']:
-                pub_date = item.get('published', '日時不明')
-                source = item.get('publisher', '')
-                title_ja = item.get('title_ja', item['title'])
-                cluster_theme = item.get('cluster_theme', '関連ニュース')
-                representative_reason = item.get('representative_reason', '')
-                supplementary_news = item.get('supplementary_news', [])
-                supplementary_perspectives = item.get('supplementary_perspectives', [])
-                
-                html += f"""
+        """)
+
+# ニュースクラスタ（代表ニュース）
+_CLUSTER = _compile("""
                         <!-- ニュースクラスタ: {cluster_theme} -->
                         <tr>
                             <td bgcolor="#f1f5f9" style="padding:15px; border-left:4px solid #0ea5e9; border-radius:8px;">
@@ -164,7 +176,7 @@ def generate_html_email(stock_results, taipei_time):
                                     <tr>
                                         <td>
                                             <font face="Arial, sans-serif" size="3" color="#1e40af" style="font-weight:bold;">
-                                                🇯🇵 <a href="{item['link']}" style="color:#1e40af; text-decoration:none;">{title_ja}</a>
+                                                🇯🇵 <a href="{link}" style="color:#1e40af; text-decoration:none;">{title_ja}</a>
                                             </font>
                                         </td>
                                     </tr>
@@ -172,7 +184,7 @@ def generate_html_email(stock_results, taipei_time):
                                     <tr>
                                         <td style="padding-top:8px;">
                                             <font face="Arial, sans-serif" size="2" color="#475569">
-                                                🇹🇼 <a href="{item['link']}" style="color:#475569; text-decoration:none;">{item['title']}</a>
+                                                🇹🇼 <a href="{link}" style="color:#475569; text-decoration:none;">{title}</a>
                                             </font>
                                         </td>
                                     </tr>
@@ -183,22 +195,22 @@ def generate_html_email(stock_results, taipei_time):
                                                 <tr>
                                                     <td bgcolor="#0284c7" style="padding:4px 10px; border-radius:4px;">
                                                         <font face="Arial, sans-serif" size="1" color="#ffffff" style="font-weight:bold;">
-                                                            関連スコア: {item['relevance_score']}
+                                                            関連スコア: {relevance_score}
                                                         </font>
                                                     </td>
                                                     <td style="width:10px;"></td>
-                                                    {'<td bgcolor="#64748b" style="padding:4px 10px; border-radius:4px;"><font face="Arial, sans-serif" size="1" color="#ffffff" style="font-weight:bold;">' + source + '</font></td>' if source else ''}
+                                                    {source_cell}
                                                 </tr>
                                             </table>
                                         </td>
                                     </tr>
                                     <!-- 代表選定理由 -->
-                                    {'<tr><td bgcolor="#065f46" style="padding:8px 12px; border-radius:4px; margin-top:8px;"><font face="Arial, sans-serif" size="2" color="#ffffff">✓ 選定理由: ' + representative_reason + '</font></td></tr>' if representative_reason else ''}
+                                    {reason_row}
                                     <!-- 関連理由 -->
                                     <tr>
                                         <td bgcolor="#065f46" style="padding:8px 12px; border-radius:4px; margin-top:8px;">
                                             <font face="Arial, sans-serif" size="2" color="#ffffff">
-                                                ✓ {item['relevance_reason']}
+                                                ✓ {relevance_reason}
                                             </font>
                                         </td>
                                     </tr>
@@ -210,11 +222,10 @@ def generate_html_email(stock_results, taipei_time):
                                             </font>
                                         </td>
                                     </tr>
-                """
-                
-                # 補足ニュース
-                if supplementary_news:
-                    html += """
+                """)
+
+# 補足ニュース
+_SUPPLEMENTARY_HEADER = """
                                     <tr><td style="height:15px;"></td></tr>
                                     <tr>
                                         <td>
@@ -225,12 +236,8 @@ def generate_html_email(stock_results, taipei_time):
                                     </tr>
                                     <tr><td style="height:5px;"></td></tr>
                     """
-                    
-                    for i, supp_news in enumerate(supplementary_news):
-                        perspective = supplementary_perspectives[i] if i < len(supplementary_perspectives) else '追加情報'
-                        supp_title_ja = supp_news.get('title_ja', supp_news['title'])
-                        
-                        html += f"""
+
+_SUPPLEMENTARY_ITEM = _compile("""
                                     <tr>
                                         <td bgcolor="#f8fafc" style="padding:10px; border-left:2px solid #cbd5e1; border-radius:4px;">
                                             <table width="100%" cellpadding="0" cellspacing="0" border="0">
@@ -244,7 +251,7 @@ def generate_html_email(stock_results, taipei_time):
                                                 <tr>
                                                     <td style="padding-top:5px;">
                                                         <font face="Arial, sans-serif" size="2" color="#475569">
-                                                            <a href="{supp_news['link']}" style="color:#475569; text-decoration:none;">{supp_title_ja}</a>
+                                                            <a href="{link}" style="color:#475569; text-decoration:none;">{title_ja}</a>
                                                         </font>
                                                     </td>
                                                 </tr>
@@ -252,16 +259,17 @@ def generate_html_email(stock_results, taipei_time):
                                         </td>
                                     </tr>
                                     <tr><td style="height:8px;"></td></tr>
-                        """
-                
-                html += """
+                        """)
+
+_CLUSTER_END = """
                                 </table>
                             </td>
                         </tr>
                         <tr><td style="height:20px;"></td></tr>
                 """
-        else:
-            html += """
+
+# 関連ニュースなし
+_NO_NEWS = """
                         <tr>
                             <td bgcolor="#f1f5f9" style="padding:15px; border-radius:8px;">
                                 <font face="Arial, sans-serif" size="3" color="#000000">
@@ -271,14 +279,14 @@ def generate_html_email(stock_results, taipei_time):
                         </tr>
                         <tr><td style="height:20px;"></td></tr>
             """
-        
-        # 銘柄間の余白
-        html += """
+
+# 銘柄間の余白
+_STOCK_END = """
                         <tr><td style="height:40px;"></td></tr>
         """
-    
-    # HTMLフッター（バージョン情報付き）
-    html += f"""
+
+# HTMLフッター（バージョン情報付き）
+_FOOTER = _compile("""
                         <!-- フッター -->
                         <tr><td style="height:40px;"></td></tr>
                         <tr>
@@ -287,14 +295,14 @@ def generate_html_email(stock_results, taipei_time):
                                     <tr>
                                         <td>
                                             <font face="Arial, sans-serif" size="2" color="#64748b" style="font-weight:bold;">
-                                                台湾株ニュース配信システム {VERSION}
+                                                台湾株ニュース配信システム {version}
                                             </font>
                                         </td>
                                     </tr>
                                     <tr>
                                         <td style="padding-top:8px;">
                                             <font face="Arial, sans-serif" size="1" color="#94a3b8">
-                                                build: {VERSION} | 仕様書: v5.1-20260113
+                                                build: {version} | 仕様書: v5.1-20260113
                                             </font>
                                         </td>
                                     </tr>
@@ -321,6 +329,131 @@ def generate_html_email(stock_results, taipei_time):
         </table>
     </body>
     </html>
+    """)
+
+_SOURCE_CELL = _compile('<td bgcolor="#64748b" style="padding:4px 10px; border-radius:4px;"><font face="Arial, sans-serif" size="1" color="#ffffff" style="font-weight:bold;">{source}</font></td>')
+_REASON_ROW = _compile('<tr><td bgcolor="#065f46" style="padding:8px 12px; border-radius:4px; margin-top:8px;"><font face="Arial, sans-serif" size="2" color="#ffffff">✓ 選定理由: {representative_reason}</font></td></tr>')
+
+# テンプレートの指紋（断片を変更したら VERSION を変えなくてもセクションキャッシュが切り替わる）
+TEMPLATE_FINGERPRINT = hashlib.md5(repr((
+    VERSION, _HEAD, _HEADER, _SINGLE_EVENT_WARNING, _STOCK_HEADER, _CLUSTER, _SOURCE_CELL,
+    _REASON_ROW, _SUPPLEMENTARY_HEADER, _SUPPLEMENTARY_ITEM, _CLUSTER_END, _NO_NEWS,
+    _STOCK_END, _FOOTER)).encode('utf-8')).hexdigest()
+
+
+def _section_inputs(stock_id, data):
+    """銘柄セクションに差し込む値（セクションキャッシュのキーにもなる）"""
+    inputs = {
+        'stock_id': stock_id,
+        'name': data['stock_info']['name'],
+        'business_type': data['stock_info']['business_type'],
+        'cluster_count': len(data['news']),
+        'topic': data['topic'],
+        'is_single_event': bool(data.get('is_single_event', False)),
+        'event_description': data.get('event_description', '詳細不明'),
+        'clusters': []
+    }
+    for item in data['news']:
+        supplementary_perspectives = item.get('supplementary_perspectives', [])
+        supplementary = []
+        for i, supp_news in enumerate(item.get('supplementary_news', [])):
+            supplementary.append({
+                'perspective': supplementary_perspectives[i] if i < len(supplementary_perspectives) else '追加情報',
+                'link': supp_news['link'],
+                'title_ja': supp_news.get('title_ja', supp_news['title'])
+            })
+        inputs['clusters'].append({
+            'cluster_theme': item.get('cluster_theme', '関連ニュース'),
+            'link': item['link'],
+            'title_ja': item.get('title_ja', item['title']),
+            'title': item['title'],
+            'relevance_score': item['relevance_score'],
+            'source': item.get('publisher', ''),
+            'representative_reason': item.get('representative_reason', ''),
+            'relevance_reason': item['relevance_reason'],
+            'pub_date': item.get('published', '日時不明'),
+            'supplementary': supplementary
+        })
+    return inputs
+
+
+def _iter_stock_section(inputs):
+    """銘柄セクションを断片ごとに生成"""
+    single_event_warning = _render(_SINGLE_EVENT_WARNING, inputs) if inputs['is_single_event'] else ""
+    yield _render(_STOCK_HEADER, dict(inputs, single_event_warning=single_event_warning))
+
+    # ニュース一覧（クラスタ対応）
+    if inputs['clusters']:
+        for cluster in inputs['clusters']:
+            yield _render(_CLUSTER, dict(
+                cluster,
+                source_cell=_render(_SOURCE_CELL, cluster) if cluster['source'] else '',
+                reason_row=_render(_REASON_ROW, cluster) if cluster['representative_reason'] else ''))
+
+            # 補足ニュース
+            if cluster['supplementary']:
+                yield _SUPPLEMENTARY_HEADER
+                for supp in cluster['supplementary']:
+                    yield _render(_SUPPLEMENTARY_ITEM, supp)
+
+            yield _CLUSTER_END
+    else:
+        yield _NO_NEWS
+
+    yield _STOCK_END
+
+
+def render_stock_section(stock_id, data, store=True, count=True):
+    """
+    銘柄セクションのHTML（差し込む値とテンプレートが同じなら前回のレンダリング結果を再利用）
+    store=False なら新しくレンダリングした結果をセクションキャッシュに残さない
+    count=False なら再利用・生成の集計（SECTION_STATS）に数えない
+    """
+    inputs = _section_inputs(stock_id, data)
+    return cached_section(
+        section_key(TEMPLATE_FINGERPRINT, inputs),
+        lambda: ''.join(_iter_stock_section(inputs)), store, count)
+
+
+def render_header(taipei_time):
+    """HTMLヘッダーとメール冒頭のヘッダー"""
+    return _HEAD + _render(_HEADER, {'version': VERSION, 'taipei_time': taipei_time})
+
+
+def render_footer():
+    """フッターとHTMLの閉じタグ"""
+    return _render(_FOOTER, {'version': VERSION})
+
+
+def iter_html_email(stock_results, taipei_time, store_sections=True):
+    """
+    tableベースでiOS Mailのダークモードに完全対応したHTMLメール本文を断片ごとに生成
+    文字列を連結し直さずに書き出せるよう、ヘッダー・銘柄セクション・フッターごとに yield する
+    store_sections=False なら銘柄セクションをセクションキャッシュに残さない（再利用しない場合）
+    """
+    yield render_header(taipei_time)
+
+    # 各銘柄のセクション
+    for stock_id, data in stock_results.items():
+        yield render_stock_section(stock_id, data, store_sections)
+
+    yield render_footer()
+
+
+def generate_html_email(stock_results, taipei_time):
+    """HTMLメール本文を文字列で返す（iter_html_email の断片を1回で連結）"""
+    return ''.join(iter_html_email(stock_results, taipei_time))
+
+
+def write_html_email(stock_results, taipei_time, fp):
+    """
+    HTMLメール本文を file-like オブジェクトに断片ごとに書き出す
+
+    Returns:
+        int: 書き出した文字数
     """
-    
-    return html
+    written = 0
+    for chunk in iter_html_email(stock_results, taipei_time):
+        fp.write(chunk)
+        written += len(chunk)
+    return written
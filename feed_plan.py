@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RSSフィードプラン生成モジュール
+stocks.json の銘柄ごとのクエリ定義とクエリテンプレートから
+Google News RSS のURLを生成する
+
+【カテゴリ】
+① 銘柄直結クエリ（direct）: 銘柄ごと・地域ごとの企業名クエリ
+② 上流ドライバークエリ（driver）: 技術・顧客・政策・需給のクエリ（銘柄間で共有）
+③ 業績・イベントクエリ（earnings）: 銘柄名からテンプレートで生成
+④ 共通業界クエリ（sector）: 業界ごとのクエリ（銘柄間で共有）
+
+ドライバー・業界クエリは同一URLを1本にまとめるため、
+銘柄数が増えてもフィード数は線形には増えない
+"""
+
+import json
+from collections import Counter
+
+GOOGLE_NEWS_RSS = "https://news.google.com/rss/search?q={query}&{locale_params}"
+
+# 地域パラメータ
+LOCALES = {
+    "zh-TW": "hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
+    "en-US": "hl=en-US&gl=US&ceid=US:en",
+    "ja": "hl=ja&gl=JP&ceid=JP:ja",
+}
+
+# ② 上流ドライバークエリ（stocks.json の drivers から参照）
+DRIVER_QUERIES = {
+    # 技術キーワード
+    "euv": {"zh-TW": "EUV"},
+    "cowos": {"zh-TW": "CoWoS"},
+    "hbm": {"zh-TW": "HBM"},
+    "liquid_cooling": {"zh-TW": "液冷"},
+    "advanced_process": {"zh-TW": "先進製程"},
+    "advanced_packaging": {"zh-TW": "先進封裝"},
+    # 顧客・プラットフォーム
+    "nvidia": {"zh-TW": "NVIDIA"},
+    "ai_server": {"zh-TW": "AI伺服器"},
+    "gb200": {"zh-TW": "GB200"},
+    # 政策・地政学
+    "us_fab": {"zh-TW": "美國廠"},
+    "tariff": {"zh-TW": "關稅"},
+    # 需給・供給制約
+    "dram_price": {"zh-TW": "DRAM價格"},
+    "capacity": {"zh-TW": "產能"},
+}
+
+# ③ 業績・イベントクエリのテンプレート（{name}: 銘柄名, {code}: 証券コード）
+EARNINGS_TEMPLATES = {
+    "zh-TW": ["{name} 營收"],
+}
+
+# ④ 共通業界クエリ（stocks.json の sectors から参照）
+SECTOR_QUERIES = {
+    "semiconductor": {"zh-TW": "半導體"},
+    "memory": {"zh-TW": "DRAM OR NAND"},
+    "odm": {"zh-TW": "ODM"},
+}
+
+CATEGORY_ORDER = ["direct", "driver", "earnings", "sector"]
+
+
+def build_feed_url(query, locale):
+    """クエリと地域からGoogle News RSSのURLを生成"""
+    return GOOGLE_NEWS_RSS.format(
+        query=query.replace(' ', '+'),
+        locale_params=LOCALES[locale])
+
+
+def _resolve_shared_queries(ref, catalog, kind, stock_id):
+    """
+    共有クエリ参照を (キー, {地域: クエリ}) に解決する
+    文字列ならカタログのキー、辞書なら銘柄固有のインライン定義
+    """
+    if isinstance(ref, dict):
+        return ref.get('id', f"{stock_id}_{kind}"), ref.get('queries', {})
+    if ref not in catalog:
+        print(f"⚠️ 未定義の{kind}クエリ: {ref}（{stock_id}）")
+        return ref, {}
+    return ref, catalog[ref]
+
+
+def build_feed_plan(stocks):
+    """
+    銘柄プロファイルからフィードプランを生成する
+
+    Args:
+        stocks (dict): stocks.json の stocks（証券コード → 銘柄プロファイル）
+
+    Returns:
+        list: フィード定義のリスト
+            [{'url', 'query', 'locale', 'category', 'key', 'stocks': [証券コード, ...]}]
+            同一URLは1件にまとめ、stocks に購読銘柄をすべて列挙する
+    """
+    feeds = {}
+
+    def add(category, key, query, locale, stock_id):
+        if locale not in LOCALES:
+            print(f"⚠️ 未対応の地域: {locale}（{stock_id}）")
+            return
+        url = build_feed_url(query, locale)
+        feed = feeds.get(url)
+        if feed is None:
+            feed = feeds[url] = {
+                "url": url,
+                "query": query,
+                "locale": locale,
+                "category": category,
+                "key": key,
+                "stocks": []
+            }
+        if stock_id not in feed['stocks']:
+            feed['stocks'].append(stock_id)
+
+    for stock_id, info in stocks.items():
+        if stock_id.startswith('_'):
+            continue
+
+        # ① 銘柄直結クエリ
+        for locale, query in info.get('feed_queries', {}).items():
+            add("direct", stock_id, query, locale, stock_id)
+
+        # ② 上流ドライバークエリ
+        for ref in info.get('drivers', []):
+            key, queries = _resolve_shared_queries(
+                ref, DRIVER_QUERIES, "driver", stock_id)
+            for locale, query in queries.items():
+                add("driver", key, query, locale, stock_id)
+
+        # ③ 業績・イベントクエリ
+        for locale, templates in EARNINGS_TEMPLATES.items():
+            for template in templates:
+                query = template.format(name=info.get('name', stock_id), code=stock_id)
+                add("earnings", stock_id, query, locale, stock_id)
+
+        # ④ 共通業界クエリ
+        for ref in info.get('sectors', []):
+            key, queries = _resolve_shared_queries(
+                ref, SECTOR_QUERIES, "sector", stock_id)
+            for locale, query in queries.items():
+                add("sector", key, query, locale, stock_id)
+
+    return sorted(
+        feeds.values(),
+        key=lambda f: CATEGORY_ORDER.index(f['category']))
+
+
+def summarize_feed_plan(feed_plan):
+    """フィードプランのカテゴリ別・地域別件数を集計"""
+    return {
+        "total_feeds": len(feed_plan),
+        "by_category": dict(Counter(f['category'] for f in feed_plan)),
+        "by_locale": dict(Counter(f['locale'] for f in feed_plan)),
+        "shared_feeds": sum(1 for f in feed_plan if len(f['stocks']) > 1)
+    }
+
+
+if __name__ == "__main__":
+    with open('stocks.json', 'r', encoding='utf-8') as f:
+        plan = build_feed_plan(json.load(f).get('stocks', {}))
+
+    for feed in plan:
+        print(f"[{feed['category']}/{feed['locale']}] {feed['query']} → {', '.join(feed['stocks'])}")
+    print(json.dumps(summarize_feed_plan(plan), ensure_ascii=False, indent=2))
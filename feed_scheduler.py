@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+フィード取得スケジューラ（歩留まりベースの適応ポーリング）
+- フィードごとの歩留まり統計（新規ユニーク件数・フィルタ通過件数・配信件数）を実行をまたいで保存
+- 歩留まりの高いフィードは毎回、低いフィードは間隔を空けて取得
+- どのフィードも max_interval_hours 以内には必ず取得する（鮮度保証）
+
+RSSは過去7日分の記事を返すため、低歩留まりフィードを数時間スキップしても
+次回取得時に記事を取りこぼすことはない
+"""
+
+import json
+import threading
+from datetime import datetime
+import pytz
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+FEED_STATS_FILE = '.taiwan_stock_news_feed_stats_v5.json'
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+# ポーリングポリシー（system_config.json の feed_polling_policy で上書き可能）
+DEFAULT_POLLING_POLICY = {
+    "enabled": True,
+    # 歩留まりスコア（1回の取得あたり: フィルタ通過 + 配信×2）の指数移動平均の重み
+    "ema_alpha": 0.3,
+    # このスコア以上は毎回取得
+    "high_yield_threshold": 1.0,
+    # このスコア以上は medium_interval_hours ごと、未満は max_interval_hours ごとに取得
+    "low_yield_threshold": 0.2,
+    "medium_interval_hours": 6,
+    # 鮮度保証: どのフィードもこの時間以内には必ず取得する
+    "max_interval_hours": 24,
+    # 間隔のこの割合だけ早くても取得する（毎日の定時実行で、実行時刻のずれにより
+    # 24時間にわずかに満たず1日おきになるのを防ぐ）
+    "interval_slack_ratio": 0.1,
+    # 統計が貯まるまでは毎回取得する
+    "min_polls_before_backoff": 3
+}
+
+# 今回の実行で取得したフィードと歩留まり（実行終了時に統計へ反映）
+# polled: URL → {'polls': 取得回数, 'counted': 統計に反映済みの取得回数, 'last_polled_at'}
+# （常駐モードでは配信までに同じフィードを何度も取得する）
+# credited: 加算済みの (フィードURL, 指標, 記事署名)。複数銘柄で同じ記事が残っても1回だけ加算する
+RUN_YIELD = {
+    'polled': {},
+    'feeds': {},
+    'credited': set()
+}
+_lock = threading.Lock()
+
+
+def load_polling_policy():
+    """system_config.jsonからポーリングポリシーを読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_POLLING_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('feed_polling_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def load_feed_stats():
+    """フィード歩留まり統計を読み込み"""
+    try:
+        with open(FEED_STATS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"feeds": {}}
+
+
+def save_feed_stats(stats):
+    """フィード歩留まり統計を保存"""
+    with open(FEED_STATS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+
+def record_feed_polled(url, now=None):
+    """今回の実行でフィードを取得したことを取得日時とともに記録"""
+    now = (now or datetime.now(TW_TZ)).isoformat()
+    with _lock:
+        polled = RUN_YIELD['polled'].setdefault(url, {'polls': 0, 'counted': 0})
+        polled['polls'] += 1
+        polled['last_polled_at'] = now
+
+
+def record_feed_yield(feed_urls, field, signature):
+    """
+    記事の歩留まりを取得元フィードに加算する
+    同じ記事は実行中（常駐モードでは配信まで）フィード・指標ごとに1回だけ加算する
+    （フィードを共有する複数銘柄で同じ記事が残っても、歩留まりが水増しされないように）
+
+    Args:
+        feed_urls (list): 記事を返したフィードURL（feed_meta['feeds']）
+        field (str): 'new_unique' / 'survived' / 'delivered'
+        signature (str): 記事の署名
+    """
+    with _lock:
+        for url in feed_urls:
+            key = (url, field, signature)
+            if key in RUN_YIELD['credited']:
+                continue
+            RUN_YIELD['credited'].add(key)
+            counters = RUN_YIELD['feeds'].setdefault(
+                url, {'new_unique': 0, 'survived': 0, 'delivered': 0})
+            counters[field] += 1
+
+
+def reset_run_yield():
+    """取得実績と歩留まりをクリア（常駐モードで配信ごとに統計へ反映した後）"""
+    with _lock:
+        RUN_YIELD['polled'].clear()
+        RUN_YIELD['feeds'].clear()
+        RUN_YIELD['credited'].clear()
+
+
+def _new_feed_stats():
+    return {
+        'polls': 0,
+        'new_unique': 0,
+        'survived': 0,
+        'delivered': 0,
+        'yield_ema': 0.0
+    }
+
+
+def mark_feeds_polled(stats):
+    """
+    取得回数と取得日時だけを先に反映する（常駐モードのポーリングごと、歩留まりは配信時に反映）
+    低歩留まりフィードを間隔を空けずに取り直さないようにする
+    """
+    with _lock:
+        for url, polled in RUN_YIELD['polled'].items():
+            feed_stats = stats['feeds'].setdefault(url, _new_feed_stats())
+            feed_stats['polls'] += polled['polls'] - polled['counted']
+            polled['counted'] = polled['polls']
+            feed_stats['last_polled_at'] = polled['last_polled_at']
+
+
+def _poll_interval_hours(feed_stats, policy):
+    """フィード統計から取得間隔（時間）を決定。0は毎回取得"""
+    if feed_stats.get('polls', 0) < policy['min_polls_before_backoff']:
+        return 0
+    score = feed_stats.get('yield_ema', 0.0)
+    if score >= policy['high_yield_threshold']:
+        return 0
+    if score >= policy['low_yield_threshold']:
+        return min(policy['medium_interval_hours'], policy['max_interval_hours'])
+    return policy['max_interval_hours']
+
+
+def select_feeds_to_poll(feed_plan, stats, policy=None, now=None):
+    """
+    今回取得するフィードを選択する
+
+    Args:
+        feed_plan (list): フィード定義のリスト（feed_plan.build_feed_plan の戻り値）
+        stats (dict): load_feed_stats の戻り値
+        policy (dict): ポーリングポリシー（省略時は load_polling_policy）
+        now (datetime): 基準時刻（省略時は現在の台湾時間）
+
+    Returns:
+        list: 今回取得するフィード定義
+    """
+    if policy is None:
+        policy = load_polling_policy()
+    if not policy.get('enabled', True):
+        return list(feed_plan)
+    if now is None:
+        now = datetime.now(TW_TZ)
+
+    selected = []
+    for feed_def in feed_plan:
+        feed_stats = stats['feeds'].get(feed_def['url'], {})
+        interval = _poll_interval_hours(feed_stats, policy)
+        last_polled_at = feed_stats.get('last_polled_at')
+
+        if interval == 0 or not last_polled_at:
+            selected.append(feed_def)
+            continue
+
+        elapsed_hours = (now - datetime.fromisoformat(last_polled_at)).total_seconds() / 3600
+        if elapsed_hours >= interval * (1 - policy['interval_slack_ratio']):
+            selected.append(feed_def)
+
+    skipped = len(feed_plan) - len(selected)
+    if skipped:
+        print(f"⏭️ 低歩留まりフィードをスキップ: {skipped}件（取得 {len(selected)}件）")
+    return selected
+
+
+def update_feed_stats(stats, policy=None):
+    """
+    今回の実行の取得実績と歩留まりをフィード統計に反映する
+    取得日時は実行終了時ではなく実際に取得した日時にする（次回の間隔判定がずれないように）
+
+    歩留まりスコアは1回の取得あたりの値にし、指数移動平均は取得回数分だけ進める
+    （常駐モードで配信までに複数回取得した場合も、1回ずつ取得した場合と同じ重みになる）
+    """
+    if policy is None:
+        policy = load_polling_policy()
+    alpha = policy['ema_alpha']
+
+    with _lock:
+        for url, polled in RUN_YIELD['polled'].items():
+            counters = RUN_YIELD['feeds'].get(
+                url, {'new_unique': 0, 'survived': 0, 'delivered': 0})
+            feed_stats = stats['feeds'].setdefault(url, _new_feed_stats())
+            # mark_feeds_polled で反映済みの取得回数を除いた、今回より前の取得回数
+            previous_polls = feed_stats['polls'] - polled['counted']
+
+            score = (counters['survived'] + counters['delivered'] * 2) / polled['polls']
+            if previous_polls == 0:
+                feed_stats['yield_ema'] = round(score, 4)
+            else:
+                feed_stats['yield_ema'] = round(
+                    score + (feed_stats['yield_ema'] - score) * (1 - alpha) ** polled['polls'], 4)
+
+            feed_stats['polls'] = previous_polls + polled['polls']
+            polled['counted'] = polled['polls']
+            for field, count in counters.items():
+                feed_stats[field] += count
+            feed_stats['last_polled_at'] = polled['last_polled_at']
+
+    return stats
@@ -6,13 +6,13 @@
 """
 
 import os
-from openai import OpenAI
+import time
+from llm_client import get_openai_client
 from stock_price_analyzer import get_formatted_price_info
+from prompt_builder import build_headline_text, record_llm_usage
 import json
 
-client = OpenAI()
-
-def generate_investment_aux_news(stock_id, stock_info, recent_news_list):
+def generate_investment_aux_news(stock_id, stock_info, recent_news_list, timeout=None):
     """
     投資判断補助ニュースを生成する
     
@@ -20,6 +20,7 @@ def generate_investment_aux_news(stock_id, stock_info, recent_news_list):
         stock_id (str): 証券コード
         stock_info (dict): 銘柄情報
         recent_news_list (list): 直近の関連ニュースリスト
+        timeout (float): LLM呼び出しのタイムアウト（秒、Noneならクライアントの既定値）
         
     Returns:
         dict: 生成されたニュースデータ（タイトル、本文など）
@@ -34,8 +35,8 @@ def generate_investment_aux_news(stock_id, stock_info, recent_news_list):
     # ニュースの要約を作成（LLMへの入力用）
     news_summary_text = ""
     if recent_news_list:
-        for i, news in enumerate(recent_news_list[:5]): # 最新5件まで
-            news_summary_text += f"- {news['date'][:10]}: {news['title']}\n"
+        # 最新5件まで（重複見出し除外・トークン上限適用）
+        news_summary_text = build_headline_text(recent_news_list) + "\n"
     else:
         news_summary_text = "（直近の重要ニュースなし）"
         
@@ -70,16 +71,20 @@ def generate_investment_aux_news(stock_id, stock_info, recent_news_list):
 出力はJSONのみにしてください。
 """
 
+    request_options = {'timeout': timeout} if timeout is not None else {}
     try:
-        response = client.chat.completions.create(
+        started = time.perf_counter()
+        response = get_openai_client().chat.completions.create(
             model="gpt-4.1-mini",
             messages=[
                 {"role": "system", "content": "あなたは冷静沈着な株式市場アナリストです。JSON形式で出力します。"},
                 {"role": "user", "content": prompt}
             ],
             response_format={"type": "json_object"},
-            temperature=0.3
+            temperature=0.3,
+            **request_options
         )
+        record_llm_usage(f"投資判断補助({stock_id})", response, time.perf_counter() - started)
         
         content = response.choices[0].message.content
         result = json.loads(content)
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OpenAI クライアントの遅延初期化
+openai パッケージの読み込みとクライアント生成を初回呼び出しまで遅らせる
+（APIキーのない環境でもモジュールの import は失敗しない）
+"""
+
+import threading
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client():
+    """OpenAIクライアントを返す（初回呼び出し時に生成）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI()
+    return _client
+
+
+def set_openai_client(client):
+    """クライアントを差し替える（ベンチマーク・オフライン実行用）"""
+    global _client
+    _client = client
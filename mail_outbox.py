@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+メール送信アウトボックス
+レンダリング済みのメール（SendGrid v3 の送信JSON）をディスクに積み、送信は別に取り出して行う
+送信が遅い・失敗しても収集・分析の段階をやり直さず、未送信のメールは再起動後も残る
+
+    outbox/pending/<key>.json  未送信（次に送る時刻 next_attempt_at 以降に再送）
+    outbox/sending/<key>.json  送信中（pending から rename で取り出したプロセスだけが送る）
+    outbox/sent/<key>.json     送信済み（sent_retention_days 日後に削除）
+    outbox/failed/<key>.json   再送を打ち切ったもの（--drain-outbox --retry-failed で戻せる）
+
+- キー（冪等キー）は 実行ID・配信プロファイル・バッチ番号 から作り、同じメールは二重に積まない
+  送信JSONの custom_args.outbox_key にも入れる（イベントWebhookで重複を見分けられる）
+- 送信は max_per_second までに間隔を空け、失敗時は指数バックオフ（429 は Retry-After を優先）
+  drain_timeout_sec の間に再送予定が来るものはその場で待って再送し、残りは次回の実行・
+  常駐モードのポーリング・--drain-outbox で送る（定時実行だけの運用では --drain-outbox を
+  cron で定期実行すると、再送が翌日の実行まで遅れない）
+- 4xx（429 以外）は再送しても通らないため、すぐ failed に移す
+- 送信前に pending → sending へ rename して送信権を取るため、複数のプロセス（定時実行と
+  --drain-outbox・常駐モードなど）が同時に取り出しても同じメールを二重に送らない
+- 送信中に落ちて sending に claim_timeout_sec 以上残ったメールは pending に戻して再送する
+  （送信成功後、sent への移動前に落ちた場合も再送される。少なくとも1回の配信）
+
+設定は system_config.json の outbox_policy で上書きできる
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+import pytz
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+DEFAULT_OUTBOX_POLICY = {
+    "enabled": True,
+    "path": "outbox",
+    # 1秒あたりの最大送信数
+    "max_per_second": 5,
+    # 送信を試みる最大回数（これを超えたら failed）
+    "max_attempts": 6,
+    # 再送間隔（秒）: backoff_base_sec × 2^(試行回数-1)、上限 backoff_max_sec
+    # （1回目・2回目の再送が drain_timeout_sec に収まるよう短くする）
+    "backoff_base_sec": 5,
+    "backoff_max_sec": 3600,
+    # 配信処理の中で送信に使う時間の上限（この間に再送予定が来るものは待って送る。
+    # 残りは次回・常駐モードのポーリング・--drain-outbox で送る）
+    "drain_timeout_sec": 30,
+    # sending に残ったメールをこの秒数で送信中のプロセスが落ちたとみなし、pending に戻す
+    "claim_timeout_sec": 300,
+    "sent_retention_days": 7
+}
+
+STATES = ['pending', 'sending', 'sent', 'failed']
+
+_lock = threading.Lock()
+# 最後に送信した時刻（time.monotonic、送信間隔の調整用）
+_last_send = {'at': None}
+
+
+def load_outbox_policy():
+    """system_config.jsonからアウトボックス設定を読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_OUTBOX_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('outbox_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def outbox_key(run_id, profile, batch=0):
+    """冪等キー（同じ実行・プロファイル・バッチなら同じキー）"""
+    return hashlib.sha256(f"{run_id}|{profile}|{batch}".encode('utf-8')).hexdigest()[:32]
+
+
+def _path(policy, state, key):
+    return os.path.join(policy['path'], state, f"{key}.json")
+
+
+def _write_record(policy, state, record):
+    os.makedirs(os.path.join(policy['path'], state), exist_ok=True)
+    path = _path(policy, state, record['key'])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _move(policy, record, source, target):
+    """状態を移す（先に移動先を書いてから元を消す、途中で落ちても記録は失われない）"""
+    _write_record(policy, target, record)
+    try:
+        os.remove(_path(policy, source, record['key']))
+    except FileNotFoundError:
+        pass
+
+
+def message_state(key, policy=None):
+    """メールの状態（'sent' / 'failed' / 'sending' / 'pending'、積まれていなければNone）"""
+    policy = policy or load_outbox_policy()
+    # 移動の途中で落ちた場合も sent を優先する
+    for state in ('sent', 'failed', 'sending', 'pending'):
+        if os.path.exists(_path(policy, state, key)):
+            return state
+    return None
+
+
+def find_message(key, policy=None):
+    """メールの記録（'state' 付き、積まれていなければNone）"""
+    policy = policy or load_outbox_policy()
+    state = message_state(key, policy)
+    if state is None:
+        return None
+    try:
+        with open(_path(policy, state, key), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    record['state'] = state
+    return record
+
+
+def enqueue(payload, run_id, profile, batch=0, recipients=0, policy=None):
+    """
+    送信JSONをアウトボックスに積む（同じキーが積まれていれば何もしない）
+
+    Args:
+        payload (dict): SendGrid v3 の送信JSON（Mail.get() の結果）
+
+    Returns:
+        str: 冪等キー
+    """
+    policy = policy or load_outbox_policy()
+    key = outbox_key(run_id, profile, batch)
+    with _lock:
+        if message_state(key, policy) is not None:
+            return key
+        now = datetime.now(TW_TZ).isoformat()
+        payload = dict(payload)
+        payload['custom_args'] = dict(payload.get('custom_args', {}), outbox_key=key)
+        _write_record(policy, 'pending', {
+            'key': key,
+            'run_id': run_id,
+            'profile': profile,
+            'batch': batch,
+            'recipients': recipients,
+            'created_at': now,
+            'attempts': 0,
+            'next_attempt_at': now,
+            'last_error': None,
+            'payload': payload
+        })
+    return key
+
+
+def _load_records(policy, state):
+    directory = os.path.join(policy['path'], state)
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    except FileNotFoundError:
+        return []
+
+    records = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                records.append(json.load(f))
+        except FileNotFoundError:
+            # 一覧を取った後に別のプロセスが取り出した・移した
+            continue
+        except json.JSONDecodeError as e:
+            print(f"⚠️ アウトボックス読み込みエラー: {name}: {e}")
+    return records
+
+
+def outbox_counts(policy=None):
+    """状態ごとの件数"""
+    policy = policy or load_outbox_policy()
+    counts = {}
+    for state in STATES:
+        try:
+            counts[state] = sum(1 for name in os.listdir(os.path.join(policy['path'], state))
+                                if name.endswith('.json'))
+        except FileNotFoundError:
+            counts[state] = 0
+    return counts
+
+
+def _wait_for_rate_limit(policy):
+    """max_per_second を超えないよう前回の送信から間隔を空ける"""
+    interval = 1.0 / policy['max_per_second'] if policy['max_per_second'] else 0.0
+    with _lock:
+        now = time.monotonic()
+        send_at = max(now, (_last_send['at'] or now) + interval)
+        _last_send['at'] = send_at
+    if send_at > now:
+        time.sleep(send_at - now)
+
+
+def _retry_after(error):
+    """429 の Retry-After（秒、なければNone）"""
+    headers = getattr(error, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(status_code):
+    """通信エラー・429・5xx は再送する（それ以外の 4xx は再送しても通らない）"""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def _claim(policy, key):
+    """
+    pending → sending に rename して送信権を取り、最新の記録を返す
+    別のプロセスが先に取り出した場合はNone
+    """
+    os.makedirs(os.path.join(policy['path'], 'sending'), exist_ok=True)
+    path = _path(policy, 'sending', key)
+    try:
+        os.rename(_path(policy, 'pending', key), path)
+    except FileNotFoundError:
+        return None
+    # 取り出した時刻（claim_timeout_sec の判定用）
+    os.utime(path)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"⚠️ アウトボックス読み込みエラー: {key}: {e}")
+        _release(policy, key)
+        return None
+
+
+def _release(policy, key):
+    """送らなかったメールを sending → pending に戻す"""
+    try:
+        os.rename(_path(policy, 'sending', key), _path(policy, 'pending', key))
+    except FileNotFoundError:
+        pass
+
+
+def _release_stale_claims(policy):
+    """claim_timeout_sec を過ぎても sending に残っているメール（送信中に落ちた）を pending に戻す"""
+    directory = os.path.join(policy['path'], 'sending')
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith('.json')]
+    except FileNotFoundError:
+        return
+    cutoff = time.time() - policy['claim_timeout_sec']
+    for name in names:
+        try:
+            if os.path.getmtime(os.path.join(directory, name)) >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        key = name[:-len('.json')]
+        print(f"♻️ アウトボックス: 送信中のまま残ったメールを再送待ちに戻します（{key}）")
+        _release(policy, key)
+
+
+def _record_failure(policy, record, error, now):
+    """失敗を記録して再送予定を決める（sending から移す）、移した状態（'pending' / 'failed'）を返す"""
+    status_code = getattr(error, 'status_code', None)
+    record['attempts'] += 1
+    record['last_error'] = {'status_code': status_code, 'message': str(error)[:500],
+                            'at': now.isoformat()}
+
+    if not _is_retryable(status_code) or record['attempts'] >= policy['max_attempts']:
+        _move(policy, record, 'sending', 'failed')
+        return 'failed'
+
+    delay = _retry_after(error)
+    if delay is None:
+        delay = min(policy['backoff_max_sec'],
+                    policy['backoff_base_sec'] * 2 ** (record['attempts'] - 1))
+        # 同時に失敗したメールの再送が重ならないよう最大20%ずらす
+        delay *= 1 + random.random() * 0.2
+    record['next_attempt_at'] = (now + timedelta(seconds=delay)).isoformat()
+    # 取り出したまま書き直してから戻す（戻した直後に別のプロセスが取り出しても記録は1つ）
+    _write_record(policy, 'sending', record)
+    _release(policy, record['key'])
+    return 'pending'
+
+
+def _clean_sent(policy, now):
+    cutoff = (now - timedelta(days=policy['sent_retention_days'])).isoformat()
+    for record in _load_records(policy, 'sent'):
+        if record.get('sent_at', '') < cutoff:
+            try:
+                os.remove(_path(policy, 'sent', record['key']))
+            except FileNotFoundError:
+                pass
+
+
+def _drain_due(policy, get_client, stats, expired):
+    """送信予定を過ぎた未送信メールを古い順に送る（1件ずつ sending に取り出してから送る）、時間切れならFalse"""
+    now = datetime.now(TW_TZ)
+    due = [record for record in _load_records(policy, 'pending')
+           if datetime.fromisoformat(record['next_attempt_at']) <= now]
+    due.sort(key=lambda record: record['created_at'])
+
+    for record in due:
+        if expired():
+            print("⏳ アウトボックス: 時間切れのため残りは次回送信します")
+            return False
+        record = _claim(policy, record['key'])
+        if record is None:
+            # 別のプロセスが取り出した
+            continue
+        if os.path.exists(_path(policy, 'sent', record['key'])):
+            # 送信済みへの移動の途中で落ちた残り
+            os.remove(_path(policy, 'sending', record['key']))
+            continue
+        if datetime.fromisoformat(record['next_attempt_at']) > datetime.now(TW_TZ):
+            # 読み込んだ後に別のプロセスが送信を試み、再送予定が先に延びた
+            _release(policy, record['key'])
+            continue
+
+        _wait_for_rate_limit(policy)
+        try:
+            response = get_client().send(record['payload'])
+        except Exception as e:
+            state = _record_failure(policy, record, e, datetime.now(TW_TZ))
+            stats['failed' if state == 'failed' else 'retry'] += 1
+            label = '再送を打ち切り' if state == 'failed' else f"再送予定 {record['next_attempt_at'][:19]}"
+            print(f"❌ 送信エラー（{record['profile']}、{record['attempts']}回目）: {e}（{label}）")
+            continue
+
+        record['attempts'] += 1
+        record['status_code'] = response.status_code
+        record['sent_at'] = datetime.now(TW_TZ).isoformat()
+        _move(policy, record, 'sending', 'sent')
+        stats['sent'] += 1
+    return True
+
+
+def _next_attempt_at(policy):
+    """未送信メールのうち最も早い送信予定（なければNone）"""
+    return min((datetime.fromisoformat(record['next_attempt_at'])
+                for record in _load_records(policy, 'pending')), default=None)
+
+
+def drain_outbox(client_factory, policy=None, timeout=None):
+    """
+    送信予定を過ぎた未送信メールを古い順に送る
+    timeout があれば、その間に再送予定が来るメールは待って送る
+    （一時的なエラーで次回の実行まで遅れないよう、1回目の再送間隔 backoff_base_sec は短くしておく）
+
+    Args:
+        client_factory: SendGridクライアントを返す関数（送るものがある場合だけ呼ぶ）
+        timeout: 送信に使う時間の上限（秒、Noneなら予定を過ぎたものをすべて送り、再送予定は待たない）
+
+    Returns:
+        dict: {'sent', 'retry', 'failed'}（今回の結果）と {'pending', 'sent_total', 'failed_total'}
+    """
+    policy = policy or load_outbox_policy()
+    started = time.monotonic()
+    stats = {'sent': 0, 'retry': 0, 'failed': 0}
+    _release_stale_claims(policy)
+
+    def expired():
+        return timeout is not None and time.monotonic() - started >= timeout
+
+    clients = []
+
+    def get_client():
+        if not clients:
+            clients.append(client_factory())
+        return clients[0]
+
+    while _drain_due(policy, get_client, stats, expired) and timeout is not None:
+        next_attempt_at = _next_attempt_at(policy)
+        if next_attempt_at is None:
+            break
+        wait = (next_attempt_at - datetime.now(TW_TZ)).total_seconds()
+        if wait >= timeout - (time.monotonic() - started):
+            break
+        if wait > 0:
+            print(f"⏳ アウトボックス: {wait:.0f}秒後に再送します")
+            time.sleep(wait)
+
+    _clean_sent(policy, datetime.now(TW_TZ))
+    counts = outbox_counts(policy)
+    stats.update(pending=counts['pending'], sent_total=counts['sent'],
+                 failed_total=counts['failed'])
+    return stats
+
+
+def requeue_failed(policy=None):
+    """failed のメールを pending に戻す（試行回数をリセット）、戻した件数を返す"""
+    policy = policy or load_outbox_policy()
+    now = datetime.now(TW_TZ).isoformat()
+    records = _load_records(policy, 'failed')
+    for record in records:
+        record.update(attempts=0, next_attempt_at=now)
+        _move(policy, record, 'failed', 'pending')
+    return len(records)
+
+
+def print_outbox_stats(stats):
+    """送信結果を表示"""
+    print(f"📤 アウトボックス: 送信 {stats['sent']} / 再送待ち {stats['pending']} / "
+          f"失敗 {stats['failed_total']}" +
+          (f"（今回 再送予定 {stats['retry']}、打ち切り {stats['failed']}）"
+           if stats['retry'] or stats['failed'] else ""))
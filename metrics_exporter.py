@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prometheusメトリクス出力モジュール（node_exporter textfile collector 用）
+実行レポート（run_report）を Prometheus テキスト形式に変換し、実行終了時に書き出す
+
+出力先は system_config.json の metrics_export.textfile_path
+（環境変数 METRICS_TEXTFILE_PATH があればそちらを優先）
+collector が書きかけのファイルを読まないよう、一時ファイルに書いてから置き換える
+"""
+
+import json
+import os
+import time
+
+from run_report import FEED_LATENCY_BUCKETS
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+METRIC_PREFIX = 'taiwan_stock_news'
+
+DEFAULT_METRICS_EXPORT = {
+    "enabled": True,
+    "textfile_path": "taiwan_stock_news.prom"
+}
+
+# メール送信結果（status ラベルとして常に全種類を出力し、該当するものだけ1にする）
+DELIVERY_STATUSES = ['sent', 'queued', 'failed', 'skipped', 'no_results', 'already_sent']
+
+# summary の分位点（run_report の latency_summary のキー）
+SUMMARY_QUANTILES = [('0.5', 'p50_sec'), ('0.9', 'p90_sec'), ('0.99', 'p99_sec')]
+
+
+def load_metrics_export_config():
+    """system_config.jsonから出力設定を読み込む（環境変数で出力先を上書き可能）"""
+    config = dict(DEFAULT_METRICS_EXPORT)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config.update(json.load(f).get('metrics_export', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    if os.environ.get('METRICS_TEXTFILE_PATH'):
+        config['textfile_path'] = os.environ['METRICS_TEXTFILE_PATH']
+    return config
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _MetricWriter:
+    """HELP / TYPE 行と系列をまとめて出力するための小さなヘルパー"""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, metric_type, help_text, samples):
+        """
+        samples: [(ラベル辞書, 値)] または [(サフィックス, ラベル辞書, 値)]
+        """
+        full_name = f"{METRIC_PREFIX}_{name}"
+        self.lines.append(f"# HELP {full_name} {help_text}")
+        self.lines.append(f"# TYPE {full_name} {metric_type}")
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ('', *sample)
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join(
+                    f'{key}="{_escape_label(val)}"' for key, val in labels.items()) + '}'
+            self.lines.append(f"{full_name}{suffix}{label_text} {_format_value(value)}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_prometheus(report, now=None):
+    """実行レポートを Prometheus テキスト形式に変換"""
+    counters = report.get('counters', {})
+    writer = _MetricWriter()
+
+    writer.metric('last_run_timestamp_seconds', 'gauge',
+                  'Unix time the last run finished.',
+                  [({'version': report.get('version', '')}, int(now or time.time()))])
+    writer.metric('last_run_delivered_stocks', 'gauge',
+                  'Stocks included in the last email.',
+                  [({}, report.get('delivered_stocks') or 0)])
+    writer.metric('last_run_degradations', 'gauge',
+                  'Deadline degradations applied in the last run.',
+                  [({}, len(report.get('degradations', [])))])
+
+    # 段階ごとの時間
+    stages = report.get('stages', {})
+    writer.metric('stage_duration_seconds', 'gauge',
+                  'Wall-clock time per pipeline stage in the last run.',
+                  [({'stage': stage}, timing['wall_sec']) for stage, timing in stages.items()])
+    writer.metric('stage_cpu_seconds', 'gauge',
+                  'CPU time per pipeline stage in the last run.',
+                  [({'stage': stage}, timing['cpu_sec']) for stage, timing in stages.items()])
+
+    # フィード取得（ヒストグラムは累積件数に変換）
+    feeds = report.get('feeds', {})
+    feed_latency = feeds.get('latency', {})
+    histogram = feeds.get('latency_histogram', {})
+    cumulative = 0
+    buckets = []
+    for bound in FEED_LATENCY_BUCKETS:
+        cumulative += histogram.get(f"<={bound}", 0)
+        buckets.append(('_bucket', {'le': str(bound)}, cumulative))
+    buckets.append(('_bucket', {'le': '+Inf'}, feed_latency.get('count', 0)))
+    buckets.append(('_sum', {}, feed_latency.get('sum_sec', 0.0)))
+    buckets.append(('_count', {}, feed_latency.get('count', 0)))
+    writer.metric('feed_fetch_duration_seconds', 'histogram',
+                  'Feed fetch latency in the last run.', buckets)
+    writer.metric('feeds_fetched', 'gauge',
+                  'Feeds fetched in the last run.',
+                  [({}, feed_latency.get('count', 0))])
+
+    # リダイレクト解決
+    redirects = report.get('redirects', {})
+    attempted = redirects.get('latency', {}).get('count', 0)
+    timed_out = redirects.get('timeout', 0)
+    failed = redirects.get('failed', 0)
+    writer.metric('redirects', 'gauge',
+                  'Redirect resolutions in the last run by result.',
+                  [({'result': 'resolved'}, max(0, attempted - timed_out - failed)),
+                   ({'result': 'timeout'}, timed_out),
+                   ({'result': 'failed'}, failed)])
+    redirect_latency = redirects.get('latency', {})
+    writer.metric('redirect_duration_seconds', 'summary',
+                  'Redirect resolution latency in the last run.',
+                  [({'quantile': quantile}, redirect_latency.get(key))
+                   for quantile, key in SUMMARY_QUANTILES] +
+                  [('_sum', {}, redirect_latency.get('sum_sec', 0.0)),
+                   ('_count', {}, attempted)])
+
+    # キャッシュ
+    writer.metric('cache_requests', 'gauge',
+                  'Cache lookups in the last run by cache and result.',
+                  [({'cache': 'news', 'result': 'hit'}, counters.get('cache_hit', 0)),
+                   ({'cache': 'news', 'result': 'miss'}, counters.get('cache_miss', 0)),
+                   ({'cache': 'relevance', 'result': 'hit'}, counters.get('relevance_cache_hit', 0)),
+                   ({'cache': 'relevance', 'result': 'miss'}, counters.get('relevance_cache_miss', 0))])
+
+    # LLM
+    llm = report.get('llm', {})
+    llm_latency = llm.get('latency', {})
+    writer.metric('llm_calls', 'gauge',
+                  'LLM API calls in the last run.',
+                  [({}, llm.get('calls', 0))])
+    writer.metric('llm_tokens', 'gauge',
+                  'LLM tokens used in the last run.',
+                  [({'kind': 'prompt'}, llm.get('prompt_tokens', 0)),
+                   ({'kind': 'completion'}, llm.get('completion_tokens', 0))])
+    writer.metric('llm_duration_seconds', 'summary',
+                  'LLM call latency in the last run.',
+                  [({'quantile': quantile}, llm_latency.get(key))
+                   for quantile, key in SUMMARY_QUANTILES] +
+                  [('_sum', {}, llm_latency.get('sum_sec', 0.0)),
+                   ('_count', {}, llm_latency.get('count', 0))])
+
+    # 株価取得
+    prices = report.get('prices', {})
+    writer.metric('price_fetches', 'gauge',
+                  'Stock price fetches in the last run by result.',
+                  [({'result': 'ok'}, prices.get('fetched', 0)),
+                   ({'result': 'failed'}, prices.get('failed', 0))])
+
+    # メール送信
+    delivery = report.get('delivery', {})
+    writer.metric('email_send_status', 'gauge',
+                  'Email delivery result of the last run (1 for the current status).',
+                  [({'status': status}, int(delivery.get('status') == status))
+                   for status in DELIVERY_STATUSES])
+    if delivery.get('status_code') is not None:
+        writer.metric('email_send_status_code', 'gauge',
+                      'HTTP status code returned by the mail API in the last run.',
+                      [({}, delivery['status_code'])])
+    if 'outbox' in delivery:
+        writer.metric('email_outbox_messages', 'gauge',
+                      'Messages in the mail outbox after the last run by state.',
+                      [({'state': state}, count) for state, count in delivery['outbox'].items()])
+
+    # その他のカウンタ（STATS）
+    writer.metric('pipeline_events', 'gauge',
+                  'Pipeline counters (STATS) in the last run.',
+                  [({'event': name}, value) for name, value in sorted(counters.items())])
+
+    return writer.text()
+
+
+def write_textfile(report, path=None):
+    """
+    Prometheus テキスト形式で書き出す（一時ファイル経由で置き換え）
+
+    Returns:
+        str: 書き出したパス（無効時はNone）
+    """
+    config = load_metrics_export_config()
+    if path is None:
+        if not config['enabled']:
+            return None
+        path = config['textfile_path']
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_prometheus(report))
+    os.replace(tmp_path, path)
+    return path
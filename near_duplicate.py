@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重複記事の検出モジュール（SimHash）
+- 複数媒体に配信された通信社記事や、タイトルを軽微に編集した転載記事を1件に集約
+- 指紋（64bit SimHash）はニュースキャッシュの各記事に保存し、再計算しない
+- ハミング距離の近傍探索はビット帯（バンド）索引で行う
+  （距離 d 以内なら d+1 分割したバンドのどれかが完全一致する）
+  索引はニュースキャッシュと一緒にメモリ上で保持し、集約のたびに新しい記事だけ追加する
+- 集約結果は代表記事のビュー（AnnotatedNews）で返し、共有の記事レコードは変更しない
+"""
+
+import hashlib
+import json
+import re
+
+from news_record import AnnotatedNews, source_article
+from prompt_builder import clean_title
+
+SIMHASH_BITS = 64
+NGRAM_SIZE = 3
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+DEFAULT_NEAR_DUPLICATE_POLICY = {
+    "enabled": True,
+    # この距離以内の記事を同一記事として集約
+    "max_hamming_distance": 3
+}
+
+
+def load_near_duplicate_policy():
+    """system_config.jsonから近似重複判定ポリシーを読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_NEAR_DUPLICATE_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('near_duplicate_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def fingerprint_text(title, publisher):
+    """
+    指紋用テキストを作成
+    Google Newsのタイトル末尾「 - 媒体名」を除去し（prompt_builder.clean_title）、
+    媒体名が一致しない場合も末尾の「 - 短い語句」を除いてから、記号・空白を除いて小文字化
+    """
+    title = clean_title(title, publisher)
+    title = re.sub(r'\s+-\s+[^-]{1,30}$', '', title)
+    return re.sub(r'[^\w]', '', title).lower()
+
+
+def compute_simhash(text):
+    """文字n-gramから64bitのSimHashを計算"""
+    if len(text) <= NGRAM_SIZE:
+        shingles = [text]
+    else:
+        shingles = [text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(
+            hashlib.md5(shingle.encode('utf-8')).digest()[:8], 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    value = 0
+    for bit in range(SIMHASH_BITS):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    return value
+
+
+def hamming_distance(a, b):
+    """2つの指紋のハミング距離"""
+    return bin(a ^ b).count('1')
+
+
+def get_simhash(news):
+    """記事の指紋を取得（未計算ならキャッシュ上の記事レコードに保存）"""
+    article = source_article(news)
+    if not article.get('simhash'):
+        article['simhash'] = format(
+            compute_simhash(fingerprint_text(article['title'], article.get('publisher'))), '016x')
+    return int(article['simhash'], 16)
+
+
+def _band_keys(value, bands):
+    """指紋をバンドに分割した索引キー"""
+    width = SIMHASH_BITS // bands
+    mask = (1 << width) - 1
+    return [(i, value >> (i * width) & mask) for i in range(bands)]
+
+
+def new_band_index(max_distance=3):
+    """バンド索引 {'bands': 分割数, 'buckets': {(バンド番号, 値): {記事署名}}}"""
+    return {'bands': max_distance + 1, 'buckets': {}}
+
+
+def add_to_band_index(index, signature, value):
+    """記事の指紋を索引に追加"""
+    for key in _band_keys(value, index['bands']):
+        index['buckets'].setdefault(key, set()).add(signature)
+
+
+def prune_band_index(index, signatures):
+    """signatures（キャッシュに残っている記事署名）にない記事を索引から除く"""
+    for key, bucket in list(index['buckets'].items()):
+        bucket.difference_update([signature for signature in bucket if signature not in signatures])
+        if not bucket:
+            del index['buckets'][key]
+
+
+def _merged_feed_meta(items):
+    """取得元フィードのメタデータを統合（集約後も全購読銘柄に届くように）"""
+    metas = [item['feed_meta'] for item in items if 'feed_meta' in item]
+    if not metas:
+        return None
+    keys = dict.fromkeys(key for meta in metas for key in meta)
+    return {key: sorted({value for meta in metas for value in meta.get(key, [])})
+            for key in keys}
+
+
+def _canonical_view(canonical, duplicates):
+    """代表記事のビュー（別媒体の一覧と統合した取得元メタデータを重ねる）"""
+    view = canonical.copy() if isinstance(canonical, AnnotatedNews) else AnnotatedNews(canonical)
+    view['alternate_sources'] = [
+        {'publisher': d['publisher'], 'url': d['url'], 'title': d['title']}
+        for d in duplicates]
+    feed_meta = _merged_feed_meta([canonical] + duplicates)
+    if feed_meta is not None:
+        view['feed_meta'] = feed_meta
+    return view
+
+
+def collapse_near_duplicates(news_list, max_distance=3, index=None):
+    """
+    近似重複記事を1件の代表記事に集約する
+
+    Args:
+        news_list (list): 記事リスト（URL重複除外済み）
+        max_distance (int): 同一記事とみなすハミング距離の上限
+        index (dict): 保持しているバンド索引（new_band_index、今回の記事を追加する）
+            省略時・分割数が異なる場合はこの呼び出しだけの索引を作る
+
+    Returns:
+        tuple: (集約後の記事リスト, 集約で除外した件数)
+            代表記事（最も早く配信された記事）は alternate_sources に
+            他の媒体の {publisher, url, title} を列挙したビューになる
+    """
+    if index is None or index['bands'] != max_distance + 1:
+        index = new_band_index(max_distance)
+    groups = []
+    # 今回の代表記事の署名 → groups の番号
+    canonical_ids = {}
+
+    # 早く配信された記事を代表にする（同時刻は署名順で決定的に）
+    ordered = sorted(news_list, key=lambda n: (n['date'], n['signature']))
+
+    for news in ordered:
+        value = get_simhash(news)
+
+        # 索引には過去の実行の記事も入っているため、今回の代表記事だけを候補にする
+        # 候補が複数あれば最も早い代表記事にまとめる（集合の順序によらず決定的に）
+        matches = [
+            canonical_ids[signature]
+            for key in _band_keys(value, index['bands'])
+            for signature in index['buckets'].get(key, ())
+            if signature in canonical_ids]
+        matches = [group_id for group_id in matches
+                   if hamming_distance(value, groups[group_id][0]) <= max_distance]
+        add_to_band_index(index, news['signature'], value)
+
+        if matches:
+            groups[min(matches)][2].append(news)
+        else:
+            canonical_ids[news['signature']] = len(groups)
+            groups.append((value, news, []))
+
+    collapsed = []
+    removed = 0
+    for _, canonical, duplicates in groups:
+        if duplicates:
+            canonical = _canonical_view(canonical, duplicates)
+            removed += len(duplicates)
+        collapsed.append(canonical)
+
+    return collapsed, removed
@@ -9,17 +9,18 @@
 
 import json
 import re
-from openai import OpenAI
+import time
+from llm_client import get_openai_client
+from prompt_builder import build_cluster_news_text, record_llm_usage
 
-client = OpenAI()
-
-def cluster_news_by_topic(stock_name, relevant_news):
+def cluster_news_by_topic(stock_name, relevant_news, timeout=None):
     """
     ニュースを論点クラスタで分類
     
     Args:
         stock_name: 銘柄名
         relevant_news: 関連ニュースリスト
+        timeout: LLM呼び出しのタイムアウト（秒、Noneならクライアントの既定値）
     
     Returns:
         dict: {
@@ -40,15 +41,10 @@ def cluster_news_by_topic(stock_name, relevant_news):
             'event_description': None
         }
     
-    # ニューステキストを準備
-    news_text = "\n\n".join([
-        f"[{i+1}] タイトル: {news['title']}\n"
-        f"    出典: {news['publisher']}\n"
-        f"    概要: {news['snippet']}\n"
-        f"    関連性スコア: {news['relevance_score']}\n"
-        f"    判定理由: {news['relevance_reason']}"
-        for i, news in enumerate(relevant_news)
-    ])
+    # ニューステキストを準備（HTML除去・重複除去・トークン上限適用）
+    # （rank_candidates で同じ上限内に絞り込み済みのため、通常は全件が入る）
+    news_text, included = build_cluster_news_text(relevant_news)
+    relevant_news = relevant_news[:included]
     
     prompt = f"""
 あなたは台湾株の投資判断を支援するアナリストです。
@@ -94,15 +90,19 @@ def cluster_news_by_topic(stock_name, relevant_news):
 }}
 """
     
+    request_options = {'timeout': timeout} if timeout is not None else {}
     try:
-        response = client.chat.completions.create(
+        started = time.perf_counter()
+        response = get_openai_client().chat.completions.create(
             model="gpt-4.1-mini",
             messages=[
                 {"role": "system", "content": "あなたは台湾株の投資判断を支援するアナリストです。"},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.3
+            temperature=0.3,
+            **request_options
         )
+        record_llm_usage(f"クラスタリング({stock_name})", response, time.perf_counter() - started)
         
         result_text = response.choices[0].message.content.strip()
         # JSONを抽出
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+記事レコードモジュール
+- NewsArticle: 取り込みから配信まで共有する記事レコード（__slots__で省メモリ）
+- AnnotatedNews: 銘柄ごと・実行ごとの注釈（関連スコア・クラスタ情報・近似重複の別媒体など）を重ねたビュー
+- AnnotationOverlay: (銘柄, 記事) ごとの注釈テーブル（ビューの生成元）
+- RssEntry: feedparserのエントリから必要な項目だけを抜き出した軽量エントリ
+
+既存コードとの互換のため、いずれも news['title'] / news.get('snippet') の形で参照できる
+共有の NewsArticle には銘柄ごと・実行ごとの項目（取得元フィードのメタデータなど）を
+書き込めない（注釈はビュー側に保持する）
+"""
+
+import sys
+
+
+class NewsArticle:
+    """取り込み済み記事（ニュースキャッシュに保存される単位）"""
+
+    __slots__ = (
+        'title',
+        'url',
+        'publisher',
+        'date',
+        'snippet',
+        'signature',
+        'cached_at',
+        # 概要から抽出したリンク一覧と概要の正規化バージョン（snippet_normalizer）
+        'snippet_links',
+        'snippet_version',
+        # 近似重複検出の指紋（16進文字列）
+        'simhash',
+    )
+
+    # キャッシュに保存する項目
+    CACHE_FIELDS = (
+        'title',
+        'url',
+        'publisher',
+        'date',
+        'snippet',
+        'signature',
+        'cached_at',
+        'snippet_links',
+        'snippet_version',
+        'simhash',
+    )
+
+    def __init__(self, title, url, publisher, date, snippet, signature, cached_at,
+                 snippet_links=None, snippet_version=None,
+                 simhash=None):
+        self.title = title
+        self.url = url
+        # 媒体名は記事間で重複が多いためインターンする
+        self.publisher = sys.intern(publisher) if publisher else publisher
+        self.date = date
+        self.snippet = snippet
+        self.signature = signature
+        self.cached_at = cached_at
+        self.snippet_links = snippet_links
+        self.snippet_version = snippet_version
+        self.simhash = simhash
+
+    @classmethod
+    def from_cache_dict(cls, data):
+        """キャッシュ（JSON）の辞書から記事レコードを復元"""
+        return cls(**{field: data.get(field) for field in cls.CACHE_FIELDS})
+
+    def to_cache_dict(self):
+        """キャッシュ（JSON）保存用の辞書に変換（未設定項目は省略）"""
+        return {
+            field: getattr(self, field)
+            for field in self.CACHE_FIELDS
+            if getattr(self, field) is not None}
+
+    def __getitem__(self, key):
+        try:
+            value = getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(f"{key} は記事レコードの項目ではありません（銘柄ごとの注釈は AnnotatedNews へ）")
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        self[key] = None
+
+    def __contains__(self, key):
+        return getattr(self, key, None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"NewsArticle({self.signature!r}, {self.title[:30]!r})"
+
+
+class AnnotatedNews:
+    """
+    銘柄ごとの注釈を重ねた記事ビュー
+    参照は注釈 → 記事の順に解決し、書き込みは注釈側にのみ行う
+    copy() は注釈だけを複製する（記事本体は共有のまま）
+    """
+
+    __slots__ = ('article', 'notes')
+
+    def __init__(self, article, notes=None):
+        self.article = article
+        self.notes = notes if notes is not None else {}
+
+    def __getitem__(self, key):
+        if key in self.notes:
+            return self.notes[key]
+        return self.article[key]
+
+    def __setitem__(self, key, value):
+        self.notes[key] = value
+
+    def __contains__(self, key):
+        return key in self.notes or key in self.article
+
+    def get(self, key, default=None):
+        if key in self.notes:
+            return self.notes[key]
+        return self.article.get(key, default)
+
+    def copy(self):
+        return AnnotatedNews(self.article, dict(self.notes))
+
+    def __repr__(self):
+        return f"AnnotatedNews({self.article!r}, {sorted(self.notes)!r})"
+
+
+class AnnotationOverlay:
+    """
+    (銘柄, 記事署名) ごとの注釈テーブル
+    クラスタリング・投資判断補助・テンプレートは AnnotatedNews ビュー経由で注釈を参照する
+    銘柄ごとにキーが分かれるため、銘柄を並列処理してもロック不要
+    """
+
+    __slots__ = ('_notes',)
+
+    def __init__(self):
+        self._notes = {}
+
+    def annotate(self, stock_id, article, **fields):
+        """注釈を追加し、その銘柄から見た記事ビューを返す"""
+        notes = self._notes.setdefault((stock_id, article['signature']), {})
+        notes.update(fields)
+        return AnnotatedNews(article, notes)
+
+    def view(self, stock_id, article):
+        """その銘柄から見た記事ビュー（注釈がなければ記事そのままの値）"""
+        return AnnotatedNews(
+            article, self._notes.setdefault((stock_id, article['signature']), {}))
+
+
+def source_article(news):
+    """ビューをたどって共有の記事レコードを返す（記事レコードならそのまま）"""
+    while isinstance(news, AnnotatedNews):
+        news = news.article
+    return news
+
+
+class RssEntry:
+    """feedparserエントリのうち、記事処理に必要な項目だけを保持する軽量エントリ"""
+
+    __slots__ = ('link', 'title', 'summary', 'published', 'pub_date', 'source_title')
+
+    def __init__(self, link, title, summary, published, pub_date, source_title):
+        self.link = link
+        self.title = title
+        self.summary = summary
+        self.published = published
+        # 解析済みの配信日時（解析できない場合はNone）
+        self.pub_date = pub_date
+        self.source_title = source_title
+
+    @classmethod
+    def from_feedparser(cls, entry, pub_date=None):
+        """feedparserのエントリから生成（元のエントリは保持しない）"""
+        source_title = entry.source.get('title') if 'source' in entry else None
+        return cls(
+            link=entry.get("link", ""),
+            title=entry.get("title", ""),
+            summary=entry.get("summary", ""),
+            published=entry.get("published"),
+            pub_date=pub_date,
+            source_title=source_title)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LLMプロンプト構築モジュール（クラスタリング・投資判断補助で共通）
+- Google Newsの概要（HTML）をプレーンテキスト化
+- タイトル・媒体名の重複を除去
+- 記事ごとのトークン上限で切り詰め、リクエスト全体のトークン上限を適用
+- LLM呼び出しごとのトークン数・レイテンシを記録（実行サマリー用）
+
+トークン数は tiktoken があればそれを使い、なければ文字種からの概算を使う
+"""
+
+import html
+import re
+import threading
+from datetime import datetime, timezone
+
+# gpt-4.1 系のエンコーディング
+TOKENIZER_ENCODING = "o200k_base"
+
+# クラスタリングプロンプト: 1記事あたり / ニュースリスト全体のトークン上限
+# （全体上限は候補の絞り込み candidate_ranking.rank_candidates の予算にもなる）
+CLUSTER_ARTICLE_TOKENS = 120
+CLUSTER_TOTAL_TOKENS = 3000
+
+# 投資判断補助プロンプト: 見出し1件あたり / 見出し全体のトークン上限
+AUX_HEADLINE_TOKENS = 60
+AUX_TOTAL_TOKENS = 300
+AUX_MAX_HEADLINES = 5
+
+_tag = re.compile(r'<[^>]+>')
+_space = re.compile(r'\s+')
+_ascii_word = re.compile(r'[A-Za-z0-9]+')
+
+# None: 未初期化, False: tiktoken なし（概算を使用）
+_encoding = None
+_encoding_lock = threading.Lock()
+
+# LLM呼び出しの記録: [{'label', 'prompt_tokens', 'completion_tokens', 'latency_sec'}]
+LLM_USAGE = []
+
+
+def strip_html(text):
+    """HTMLタグを除去し、実体参照を戻して空白を圧縮"""
+    if not text:
+        return ""
+    text = _tag.sub(' ', text)
+    text = html.unescape(text).replace('\xa0', ' ')
+    return _space.sub(' ', text).strip()
+
+
+def _get_encoding():
+    """tiktokenのエンコーディング（任意依存、初回呼び出し時に読み込む）"""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except ImportError:
+                    _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    """
+    トークン数を数える
+    tiktokenがない場合は概算（漢字・かなは1文字1トークン、英数字は4文字1トークン）
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(len(word) for word in _ascii_word.findall(text))
+    non_space = len(text) - ascii_chars - text.count(' ')
+    return non_space + (ascii_chars + 3) // 4
+
+
+def truncate_to_tokens(text, max_tokens):
+    """トークン上限で切り詰め（切り詰めた場合は末尾に…）"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens]).rstrip() + "…"
+
+    # 概算の場合は二分探索で文字数を決める
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low].rstrip() + "…"
+
+
+def clean_title(title, publisher):
+    """Google Newsタイトル末尾の「 - 媒体名」を除去（出典は別の行に出すため）"""
+    if publisher and title.endswith(f" - {publisher}"):
+        return title[:-len(publisher) - 3]
+    return title
+
+
+def clean_snippet(snippet, title, publisher):
+    """
+    概要をプレーンテキスト化し、タイトル・媒体名の繰り返しを除去
+    残りがほとんどなければ空文字を返す
+    """
+    text = strip_html(snippet)
+    for repeated in (title, clean_title(title, publisher), publisher):
+        if repeated:
+            text = text.replace(repeated, ' ')
+    text = _space.sub(' ', text).strip()
+    return text if len(text) >= 5 else ""
+
+
+def _cluster_article_block(number, news, snippet, article_tokens):
+    """クラスタリング用のニュースリストの1記事分（snippet は clean_snippet 済み）"""
+    title = truncate_to_tokens(
+        clean_title(news['title'], news['publisher']), article_tokens)
+    lines = [f"[{number}] タイトル: {title}", f"    出典: {news['publisher']}"]
+    if snippet:
+        remaining = max(article_tokens - count_tokens(title), 20)
+        lines.append(f"    概要: {truncate_to_tokens(snippet, remaining)}")
+    lines.append(f"    関連性スコア: {news['relevance_score']}")
+    lines.append(f"    判定理由: {news['relevance_reason']}")
+    return "\n".join(lines)
+
+
+def cluster_article_tokens(news, number, article_tokens=CLUSTER_ARTICLE_TOKENS):
+    """
+    クラスタリング用のニュースリストで number 番目に置いた1記事分のトークン数
+    （build_cluster_news_text と同じ整形・切り詰め。重複した概要の省略は考慮しないため上限値）
+    """
+    snippet = clean_snippet(news['snippet'], news['title'], news['publisher'])
+    return count_tokens(_cluster_article_block(number, news, snippet, article_tokens))
+
+
+def build_cluster_news_text(relevant_news,
+                            article_tokens=CLUSTER_ARTICLE_TOKENS,
+                            total_tokens=CLUSTER_TOTAL_TOKENS):
+    """
+    クラスタリング用のニュースリスト本文を作成
+    rank_candidates で同じ全体上限に絞り込んだリストなら、すべての記事が収まる
+
+    Returns:
+        tuple: (ニュースリスト本文, プロンプトに含めた件数)
+            全体上限を超える記事は末尾から省略する（番号は先頭から連番のまま）
+    """
+    blocks = []
+    used_tokens = 0
+    seen_snippets = set()
+
+    for i, news in enumerate(relevant_news):
+        snippet = clean_snippet(news['snippet'], news['title'], news['publisher'])
+        if snippet in seen_snippets:
+            snippet = ""
+        seen_snippets.add(snippet)
+        block = _cluster_article_block(i + 1, news, snippet, article_tokens)
+
+        block_tokens = count_tokens(block)
+        if blocks and used_tokens + block_tokens > total_tokens:
+            break
+        blocks.append(block)
+        used_tokens += block_tokens
+
+    return "\n\n".join(blocks), len(blocks)
+
+
+def _published_at(news):
+    """記事の公開日時（並べ替え用。タイムゾーンなしはUTC扱い、解析できなければ最古）"""
+    try:
+        published = datetime.fromisoformat(news['date'])
+    except (KeyError, TypeError, ValueError):
+        return datetime.min.replace(tzinfo=timezone.utc)
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    return published
+
+
+def build_headline_text(news_list,
+                        max_items=AUX_MAX_HEADLINES,
+                        headline_tokens=AUX_HEADLINE_TOKENS,
+                        total_tokens=AUX_TOTAL_TOKENS):
+    """
+    投資判断補助用の直近ニュース見出し（重複見出しは除外）
+    news_list はスコア順でもよい（公開日時の新しい順に並べ替えてから選ぶ）
+    """
+    lines = []
+    used_tokens = 0
+    seen_titles = set()
+
+    for news in sorted(news_list, key=_published_at, reverse=True):
+        if len(lines) >= max_items:
+            break
+        title = clean_title(news['title'], news.get('publisher'))
+        if title in seen_titles:
+            continue
+        seen_titles.add(title)
+
+        line = f"- {news['date'][:10]}: {truncate_to_tokens(title, headline_tokens)}"
+        line_tokens = count_tokens(line)
+        if lines and used_tokens + line_tokens > total_tokens:
+            break
+        lines.append(line)
+        used_tokens += line_tokens
+
+    return "\n".join(lines)
+
+
+def record_llm_usage(label, response, latency_sec):
+    """LLM呼び出しのトークン数とレイテンシを記録"""
+    usage = getattr(response, 'usage', None)
+    LLM_USAGE.append({
+        "label": label,
+        "prompt_tokens": getattr(usage, 'prompt_tokens', 0) or 0,
+        "completion_tokens": getattr(usage, 'completion_tokens', 0) or 0,
+        "latency_sec": round(latency_sec, 3)
+    })
+
+
+def print_llm_usage_summary():
+    """実行サマリー: LLM呼び出しごとのトークン数"""
+    if not LLM_USAGE:
+        print("🤖 LLM呼び出し: なし")
+        return
+
+    print(f"🤖 LLM呼び出し: {len(LLM_USAGE)}回")
+    for call in LLM_USAGE:
+        print(f"  - {call['label']}: prompt {call['prompt_tokens']} / "
+              f"completion {call['completion_tokens']} tokens ({call['latency_sec']:.2f}秒)")
+    prompt_total = sum(call['prompt_tokens'] for call in LLM_USAGE)
+    completion_total = sum(call['completion_tokens'] for call in LLM_USAGE)
+    print(f"  合計: prompt {prompt_total} / completion {completion_total} tokens")
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+実行チェックポイントモジュール
+実行ごとに runs/<run_id>/ を作り、各段階の出力を保存する
+
+    runs/<run_id>/manifest.json     実行状況（完了した段階・銘柄）
+    runs/<run_id>/collected.json    収集済み記事（feed_meta込み）
+    runs/<run_id>/stocks/<id>.json  銘柄ごとの結果（クラスタリング・投資判断補助）
+    runs/<run_id>/email.html        レンダリング済みメール（配信プロファイルごとに email_<name>.html）
+
+--resume で途中終了した実行を再開すると、完了済みの段階・銘柄は保存結果を読み込み、
+同じLLM呼び出しを二度行わない
+実行中のプロセス（manifest の host・pid が生きている実行）は再開の対象にしない
+retention_days より古い実行は新しい実行の作成時に削除する（常駐モードは配信ごとに1つ作る）
+"""
+
+import json
+import os
+import shutil
+import socket
+import threading
+from datetime import datetime, timedelta
+import pytz
+
+from news_record import NewsArticle, AnnotatedNews
+from delivery_profiles import DEFAULT_PROFILE
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+RUNS_DIR = 'runs'
+MANIFEST_FILE = 'manifest.json'
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+# チェックポイントポリシー（system_config.json の run_checkpoint_policy で上書き可能）
+DEFAULT_CHECKPOINT_POLICY = {
+    # この日数より古い実行ディレクトリは削除する（実行中のものは除く）
+    "retention_days": 7
+}
+
+# 段階（この順に実行する）
+STAGES = ['collect', 'stocks', 'render', 'send']
+
+# 記事レコードに持たない実行ごとの項目（収集済み記事の読み込み時にビューの注釈として復元）
+VIEW_FIELDS = ('feed_meta', 'alternate_sources')
+
+
+def load_checkpoint_policy():
+    """system_config.jsonからチェックポイントポリシーを読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_CHECKPOINT_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            policy.update(json.load(f).get('run_checkpoint_policy', {}))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return policy
+
+
+def new_run_id(now=None):
+    """実行ID（台湾時間の日時）"""
+    now = now or datetime.now(TW_TZ)
+    return now.strftime('%Y%m%d-%H%M%S')
+
+
+def html_filename(profile=DEFAULT_PROFILE):
+    """配信プロファイルのメールのファイル名（既定のプロファイルは email.html）"""
+    return 'email.html' if profile == DEFAULT_PROFILE else f"email_{profile}.html"
+
+
+def _write_json(path, data):
+    """JSONを一時ファイル経由で書き込む（途中で落ちても壊れたファイルを残さない）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def to_plain(value):
+    """
+    記事レコード・注釈ビューを含む結果をJSON保存用の辞書・リストに変換
+    AnnotatedNews は記事の項目に注釈を重ねた辞書になる
+    """
+    if isinstance(value, AnnotatedNews):
+        plain = to_plain(value.article)
+        plain.update(to_plain(value.notes))
+        return plain
+    if isinstance(value, NewsArticle):
+        return value.to_cache_dict()
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # 別ユーザーのプロセスとして存在する
+        return True
+    return True
+
+
+def run_in_progress(manifest):
+    """
+    実行がまだどこかのプロセスで動いているか
+    同じホストの pid が生きていれば実行中とみなす。別ホストの実行は確認できないため実行中とみなす
+    （pid を記録していない古い manifest は実行中ではないとみなす）
+    """
+    if manifest.get('status') != 'running' or not manifest.get('pid'):
+        return False
+    if manifest.get('host') != socket.gethostname():
+        return True
+    return manifest['pid'] != os.getpid() and _pid_alive(manifest['pid'])
+
+
+def find_resumable_run(base_dir=RUNS_DIR):
+    """未完了かつ実行中でない実行のうち最新のIDを返す（なければNone）"""
+    try:
+        run_ids = sorted(os.listdir(base_dir), reverse=True)
+    except FileNotFoundError:
+        return None
+
+    for run_id in run_ids:
+        try:
+            manifest = _read_json(os.path.join(base_dir, run_id, MANIFEST_FILE))
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            continue
+        if manifest.get('status') != 'completed' and not run_in_progress(manifest):
+            return run_id
+    return None
+
+
+def clean_old_runs(base_dir=RUNS_DIR, retention_days=None, now=None):
+    """
+    retention_days より古い実行ディレクトリを削除（実行中のものは残す）
+
+    Returns:
+        int: 削除した実行の数
+    """
+    if retention_days is None:
+        retention_days = load_checkpoint_policy()['retention_days']
+    cutoff = new_run_id((now or datetime.now(TW_TZ)) - timedelta(days=retention_days))
+    try:
+        run_ids = os.listdir(base_dir)
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    # 実行IDは日時のため、文字列の比較で古いものを判定できる
+    for run_id in run_ids:
+        run_dir = os.path.join(base_dir, run_id)
+        if run_id >= cutoff or not os.path.isdir(run_dir):
+            continue
+        try:
+            if run_in_progress(_read_json(os.path.join(run_dir, MANIFEST_FILE))):
+                continue
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        try:
+            shutil.rmtree(run_dir)
+            removed += 1
+        except OSError as e:
+            print(f"⚠️ 古い実行の削除エラー（{run_id}）: {e}")
+    return removed
+
+
+class RunCheckpoint:
+    """1回の実行のチェックポイント（段階ごとの出力と manifest.json）"""
+
+    def __init__(self, run_id, base_dir=RUNS_DIR, manifest=None):
+        self.run_id = run_id
+        self.run_dir = os.path.join(base_dir, run_id)
+        self.manifest = manifest or {
+            'run_id': run_id,
+            'status': 'running',
+            'created_at': datetime.now(TW_TZ).isoformat(),
+            'resumed_at': [],
+            'stages': {},
+            'stocks': {}
+        }
+        self._lock = threading.Lock()
+
+    def _claim(self):
+        """この実行を現在のプロセスが処理中であることを記録（find_resumable_run が選ばない）"""
+        self.manifest['host'] = socket.gethostname()
+        self.manifest['pid'] = os.getpid()
+
+    @classmethod
+    def create(cls, base_dir=RUNS_DIR, version=None):
+        """新しい実行を作成（保持期間を過ぎた実行は削除）"""
+        removed = clean_old_runs(base_dir)
+        if removed:
+            print(f"🧹 古い実行を削除しました: {removed}件")
+        checkpoint = cls(new_run_id(), base_dir)
+        checkpoint.manifest['version'] = version
+        checkpoint._claim()
+        os.makedirs(os.path.join(checkpoint.run_dir, 'stocks'), exist_ok=True)
+        checkpoint.save_manifest()
+        return checkpoint
+
+    @classmethod
+    def resume(cls, run_id=None, base_dir=RUNS_DIR):
+        """
+        既存の実行を再開（run_id 省略時は未完了の最新の実行）
+        再開できる実行がなければNone（別のプロセスが実行中の場合も）
+        """
+        run_id = run_id or find_resumable_run(base_dir)
+        if not run_id:
+            return None
+        try:
+            manifest = _read_json(os.path.join(base_dir, run_id, MANIFEST_FILE))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if run_in_progress(manifest):
+            print(f"⚠️ 実行 {run_id} は別のプロセスが実行中のため再開しません"
+                  f"（{manifest.get('host')} pid {manifest.get('pid')}）")
+            return None
+
+        checkpoint = cls(run_id, base_dir, manifest)
+        checkpoint.manifest['status'] = 'running'
+        checkpoint._claim()
+        checkpoint.manifest.setdefault('resumed_at', []).append(
+            datetime.now(TW_TZ).isoformat())
+        os.makedirs(os.path.join(checkpoint.run_dir, 'stocks'), exist_ok=True)
+        checkpoint.save_manifest()
+        return checkpoint
+
+    def path(self, name):
+        return os.path.join(self.run_dir, name)
+
+    def save_manifest(self):
+        with self._lock:
+            _write_json(self.path(MANIFEST_FILE), self.manifest)
+
+    def stage_done(self, stage):
+        return stage in self.manifest['stages']
+
+    def mark_stage(self, stage, **info):
+        """段階の完了を記録"""
+        self.manifest['stages'][stage] = dict(
+            info, completed_at=datetime.now(TW_TZ).isoformat())
+        self.save_manifest()
+
+    def mark_completed(self):
+        self.manifest['status'] = 'completed'
+        self.save_manifest()
+
+    # --- 収集 ---
+
+    def save_collected(self, news_list):
+        """収集済み記事を保存し、collect 段階を完了にする"""
+        _write_json(self.path('collected.json'), to_plain(news_list))
+        self.mark_stage('collect', articles=len(news_list))
+
+    def load_collected(self):
+        """収集済み記事を記事レコード（実行ごとの項目があればビュー）として復元"""
+        news_list = []
+        for data in _read_json(self.path('collected.json')):
+            article = NewsArticle.from_cache_dict(data)
+            notes = {key: data[key] for key in VIEW_FIELDS if key in data}
+            news_list.append(AnnotatedNews(article, notes) if notes else article)
+        return news_list
+
+    # --- 銘柄ごとの結果 ---
+
+    def _stock_path(self, stock_id):
+        return os.path.join(self.run_dir, 'stocks', f"{stock_id}.json")
+
+    def stock_done(self, stock_id):
+        return stock_id in self.manifest['stocks']
+
+    def save_stock_result(self, stock_id, result):
+        """銘柄の結果を保存（結果なしも完了として記録する）"""
+        if result is not None:
+            _write_json(self._stock_path(stock_id), to_plain(result))
+        with self._lock:
+            self.manifest['stocks'][stock_id] = {
+                'status': 'done' if result is not None else 'empty',
+                'completed_at': datetime.now(TW_TZ).isoformat()
+            }
+        self.save_manifest()
+
+    def load_stock_result(self, stock_id):
+        """保存済みの銘柄結果（結果なしの場合はNone）"""
+        if self.manifest['stocks'].get(stock_id, {}).get('status') != 'done':
+            return None
+        return _read_json(self._stock_path(stock_id))
+
+    # --- レンダリング・送信（配信プロファイルごと） ---
+
+    def _delivery(self, profile):
+        return self.manifest.setdefault('deliveries', {}).setdefault(profile, {})
+
+    def profile_rendered(self, profile=DEFAULT_PROFILE):
+        return 'render' in self.manifest.get('deliveries', {}).get(profile, {})
+
+    def profile_sent(self, profile=DEFAULT_PROFILE):
+        return 'send' in self.manifest.get('deliveries', {}).get(profile, {})
+
+    def save_html(self, html_content, profile=DEFAULT_PROFILE):
+        self.save_html_chunks([html_content], profile)
+
+    def save_html_chunks(self, chunks, profile=DEFAULT_PROFILE, **info):
+        """
+        レンダリング結果を断片ごとに書き出す（本文全体を保持しない）
+        info は manifest の deliveries.<profile>.render に記録する（セクションごとのバイト数など）
+        render 段階の完了は全プロファイルのレンダリング後に呼び出し側で記録する
+        """
+        path = self.path(html_filename(profile))
+        tmp_path = f"{path}.tmp"
+        size = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk.encode('utf-8'))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._delivery(profile)['render'] = dict(
+                info, bytes=size, completed_at=datetime.now(TW_TZ).isoformat())
+        self.save_manifest()
+
+    def load_html(self, profile=DEFAULT_PROFILE):
+        with open(self.path(html_filename(profile)), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def batches_sent(self, profile=DEFAULT_PROFILE):
+        """送信済みのバッチ番号（宛先の上限ごとのメッセージ、--resume で再送しない）"""
+        batches = self.manifest.get('deliveries', {}).get(profile, {}).get('batches', {})
+        return {int(batch) for batch in batches}
+
+    def mark_batch_sent(self, profile, batch, status_code=None):
+        """プロファイルの1バッチの送信完了を記録"""
+        with self._lock:
+            self._delivery(profile).setdefault('batches', {})[str(batch)] = {
+                'status_code': status_code,
+                'completed_at': datetime.now(TW_TZ).isoformat()
+            }
+        self.save_manifest()
+
+    def mark_profile_sent(self, profile=DEFAULT_PROFILE, **info):
+        """プロファイルの送信完了を記録（--resume で再送しない）"""
+        with self._lock:
+            self._delivery(profile)['send'] = dict(
+                info, completed_at=datetime.now(TW_TZ).isoformat())
+        self.save_manifest()
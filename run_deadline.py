@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+実行デッドラインモジュール（段階ごとの時間予算と縮退）
+定時実行でメールを期限までに出すため、実行全体の期限と段階ごとの予算を管理する
+
+- 期限: 起動から max_runtime_sec 後と deliver_by（台湾時間 HH:MM）の早い方
+  （deliver_by を過ぎてから起動した場合は deliver_by を使わない）
+- 段階（collect → stocks → render_send）ごとに予算を持ち、後段の予算は必ず残す
+  （全体の残り時間が予算の合計に足りない場合は、残り時間を予算の比で分ける）
+- 残り時間が足りない場合は処理を縮退し、理由を記録する
+    - フォールバック（30日）の再収集をスキップ
+    - LLMクラスタリングの代わりに fallback_clustering
+    - 投資判断補助は前回の分析結果を再利用
+    - 期限までに終わった銘柄だけで送信
+
+設定は system_config.json の run_deadline_policy で上書きできる
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+import pytz
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+SYSTEM_CONFIG_FILE = 'system_config.json'
+
+# 段階（この順に実行する）
+STAGES = ['collect', 'stocks', 'render_send']
+
+DEFAULT_RUN_DEADLINE_POLICY = {
+    "enabled": True,
+    # 起動からの最大実行時間（秒）
+    "max_runtime_sec": 900,
+    # 配信期限（台湾時間 "HH:MM"、null なら max_runtime_sec のみ）
+    "deliver_by": None,
+    # 段階ごとの予算（秒）
+    "stage_budget_sec": {
+        "collect": 180,
+        "stocks": 600,
+        "render_send": 60
+    },
+    # フィード1件の取得タイムアウト（秒）
+    "feed_timeout_sec": 15,
+    # 段階の残り時間がこれ未満なら縮退する（秒）
+    "fallback_recollect_min_sec": 120,
+    "llm_clustering_min_sec": 30,
+    "aux_generation_min_sec": 20,
+    # LLM呼び出しのタイムアウト上限（秒、段階の残り時間でさらに短くする）
+    "llm_timeout_sec": 60
+}
+
+
+def load_run_deadline_policy():
+    """system_config.jsonからデッドラインポリシーを読み込む（未指定項目はデフォルト）"""
+    policy = dict(DEFAULT_RUN_DEADLINE_POLICY)
+    try:
+        with open(SYSTEM_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            overrides = json.load(f).get('run_deadline_policy', {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        overrides = {}
+    budgets = dict(policy['stage_budget_sec'])
+    budgets.update(overrides.pop('stage_budget_sec', {}))
+    policy.update(overrides)
+    policy['stage_budget_sec'] = budgets
+    return policy
+
+
+def _deliver_by_timestamp(deliver_by, now):
+    """"HH:MM"（台湾時間、当日）をUNIX時刻に変換"""
+    hour, minute = (int(part) for part in deliver_by.split(':'))
+    local_now = datetime.fromtimestamp(now, TW_TZ)
+    return local_now.replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp()
+
+
+class RunDeadline:
+    """
+    実行全体の期限と段階ごとの期限
+    無効（enabled: false）の場合は残り時間が常にNone（無制限）で、縮退しない
+    """
+
+    def __init__(self, policy=None, now=None):
+        self.policy = policy or load_run_deadline_policy()
+        self.enabled = bool(self.policy.get('enabled'))
+        self.started = now if now is not None else time.time()
+
+        self.deadline = self.started + self.policy['max_runtime_sec']
+        if self.policy.get('deliver_by'):
+            deliver_by = _deliver_by_timestamp(self.policy['deliver_by'], self.started)
+            if deliver_by > self.started:
+                self.deadline = min(self.deadline, deliver_by)
+            elif self.enabled:
+                # 遅れて起動した実行は、どの段階も予算0にならないよう max_runtime_sec のみにする
+                print(f"⚠️ 配信期限 {self.policy['deliver_by']} を過ぎて起動したため、"
+                      f"最大実行時間（{self.policy['max_runtime_sec']}秒）のみを期限にします")
+
+        self.stage = None
+        self.stage_deadline = None
+        # 縮退の記録: [{'stage', 'action', 'reason', 'stock_id'(任意), 'at_sec'}]
+        self.degradations = []
+        self._lock = threading.Lock()
+
+    def begin_stage(self, stage, now=None):
+        """
+        段階を開始（段階の期限 = 予算と、後段の予算を残した全体期限の早い方）
+        全体の残り時間が後段の予算を残せないほど少ない場合は、
+        残り時間をこの段階と後段の予算の比で分ける（この段階の予算を0にしない）
+        """
+        now = now if now is not None else time.time()
+        budgets = self.policy['stage_budget_sec']
+        later = STAGES[STAGES.index(stage) + 1:]
+        budget = budgets.get(stage, 0)
+        reserve = sum(budgets.get(name, 0) for name in later)
+        available = max(0.0, self.deadline - now)
+        self.stage = stage
+        if available >= budget + reserve or budget + reserve == 0:
+            self.stage_deadline = min(now + budget, self.deadline - reserve)
+        else:
+            self.stage_deadline = now + available * budget / (budget + reserve)
+
+    def remaining(self, now=None):
+        """実行全体の残り時間（秒、無効時はNone）"""
+        if not self.enabled:
+            return None
+        now = now if now is not None else time.time()
+        return max(0.0, self.deadline - now)
+
+    def stage_remaining(self, now=None):
+        """現在の段階の残り時間（秒、無効時・段階開始前はNone）"""
+        if not self.enabled or self.stage_deadline is None:
+            return None
+        now = now if now is not None else time.time()
+        return max(0.0, self.stage_deadline - now)
+
+    def expired(self):
+        """現在の段階の期限を過ぎたか"""
+        remaining = self.stage_remaining()
+        return remaining is not None and remaining <= 0
+
+    def short_of(self, key):
+        """段階の残り時間がポリシーの下限（key）未満か"""
+        remaining = self.stage_remaining()
+        return remaining is not None and remaining < self.policy[key]
+
+    def llm_timeout(self):
+        """LLM呼び出しのタイムアウト（秒、無効時はNone）"""
+        remaining = self.stage_remaining()
+        if remaining is None:
+            return None
+        return max(5.0, min(self.policy['llm_timeout_sec'], remaining))
+
+    def degrade(self, action, reason, stock_id=None):
+        """縮退を記録してログ出力"""
+        record = {
+            'stage': self.stage,
+            'action': action,
+            'reason': reason,
+            'at_sec': round(time.time() - self.started, 1)
+        }
+        if stock_id is not None:
+            record['stock_id'] = stock_id
+        with self._lock:
+            self.degradations.append(record)
+        label = f"{stock_id}: " if stock_id is not None else ""
+        print(f"  ⏳ 縮退 [{self.stage}] {label}{action}（{reason}）")
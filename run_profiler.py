@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+プロファイリングモジュール（--profile 指定時のみ有効）
+段階ごとに cProfile と tracemalloc で計測し、実行ディレクトリに書き出す
+
+    runs/<run_id>/profile/<段階>.pstats      cProfile の統計（python -m pstats で閲覧）
+    runs/<run_id>/profile/<段階>_alloc.txt   段階中に増えたメモリの割り当て元 上位N件
+    runs/<run_id>/profile/summary.json       段階ごとの上位関数（tottime順）とメモリピーク
+
+cProfile はスレッドごとに動くため、段階の本体（メインスレッド）に加えて
+スレッドプールに渡す関数を profiled() で包み、各スレッドの統計を段階にまとめる
+無効時は profile_stage が何もせず、profiled は関数をそのまま返す（計測のオーバーヘッドなし）
+"""
+
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# 書き出す割り当て元・関数の件数
+PROFILE_TOP_N = 30
+# 実行サマリーに表示する関数の件数
+SUMMARY_TOP_N = 5
+
+_state = {
+    'enabled': False,
+    'output_dir': None,
+    'top_n': PROFILE_TOP_N,
+    # 現在の段階（profiled で包んだ関数はこの段階に集計する）
+    'stage': None,
+    # 段階 → スレッドごとの cProfile.Profile
+    'profiles': {},
+    # 段階 → summary.json の項目
+    'summary': {}
+}
+_lock = threading.Lock()
+# スレッドごとの計測中フラグ（同じスレッドで cProfile を重ねて有効にしない）
+_local = threading.local()
+
+# 割り当て元から除外するフレーム（計測自体・import 機構）
+_ALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+def enable_profiling(output_dir, top_n=PROFILE_TOP_N):
+    """プロファイリングを有効化（tracemalloc もここで開始する）"""
+    os.makedirs(output_dir, exist_ok=True)
+    with _lock:
+        _state.update(enabled=True, output_dir=output_dir, top_n=top_n, stage=None)
+        _state['profiles'].clear()
+        _state['summary'].clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    print(f"🔬 プロファイリング有効: {output_dir}")
+
+
+def profiling_enabled():
+    return _state['enabled']
+
+
+def _run_profiled(stage, func, args, kwargs):
+    """このスレッドで cProfile を有効にして実行し、統計を段階に追加"""
+    if getattr(_local, 'active', False):
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12以降は cProfile がプロセス全体で1つ（段階の計測に全スレッド分が入る）
+        return func(*args, **kwargs)
+    _local.active = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        _local.active = False
+        with _lock:
+            _state['profiles'].setdefault(stage, []).append(profiler)
+
+
+def profiled(func):
+    """
+    スレッドプールに渡す関数を包み、実行スレッドでも cProfile を有効にする
+    無効時は関数をそのまま返す
+    """
+    if not _state['enabled']:
+        return func
+    stage = _state['stage']
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return _run_profiled(stage, func, args, kwargs)
+    return wrapper
+
+
+@contextmanager
+def profile_stage(stage):
+    """段階を計測（無効時は何もしない）"""
+    if not _state['enabled']:
+        yield
+        return
+
+    previous_stage = _state['stage']
+    _state['stage'] = stage
+    tracemalloc.reset_peak()
+    snapshot_before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    profiler = cProfile.Profile()
+    nested = getattr(_local, 'active', False)
+    if not nested:
+        profiler.enable()
+        _local.active = True
+    try:
+        yield
+    finally:
+        if not nested:
+            profiler.disable()
+            _local.active = False
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        snapshot_after = tracemalloc.take_snapshot()
+        _state['stage'] = previous_stage
+        try:
+            _write_stage(stage, [profiler] if not nested else [], snapshot_before, snapshot_after,
+                         elapsed, peak)
+        except Exception as e:
+            print(f"⚠️ プロファイル書き出しエラー（{stage}）: {e}")
+
+
+def _write_stage(stage, own_profiles, snapshot_before, snapshot_after, elapsed, peak):
+    """段階の pstats・割り当て元を書き出し、サマリーに追加"""
+    output_dir = _state['output_dir']
+    top_n = _state['top_n']
+    with _lock:
+        profiles = own_profiles + _state['profiles'].pop(stage, [])
+
+    summary = {
+        'wall_sec': round(elapsed, 3),
+        'threads': len(profiles),
+        'peak_traced_mb': round(peak / 1024 / 1024, 2)
+    }
+
+    stats = None
+    for profiler in profiles:
+        if stats is None:
+            stats = pstats.Stats(profiler)
+        else:
+            stats.add(profiler)
+    if stats is not None:
+        pstats_path = os.path.join(output_dir, f"{stage}.pstats")
+        stats.dump_stats(pstats_path)
+        summary['pstats'] = pstats_path
+        summary['top_functions'] = _top_functions(stats, top_n)
+
+    # 段階中に増えた割り当て（行単位）
+    diff = snapshot_after.filter_traces(_ALLOC_FILTERS).compare_to(
+        snapshot_before.filter_traces(_ALLOC_FILTERS), 'lineno')
+    alloc_path = os.path.join(output_dir, f"{stage}_alloc.txt")
+    with open(alloc_path, 'w', encoding='utf-8') as f:
+        f.write(f"# stage: {stage}\n")
+        f.write(f"# peak traced memory: {summary['peak_traced_mb']} MB\n")
+        f.write(f"# net allocated: {sum(stat.size_diff for stat in diff) / 1024:.1f} KiB\n")
+        for stat in diff[:top_n]:
+            f.write(f"{stat}\n")
+    summary['alloc'] = alloc_path
+    summary['top_allocations'] = [
+        {'site': str(stat.traceback), 'size_diff_kb': round(stat.size_diff / 1024, 1),
+         'count_diff': stat.count_diff}
+        for stat in diff[:SUMMARY_TOP_N]]
+
+    with _lock:
+        _state['summary'][stage] = summary
+
+
+def _top_functions(stats, limit):
+    """tottime の大きい関数（'ファイル:行(関数)'）"""
+    rows = []
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({name})",
+            'ncalls': ncalls,
+            'tottime_sec': round(tottime, 4),
+            'cumtime_sec': round(cumtime, 4)
+        })
+    rows.sort(key=lambda row: row['tottime_sec'], reverse=True)
+    return rows[:limit]
+
+
+def finish_profiling():
+    """
+    summary.json を書き出し、段階ごとの上位関数を表示してプロファイリングを終了
+
+    Returns:
+        dict: 段階 → サマリー（無効時はNone）
+    """
+    if not _state['enabled']:
+        return None
+
+    with _lock:
+        summary = dict(_state['summary'])
+        _state['enabled'] = False
+    tracemalloc.stop()
+
+    path = os.path.join(_state['output_dir'], 'summary.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print("🔬 プロファイル（段階ごとの上位関数 tottime順）:")
+    for stage, stage_summary in summary.items():
+        print(f"  [{stage}] {stage_summary['wall_sec']:.2f}秒 / "
+              f"メモリピーク {stage_summary['peak_traced_mb']:.1f}MB / {stage_summary['threads']}スレッド")
+        for row in stage_summary.get('top_functions', [])[:SUMMARY_TOP_N]:
+            print(f"    {row['tottime_sec']:>8.3f}秒  {row['function']} ({row['ncalls']}回)")
+    print(f"💾 プロファイルを保存しました: {_state['output_dir']}")
+    return summary
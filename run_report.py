@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+実行レポートモジュール（段階ごとの計測値とカウンタ）
+- 段階・銘柄ごとの経過時間（wall）とCPU時間
+- フィード取得レイテンシのヒストグラム、リダイレクト解決レイテンシのパーセンタイル
+- LLM呼び出しのレイテンシとトークン数（prompt_builder.LLM_USAGE）
+- キャッシュヒット率（STATS）、株価取得の成否、メール送信結果
+
+run_report.json（email_preview.html と同じ場所）に書き出し、
+run_report_history.jsonl に1行1実行で追記してバージョン間の性能差を追えるようにする
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import pytz
+
+from prompt_builder import LLM_USAGE
+from stock_price_analyzer import PRICE_STATS
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+RUN_REPORT_FILE = 'run_report.json'
+RUN_REPORT_HISTORY_FILE = 'run_report_history.jsonl'
+
+# フィード取得レイテンシのヒストグラム境界（秒、最後は上限なし）
+FEED_LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+
+# 計測値: stages/stocks は {名前: {'wall_sec', 'cpu_sec'}}、latencies は {種類: [秒]}
+METRICS = {
+    'stages': {},
+    'stocks': {},
+    'latencies': {}
+}
+_lock = threading.Lock()
+
+
+def reset_metrics():
+    """計測値をクリア（同一プロセスで複数回実行する場合、LLM使用量・株価取得件数も含む）"""
+    with _lock:
+        for values in METRICS.values():
+            values.clear()
+    LLM_USAGE.clear()
+    for key in PRICE_STATS:
+        PRICE_STATS[key] = 0
+
+
+@contextmanager
+def stage_timer(stage):
+    """段階の経過時間とCPU時間（プロセス全体）を計測"""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        with _lock:
+            METRICS['stages'][stage] = {
+                'wall_sec': round(time.perf_counter() - wall_start, 3),
+                'cpu_sec': round(time.process_time() - cpu_start, 3)
+            }
+
+
+def timed_stock(stock_id, func, *args, **kwargs):
+    """
+    銘柄処理を実行し、経過時間とCPU時間（実行スレッド分）を記録
+    同じ銘柄を2回処理した場合（30日フォールバック）は合計する
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        with _lock:
+            timing = METRICS['stocks'].setdefault(stock_id, {'wall_sec': 0.0, 'cpu_sec': 0.0})
+            timing['wall_sec'] = round(
+                timing['wall_sec'] + time.perf_counter() - wall_start, 3)
+            timing['cpu_sec'] = round(
+                timing['cpu_sec'] + time.thread_time() - cpu_start, 3)
+
+
+def record_latency(kind, seconds):
+    """レイテンシを記録（'feed_fetch', 'redirect' など）"""
+    with _lock:
+        METRICS['latencies'].setdefault(kind, []).append(seconds)
+
+
+def timed_call(kind, func, *args, **kwargs):
+    """関数を実行し、成功・失敗にかかわらずレイテンシを記録"""
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        record_latency(kind, time.perf_counter() - started)
+
+
+def percentile(values, pct):
+    """パーセンタイル（最近傍順位法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def latency_summary(values):
+    """件数・平均・p50/p90/p99・最大（秒）"""
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'sum_sec': round(sum(values), 4),
+        'mean_sec': round(sum(values) / len(values), 4),
+        'p50_sec': round(percentile(values, 50), 4),
+        'p90_sec': round(percentile(values, 90), 4),
+        'p99_sec': round(percentile(values, 99), 4),
+        'max_sec': round(max(values), 4)
+    }
+
+
+def latency_histogram(values, buckets=FEED_LATENCY_BUCKETS):
+    """境界ごとの件数（'<=0.5' など、最後は '>10.0'）"""
+    histogram = {f"<={bound}": 0 for bound in buckets}
+    histogram[f">{buckets[-1]}"] = 0
+    for value in values:
+        for bound in buckets:
+            if value <= bound:
+                histogram[f"<={bound}"] += 1
+                break
+        else:
+            histogram[f">{buckets[-1]}"] += 1
+    return histogram
+
+
+def _hit_ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 3) if total else None
+
+
+def build_run_report(run_id, version, stats, results=None, degradations=None, delivery=None):
+    """
+    実行レポートを作成
+
+    Args:
+        delivery: メール送信結果 {'status': 'sent'/'queued'/'failed'/'skipped'/'no_results'/'already_sent',
+                  'status_code'(任意), 'profiles'(配信プロファイルごと), 'outbox'(状態ごとの件数、任意)}
+    """
+    with _lock:
+        stages = dict(METRICS['stages'])
+        stocks = dict(METRICS['stocks'])
+        latencies = {kind: list(values) for kind, values in METRICS['latencies'].items()}
+
+    feed_latencies = latencies.get('feed_fetch', [])
+    llm_calls = list(LLM_USAGE)
+
+    return {
+        'run_id': run_id,
+        'version': version,
+        'generated_at': datetime.now(TW_TZ).isoformat(),
+        'stages': stages,
+        'stocks': stocks,
+        'feeds': {
+            'latency': latency_summary(feed_latencies),
+            'latency_histogram': latency_histogram(feed_latencies)
+        },
+        'redirects': {
+            'latency': latency_summary(latencies.get('redirect', [])),
+            'timeout': stats.get('redirect_timeout', 0),
+            'failed': stats.get('redirect_failed', 0)
+        },
+        'llm': {
+            'calls': len(llm_calls),
+            'prompt_tokens': sum(call['prompt_tokens'] for call in llm_calls),
+            'completion_tokens': sum(call['completion_tokens'] for call in llm_calls),
+            'latency': latency_summary([call['latency_sec'] for call in llm_calls]),
+            'by_call': llm_calls
+        },
+        'cache': {
+            'news_hit_ratio': _hit_ratio(stats.get('cache_hit', 0), stats.get('cache_miss', 0)),
+            'relevance_hit_ratio': _hit_ratio(
+                stats.get('relevance_cache_hit', 0), stats.get('relevance_cache_miss', 0))
+        },
+        'prices': dict(PRICE_STATS),
+        'counters': dict(stats),
+        'delivered_stocks': len(results) if results is not None else None,
+        'delivery': dict(delivery or {'status': 'unknown'}),
+        'degradations': list(degradations or [])
+    }
+
+
+def write_run_report(report, path=RUN_REPORT_FILE, history_path=RUN_REPORT_HISTORY_FILE):
+    """run_report.json を書き出し、履歴に1行追記"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+    with open(history_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+
+def print_run_report_summary(report):
+    """実行サマリー: 段階ごとの時間とキャッシュヒット率"""
+    print("📈 実行レポート:")
+    for stage, timing in report['stages'].items():
+        print(f"  - {stage}: {timing['wall_sec']:.2f}秒 (CPU {timing['cpu_sec']:.2f}秒)")
+
+    feed_latency = report['feeds']['latency']
+    if feed_latency['count']:
+        print(f"  フィード取得: {feed_latency['count']}件 p50 {feed_latency['p50_sec']:.2f}秒 / "
+              f"p90 {feed_latency['p90_sec']:.2f}秒")
+    redirect_latency = report['redirects']['latency']
+    if redirect_latency['count']:
+        print(f"  URL解決: {redirect_latency['count']}件 p50 {redirect_latency['p50_sec']:.2f}秒 / "
+              f"p99 {redirect_latency['p99_sec']:.2f}秒")
+
+    for name, ratio in report['cache'].items():
+        if ratio is not None:
+            print(f"  {name}: {ratio:.1%}")
+    print(f"  カウンタ: {report['counters']}")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RSS概要（snippet）の正規化モジュール
+Google Newsの概要はHTML（<a>のリスト、<font>の媒体名）で配信されるため、
+取り込み時にプレーンテキストとリンク一覧に分離して保存する
+
+- キャッシュが小さくなり、キーワード走査が速くなる
+- Googleがマークアップを変えても記事署名が変わらない
+- SNIPPET_VERSION が古いキャッシュ記事は読み込み時に移行し、移行結果をすぐ保存する（移行は1回だけ）
+"""
+
+import html
+import re
+from html.parser import HTMLParser
+
+# 1: 生のHTML（バージョン未記録）, 2: プレーンテキスト + リンク一覧
+SNIPPET_VERSION = 2
+
+_space = re.compile(r'\s+')
+
+
+class _SnippetParser(HTMLParser):
+    """テキストと <a> リンク（直後の <font> を媒体名として付与）を抽出"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.texts = []
+        self.links = []
+        self._anchor = None
+        self._in_font = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._anchor = {'url': dict(attrs).get('href', ''), 'title': ''}
+        elif tag == 'font':
+            self._in_font = True
+        elif tag in ('br', 'li', 'p', 'div'):
+            self.texts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._anchor is not None:
+            self._anchor['title'] = _space.sub(' ', self._anchor['title']).strip()
+            if self._anchor['url']:
+                self.links.append(self._anchor)
+            self._anchor = None
+        elif tag == 'font':
+            self._in_font = False
+
+    def handle_data(self, data):
+        self.texts.append(data)
+        if self._anchor is not None:
+            self._anchor['title'] += data
+        elif self._in_font and self.links and 'source' not in self.links[-1]:
+            source = data.strip()
+            if source:
+                self.links[-1]['source'] = source
+
+
+def normalize_snippet(snippet):
+    """
+    概要HTMLをプレーンテキストとリンク一覧に分離
+
+    Returns:
+        tuple: (プレーンテキスト, [{'url', 'title', 'source'(任意)}])
+    """
+    if not snippet:
+        return "", []
+    if '<' not in snippet:
+        text = html.unescape(snippet).replace('\xa0', ' ')
+        return _space.sub(' ', text).strip(), []
+
+    parser = _SnippetParser()
+    try:
+        parser.feed(snippet)
+        parser.close()
+    except Exception:
+        # 壊れたHTMLはタグ除去のみで処理
+        text = html.unescape(re.sub(r'<[^>]+>', ' ', snippet)).replace('\xa0', ' ')
+        return _space.sub(' ', text).strip(), []
+
+    text = ''.join(parser.texts).replace('\xa0', ' ')
+    return _space.sub(' ', text).strip(), parser.links
@@ -3,17 +3,33 @@
 """
 株価データ取得・分析モジュール
 yfinanceを使用して台湾株の株価データを取得し、基本的な指標を計算する
+（yfinance / pandas は起動時間短縮のため初回の株価取得時に読み込む）
 """
 
-import yfinance as yf
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+import threading
+from datetime import timedelta
 import pytz
+from trading_calendar import is_trading_day, last_trading_day, previous_trading_day
 
 # 台湾時間
 TW_TZ = pytz.timezone('Asia/Taipei')
 
+# 株価取得の成功・失敗件数（実行レポート・メトリクス用）
+PRICE_STATS = {
+    'fetched': 0,
+    'failed': 0
+}
+
+# 取得済みの株価（証券コード → {'start': 取得開始日, 'df': 営業日のバーのみのDataFrame}）
+# 同じプロセスで再取得する場合（常駐モード）は最後のバー以降だけを取得する
+PRICE_HISTORY = {}
+_price_lock = threading.Lock()
+
+def get_ticker(ticker_symbol):
+    """yfinanceのTickerを生成（yfinanceは初回呼び出し時に読み込む）"""
+    import yfinance as yf
+    return yf.Ticker(ticker_symbol)
+
 def get_stock_data(stock_id, days=60):
     """
     指定された銘柄の株価データを取得する
@@ -28,26 +44,66 @@ def get_stock_data(stock_id, days=60):
     try:
         # 台湾株のシンボル形式に変換（例: 2330 -> 2330.TW）
         ticker_symbol = f"{stock_id}.TW"
-        ticker = yf.Ticker(ticker_symbol)
+        ticker = get_ticker(ticker_symbol)
         
         # データを取得
-        # endは明日を指定して今日を含める
-        end_date = datetime.now(TW_TZ) + timedelta(days=1)
+        # endは直近営業日の翌日を指定して直近営業日を含める
+        end_date = last_trading_day() + timedelta(days=1)
         start_date = end_date - timedelta(days=days + 20) # 移動平均計算用に少し長めに
-        
-        df = ticker.history(start=start_date.strftime('%Y-%m-%d'), 
+
+        # 取得済みの期間は再取得しない（最後のバーは取得時に未確定だった可能性があるため取り直す）
+        with _price_lock:
+            entry = PRICE_HISTORY.get(stock_id)
+        cached = entry['df'] if entry and entry['start'] <= start_date else None
+        fetch_start = cached.index[-1].date() if cached is not None else start_date
+
+        df = ticker.history(start=fetch_start.strftime('%Y-%m-%d'), 
                            end=end_date.strftime('%Y-%m-%d'))
-        
+
+        if cached is not None:
+            import pandas as pd
+            if not df.empty:
+                df = pd.concat([cached[cached.index < df.index[0]], df])
+            else:
+                df = cached
+            df = df[[ts.date() >= start_date for ts in df.index]]
+
         if df.empty:
             print(f"⚠️ 株価データ取得失敗: {stock_id} (データなし)")
+            PRICE_STATS['failed'] += 1
             return None
-            
+        
+        # 休場日に付与される疑似バー（出来高0の前日値コピー等）を除外
+        df = df[[is_trading_day(ts.date()) for ts in df.index]]
+        if df.empty:
+            print(f"⚠️ 株価データ取得失敗: {stock_id} (営業日のデータなし)")
+            PRICE_STATS['failed'] += 1
+            return None
+
+        with _price_lock:
+            PRICE_HISTORY[stock_id] = {'start': start_date, 'df': df}
+        PRICE_STATS['fetched'] += 1
         return df
         
     except Exception as e:
         print(f"⚠️ 株価データ取得エラー: {stock_id} - {e}")
+        PRICE_STATS['failed'] += 1
         return None
 
+def find_previous_close_bar(df):
+    """
+    最新バーに対する「前営業日」のバーを返す
+    連休明けでも取引カレンダー上の前営業日を参照し、
+    該当バーが欠損している場合はそれ以前の直近バーを使用する
+    """
+    latest_date = df.index[-1].date()
+    prev_date = previous_trading_day(latest_date)
+    
+    for i in range(len(df) - 2, -1, -1):
+        if df.index[i].date() <= prev_date:
+            return df.iloc[i]
+    return df.iloc[-2]
+
 def analyze_price_phase(df):
     """
     株価データから現在のフェーズを分析する
@@ -66,7 +122,7 @@ def analyze_price_phase(df):
         
     # 最新のデータ
     latest = df.iloc[-1]
-    prev = df.iloc[-2]
+    prev = find_previous_close_bar(df)
     
     current_price = latest['Close']
     prev_price = prev['Close']
@@ -105,6 +161,8 @@ def analyze_price_phase(df):
         weekly_change_pct = 0
         
     return {
+        "as_of": df.index[-1].strftime('%Y-%m-%d'),
+        "prev_close_date": prev.name.strftime('%Y-%m-%d'),
         "current_price": current_price,
         "daily_change_pct": daily_change_pct,
         "weekly_change_pct": weekly_change_pct,
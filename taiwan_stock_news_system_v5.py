@@ -8,41 +8,110 @@
 """
 
 from investment_aux_generator import generate_investment_aux_news
-from news_clustering_v51 import cluster_news_by_topic, prepare_delivery_news, print_clustering_log
+from news_clustering_v51 import (
+    cluster_news_by_topic, fallback_clustering, prepare_delivery_news, print_clustering_log)
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 import pytz
-from dateutil import parser as date_parser
 from datetime import datetime, timedelta
 import re
 import hashlib
+import threading
 import json
-from sendgrid.helpers.mail import Mail
-from sendgrid import SendGridAPIClient
-from openai import OpenAI
-from delayed_valuable_news import is_delayed_valuable_news
-import requests
-import feedparser
+import shutil
+from delayed_valuable_news import is_delayed_valuable_news, keyword_fingerprint
+from trading_calendar import is_trading_day, last_trading_day
+from feed_plan import build_feed_plan
+from near_duplicate import (
+    collapse_near_duplicates,
+    load_near_duplicate_policy,
+    new_band_index,
+    add_to_band_index,
+    prune_band_index)
+from news_record import NewsArticle, AnnotatedNews, AnnotationOverlay, RssEntry, source_article
+from snippet_normalizer import normalize_snippet, SNIPPET_VERSION
+from candidate_ranking import rank_candidates
+from prompt_builder import CLUSTER_TOTAL_TOKENS, print_llm_usage_summary
+from run_checkpoint import RunCheckpoint, html_filename
+from delivery_profiles import (
+    DEFAULT_PROFILE,
+    load_delivery_profiles,
+    union_stock_ids,
+    feed_plan_for_stocks,
+    profile_results,
+    build_digest_messages,
+    send_profile_digest,
+    summarize_deliveries)
+from run_deadline import RunDeadline
+from run_report import (
+    RUN_REPORT_FILE,
+    stage_timer,
+    timed_stock,
+    timed_call,
+    record_latency,
+    reset_metrics,
+    build_run_report,
+    write_run_report,
+    print_run_report_summary)
+from metrics_exporter import write_textfile
+from mail_outbox import (
+    load_outbox_policy,
+    enqueue,
+    drain_outbox,
+    find_message,
+    outbox_counts,
+    requeue_failed,
+    print_outbox_stats)
+from run_profiler import enable_profiling, profile_stage, profiled, finish_profiling
+from feed_scheduler import (
+    load_feed_stats,
+    save_feed_stats,
+    load_polling_policy,
+    select_feeds_to_poll,
+    update_feed_stats,
+    record_feed_polled,
+    record_feed_yield,
+    reset_run_yield,
+    mark_feeds_polled)
+from daemon_schedule import load_daemon_policy, next_delivery_time
 import os
+import signal
 VERSION = "v5.3-restored-20260122"
 
-
-# OpenAI クライアント初期化
-client = OpenAI()
+# 起動時間短縮のため、feedparser / requests / dateutil / sendgrid / openai は
+# 初回使用時に読み込む（OpenAIクライアントは llm_client.get_openai_client）
 
 # 台湾時間
 TW_TZ = pytz.timezone('Asia/Taipei')
 
+# 銘柄処理の並列数（LLMのレートリミットを考慮して控えめに）
+STOCK_WORKERS = 4
+
+# process_stock の戻り値: 30日フォールバックが必要（再収集は呼び出し側で全銘柄分まとめて行う）
+NEEDS_FALLBACK = 'needs_fallback'
+
+# HTTP接続プールの大きさ（URL解決の並列数に合わせる）
+HTTP_POOL_SIZE = 10
+_http = {'session': None}
+_http_lock = threading.Lock()
+
+# 記事URL索引の作成は1スレッドで行う
+_url_index_lock = threading.Lock()
+
 # 統計情報
 STATS = {
     'cache_hit': 0,
     'cache_miss': 0,
+    'relevance_cache_hit': 0,
+    'relevance_cache_miss': 0,
     'redirect_timeout': 0,
     'redirect_failed': 0,
     'sns_domain_excluded': 0,
     'sns_publisher_excluded': 0,
     'duplicate_excluded': 0,
+    'near_duplicate_collapsed': 0,
     'unknown_publisher_excluded': 0
 }
 
@@ -65,72 +134,9 @@ def load_stocks():
 
 STOCKS = load_stocks()
 
-# RSSフィード（v5.2-lite: 30件に削減、多面性維持）
-RSS_FEEDS = [
-    # ========================================
-    # カテゴリ① 銘柄直結クエリ（10件）
-    # ========================================
-
-    # 台積電（2330） - 3件
-    "https://news.google.com/rss/search?q=台積電+OR+TSMC&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=TSMC&hl=en-US&gl=US&ceid=US:en",
-    "https://news.google.com/rss/search?q=TSMC&hl=ja&gl=JP&ceid=JP:ja",
-
-    # 創見（2451） - 2件
-    "https://news.google.com/rss/search?q=創見+OR+Transcend&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=創見+OR+Transcend&hl=ja&gl=JP&ceid=JP:ja",
-
-    # 宇瞻（8271） - 2件
-    "https://news.google.com/rss/search?q=宇瞻+OR+Apacer&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=Apacer&hl=en-US&gl=US&ceid=US:en",
-
-    # 廣達（2382） - 3件
-    "https://news.google.com/rss/search?q=廣達+OR+Quanta&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=Quanta+Computer&hl=en-US&gl=US&ceid=US:en",
-    "https://news.google.com/rss/search?q=廣達+OR+Quanta&hl=ja&gl=JP&ceid=JP:ja",
-
-    # ========================================
-    # カテゴリ② 上流ドライバークエリ（13件）
-    # ========================================
-
-    # 技術キーワード（6件）
-    "https://news.google.com/rss/search?q=EUV&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=CoWoS&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=HBM&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=液冷&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=先進製程&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=先進封裝&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-
-    # 顧客・プラットフォーム（3件）
-    "https://news.google.com/rss/search?q=NVIDIA&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=AI伺服器&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=GB200&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-
-    # 政策・地政学（2件）
-    "https://news.google.com/rss/search?q=美國廠&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=關稅&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-
-    # 需給・供給制約（2件）
-    "https://news.google.com/rss/search?q=DRAM價格&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=產能&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-
-    # ========================================
-    # カテゴリ③ 業績・イベントクエリ（4件）
-    # ========================================
-
-    "https://news.google.com/rss/search?q=台積電+營收&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=創見+營收&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=宇瞻+營收&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=廣達+營收&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-
-    # ========================================
-    # カテゴリ④ 共通業界クエリ（3件）
-    # ========================================
-
-    "https://news.google.com/rss/search?q=半導體&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=DRAM+OR+NAND&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-    "https://news.google.com/rss/search?q=ODM&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
-]
+# RSSフィード（stocks.json のクエリ定義から生成、共有クエリは重複除外）
+FEED_PLAN = build_feed_plan(STOCKS)
+RSS_FEEDS = [feed['url'] for feed in FEED_PLAN]
 
 # SNSドメインリスト
 SNS_DOMAINS = [
@@ -179,13 +185,63 @@ def clean_url(url):
     return urlunparse(clean_parsed)
 
 
+def get_http_session():
+    """
+    共有のHTTPセッション（requestsは初回呼び出し時に読み込む）
+    同じホストへの接続を再利用する（常駐モードではポーリングのたびに接続し直さない）
+    """
+    with _http_lock:
+        if _http['session'] is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http['session'] = session
+        return _http['session']
+
+
+def fetch_feed(url, timeout=15):
+    """
+    RSSフィードを取得・解析（feedparserは初回呼び出し時に読み込む）
+    応答の遅いフィードで収集が止まらないよう、取得にはタイムアウトを設ける
+    """
+    import feedparser
+
+    response = get_http_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    return feedparser.parse(response.content)
+
+
+def parse_published(published):
+    """配信日時文字列を解析（dateutilは初回呼び出し時に読み込む）"""
+    from dateutil import parser as date_parser
+    return date_parser.parse(published)
+
+
+def get_sendgrid_client():
+    """
+    SendGridクライアントを生成（sendgridは送信時にのみ読み込む）
+    SENDGRID_API_HOST で送信先を変更できる（検証用のローカルサーバーなど）
+    """
+    from sendgrid import SendGridAPIClient
+    return SendGridAPIClient(
+        os.environ.get('SENDGRID_API_KEY'),
+        host=os.environ.get('SENDGRID_API_HOST', 'https://api.sendgrid.com'))
+
+
 def resolve_final_url(url, timeout=2):
     """
     リダイレクトを追跡して最終到達URLを取得
     タイムアウト: 2秒（v5.2-liteで短縮）
     """
+    import requests
+
+    started = time.perf_counter()
     try:
-        response = requests.head(url, allow_redirects=True, timeout=timeout)
+        response = get_http_session().head(url, allow_redirects=True, timeout=timeout)
         final_url = clean_url(response.url)
         return final_url
     except requests.Timeout:
@@ -194,6 +250,8 @@ def resolve_final_url(url, timeout=2):
     except Exception as e:
         STATS['redirect_failed'] += 1
         return None
+    finally:
+        record_latency('redirect', time.perf_counter() - started)
 
 
 def extract_publisher_from_url(url):
@@ -280,19 +338,100 @@ def generate_article_signature(title, publisher, pub_date, snippet):
     return hashlib.md5(signature_string.encode('utf-8')).hexdigest()
 
 
+def migrate_article_snippet(article):
+    """
+    旧形式（HTMLのまま保存）の概要をプレーンテキスト＋リンク一覧に移行し、署名を再計算
+    移行済みならそのまま返す
+    """
+    if article.snippet_version == SNIPPET_VERSION:
+        return article
+
+    article.snippet, article.snippet_links = normalize_snippet(article.snippet)
+    article.snippet_version = SNIPPET_VERSION
+    try:
+        pub_date = datetime.fromisoformat(article.date)
+    except (TypeError, ValueError):
+        pub_date = None
+    article.signature = generate_article_signature(
+        article.title, article.publisher, pub_date, article.snippet)
+    # 指紋も新しい本文で計算し直す
+    article.simhash = None
+    return article
+
+
 def load_cache():
-    """キャッシュファイルを読み込み"""
+    """
+    キャッシュファイルを読み込み（ニュースは記事レコードに復元）
+    旧形式の概要は移行し、その場で保存する（移行は1回だけ。実行が途中で失敗しても次回に繰り返さない）
+    """
     try:
         with open('.taiwan_stock_news_cache_v5.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+            cache = json.load(f)
     except FileNotFoundError:
         return {"news": {}, "topics": {}}
 
+    news = {}
+    migrated = 0
+    for data in cache.get('news', {}).values():
+        article = NewsArticle.from_cache_dict(data)
+        if article.snippet_version != SNIPPET_VERSION:
+            migrate_article_snippet(article)
+            migrated += 1
+        news[article.signature] = article
+    cache['news'] = news
+
+    if migrated:
+        print(f"🔄 キャッシュ移行（概要の正規化）: {migrated}件")
+        try:
+            save_cache(cache)
+        except OSError as e:
+            print(f"⚠️ 移行したキャッシュの保存エラー: {e}")
+    return cache
+
 
 def save_cache(cache):
-    """キャッシュファイルを保存"""
+    """キャッシュファイルを保存（記事レコードは辞書に変換）"""
+    # 期限切れで打ち切った銘柄処理が書き込み中でも保存できるよう各セクションを複製
+    # _ で始まる項目（URL索引など）はメモリ上だけのため保存しない
+    serialized = {
+        key: dict(value) if isinstance(value, dict) else value
+        for key, value in cache.items() if not key.startswith('_')}
+    # 記事の辞書は変換しながら走査するため、先に項目を複製してから変換する
+    serialized['news'] = {
+        sig: article.to_cache_dict()
+        for sig, article in list(cache.get('news', {}).items())}
     with open('.taiwan_stock_news_cache_v5.json', 'w', encoding='utf-8') as f:
-        json.dump(cache, f, ensure_ascii=False, indent=2)
+        json.dump(serialized, f, ensure_ascii=False, indent=2)
+
+
+def news_url_index(cache):
+    """
+    記事URL（RSSのリンク・最終URL）→ 署名の索引（キャッシュの '_url_index'、保存しない）
+    初回に最終URLから作成し、URL解決した記事のRSSリンクを追加していく
+    """
+    index = cache.get('_url_index')
+    if index is None:
+        with _url_index_lock:
+            index = cache.get('_url_index')
+            if index is None:
+                index = {article['url']: sig for sig, article in cache['news'].items()}
+                cache['_url_index'] = index
+    return index
+
+
+def near_duplicate_index(cache, max_distance):
+    """
+    近似重複のバンド索引（キャッシュの '_near_duplicate_index'、保存しない）
+    初回に指紋計算済みの記事から作成し、集約のたびに新しい記事を追加していく
+    """
+    index = cache.get('_near_duplicate_index')
+    if index is None or index['bands'] != max_distance + 1:
+        index = new_band_index(max_distance)
+        for sig, article in cache['news'].items():
+            if article.simhash:
+                add_to_band_index(index, sig, int(article.simhash, 16))
+        cache['_near_duplicate_index'] = index
+    return index
 
 
 def clean_cache(cache):
@@ -306,6 +445,15 @@ def clean_cache(cache):
     cache['news'] = {sig: data for sig, data in cache['news'].items()
                      if data.get('cached_at', '') > news_cutoff}
 
+    # URL索引は削除した記事の項目だけ除く（作り直すと最終URLしか残らず、
+    # RSSリンクがすべて未解決に戻って次のポーリングで再解決になる）
+    url_index = cache.get('_url_index')
+    if url_index is not None:
+        for url in [url for url, sig in url_index.items() if sig not in cache['news']]:
+            del url_index[url]
+    if '_near_duplicate_index' in cache:
+        prune_band_index(cache['_near_duplicate_index'], cache['news'].keys())
+
     # 論点キャッシュ: 7営業日（約10日）保持
     if 'topics' not in cache:
         cache['topics'] = {}
@@ -316,23 +464,42 @@ def clean_cache(cache):
             'cached_at',
             '') > topic_cutoff}
 
+    # 関連性判定キャッシュ: ニュースキャッシュと同じ30日間保持
+    if 'relevance' not in cache:
+        cache['relevance'] = {}
+    cache['relevance'] = {
+        key: data for key,
+        data in cache['relevance'].items() if data.get(
+            'cached_at',
+            '') > news_cutoff}
+
+    # 投資判断補助キャッシュ: 論点キャッシュと同じ約10日保持（連休明けまで保持）
+    if 'aux' not in cache:
+        cache['aux'] = {}
+    cache['aux'] = {
+        stock_id: data for stock_id,
+        data in cache['aux'].items() if data.get(
+            'cached_at',
+            '') > topic_cutoff}
+
     return cache
 
 
 def process_rss_entry(entry, cache):
     """
-    RSSエントリを処理（並列処理用）
+    RSSエントリ（RssEntry）を処理（並列処理用）
     キャッシュ優先でリダイレクト追跡をスキップ
     """
-    rss_url = entry.get("link", "")
-    title = entry.get("title", "")
+    rss_url = entry.link
+    title = entry.title
 
-    # キャッシュチェック（rss_urlベース）
+    # キャッシュチェック（URL索引: 過去にURL解決したRSSリンク・最終URL）
     # 注: 厳密にはURL解決後のURLでチェックすべきだが、高速化のためここで一次チェック
-    for sig, data in cache['news'].items():
-        if data.get('url') == rss_url:
-            STATS['cache_hit'] += 1
-            return data
+    url_index = news_url_index(cache)
+    signature = url_index.get(rss_url)
+    if signature in cache['news']:
+        STATS['cache_hit'] += 1
+        return cache['news'][signature]
 
     # URL解決
     final_url = resolve_final_url(rss_url)
@@ -348,81 +515,116 @@ def process_rss_entry(entry, cache):
     publisher = extract_publisher_from_url(final_url)
     if not publisher:
         # Google Newsの場合、sourceタグから取得を試みる
-        if 'source' in entry:
-            publisher = entry.source.get('title')
+        publisher = entry.source_title
 
         if not publisher:
             STATS['unknown_publisher_excluded'] += 1
             return None
 
-    # 日付解析
-    pub_date = None
-    if "published" in entry:
-        try:
-            pub_date = date_parser.parse(entry.published).astimezone(TW_TZ)
-        except BaseException:
-            pass
-
+    # 日付（収集時に解析済み）
+    pub_date = entry.pub_date
     if not pub_date:
         pub_date = datetime.now(TW_TZ)
 
+    # 概要をプレーンテキストとリンク一覧に分離
+    snippet, snippet_links = normalize_snippet(entry.summary)
+
     # 署名生成とキャッシュチェック（コンテンツベース）
-    snippet = entry.get("summary", "")
     signature = generate_article_signature(title, publisher, pub_date, snippet)
 
     if signature in cache['news']:
         STATS['cache_hit'] += 1
+        url_index[rss_url] = signature
         return cache['news'][signature]
 
     STATS['cache_miss'] += 1
 
     # 新規データ作成
-    news_item = {
-        "title": title,
-        "url": final_url,
-        "publisher": publisher,
-        "date": pub_date.isoformat(),
-        "snippet": snippet,
-        "signature": signature,
-        "cached_at": datetime.now(TW_TZ).isoformat()
-    }
+    news_item = NewsArticle(
+        title=title,
+        url=final_url,
+        publisher=publisher,
+        date=pub_date.isoformat(),
+        snippet=snippet,
+        signature=signature,
+        cached_at=datetime.now(TW_TZ).isoformat(),
+        snippet_links=snippet_links,
+        snippet_version=SNIPPET_VERSION)
 
     # キャッシュ更新（呼び出し元で保存が必要）
     cache['news'][signature] = news_item
+    url_index[rss_url] = signature
+    url_index[final_url] = signature
 
     return news_item
 
 
-def collect_news_from_rss(days=7):
-    """RSSフィードからニュースを収集（並列処理）"""
-    print(f"📰 RSSフィードからニュース収集中... (過去{days}日分)")
+def collect_news_from_rss(days=7, cache=None, feed_plan=None, deadline=None, incremental=False,
+                          scheduled=True):
+    """
+    RSSフィードからニュースを収集（並列処理）
+    cacheを渡した場合はそのキャッシュを更新する（保存は常に行う）
+    feed_planを渡した場合はそのフィードのみ取得する（省略時は FEED_PLAN 全件）
+    incremental=True（常駐モードのポーリング）はキャッシュ保存・近似重複の集約を呼び出し側に任せる
+    scheduled=False（フォールバックの再取得）はフィードの取得回数・新規記事数を統計に記録しない
+
+    各記事は取得元フィードのメタデータ（feed_meta: 購読銘柄・カテゴリ・地域）を重ねた
+    この実行だけのビューで返す（共有の記事レコードには書き込まない）
+    """
+    if feed_plan is None:
+        feed_plan = FEED_PLAN
+
+    print(f"📰 RSSフィードからニュース収集中... (過去{days}日分, {len(feed_plan)}フィード)")
 
     all_entries = []
     cutoff_date = datetime.now(TW_TZ) - timedelta(days=days)
 
-    # フィード取得（I/Oバウンドなのでスレッド数多めでもOKだが、相手先負荷考慮し制限）
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(feedparser.parse, url) for url in RSS_FEEDS]
+    feed_timeout = deadline.policy['feed_timeout_sec'] if deadline else 15
 
-        for future in as_completed(futures):
-            feed = future.result()
+    # フィード取得（I/Oバウンドなのでスレッド数多めでもOKだが、相手先負荷考慮し制限）
+    # 段階の期限を過ぎたら、取得済みのフィードだけで続行する
+    executor = ThreadPoolExecutor(max_workers=5)
+    futures = {
+        executor.submit(
+            profiled(timed_call), 'feed_fetch', fetch_feed, feed_def['url'], feed_timeout): feed_def
+        for feed_def in feed_plan}
+    try:
+        for future in as_completed(
+                futures, timeout=deadline.stage_remaining() if deadline else None):
+            feed_def = futures[future]
+            try:
+                feed = future.result()
+            except Exception as e:
+                print(f"  ⚠️ フィード取得エラー: {feed_def['query']} ({e})")
+                continue
+            if scheduled:
+                record_feed_polled(feed_def['url'])
             for entry in feed.entries:
                 # 日付フィルタ（一次）
+                pub_date = None
                 if "published" in entry:
                     try:
-                        pub_date = date_parser.parse(
+                        pub_date = parse_published(
                             entry.published).astimezone(TW_TZ)
                         if pub_date < cutoff_date:
                             continue
                     except BaseException:
                         pass
-                all_entries.append(entry)
+                # 必要な項目だけを保持（feedparserのエントリはここで手放す）
+                all_entries.append(
+                    (RssEntry.from_feedparser(entry, pub_date), feed_def))
+    except FuturesTimeoutError:
+        pending = sum(1 for future in futures if not future.done())
+        deadline.degrade(
+            "未取得フィードを打ち切り", f"段階の期限超過: {pending}/{len(futures)}フィード未完了")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     print(f"  RSS収集完了: {len(all_entries)}件")
 
-    # キャッシュ読み込み
-    cache = load_cache()
-    cache = clean_cache(cache)
+    # キャッシュ読み込み（渡された場合は呼び出し元でクリーニング済み）
+    if cache is None:
+        cache = clean_cache(load_cache())
 
     processed_news = []
 
@@ -430,25 +632,51 @@ def collect_news_from_rss(days=7):
     print(f"🔗 URL解決中（{len(all_entries)}件）...")
 
     # 処理上限設定（APIコストと時間節約）
+    # URL索引にある記事はURL解決しないため上限に数えない
     MAX_URL_PROCESS = 200
-    if len(all_entries) > MAX_URL_PROCESS:
+    url_index = news_url_index(cache)
+    known_entries = [item for item in all_entries if url_index.get(item[0].link) in cache['news']]
+    new_entries = [item for item in all_entries if url_index.get(item[0].link) not in cache['news']]
+    if len(new_entries) > MAX_URL_PROCESS:
         print(f"  ⚠️ 件数が多いため、最新{MAX_URL_PROCESS}件のみ処理します")
-        all_entries = all_entries[:MAX_URL_PROCESS]
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = [
-            executor.submit(
-                process_rss_entry,
-                entry,
-                cache) for entry in all_entries]
-
-        for future in as_completed(futures):
+        new_entries = new_entries[:MAX_URL_PROCESS]
+    all_entries = known_entries + new_entries
+
+    # 記事URL → 取得元フィードのメタデータ（同一記事が複数フィードに出る場合は統合）
+    feed_routes = {}
+    # この時刻以降にキャッシュされた記事が今回の新規記事
+    processing_started_at = datetime.now(TW_TZ).isoformat()
+
+    executor = ThreadPoolExecutor(max_workers=10)
+    futures = {
+        executor.submit(
+            profiled(process_rss_entry),
+            entry,
+            cache): feed_def for entry, feed_def in all_entries}
+    try:
+        for future in as_completed(
+                futures, timeout=deadline.stage_remaining() if deadline else None):
             result = future.result()
             if result:
                 processed_news.append(result)
+                route = feed_routes.setdefault(
+                    result['url'],
+                    {'stocks': set(), 'categories': set(), 'locales': set(), 'feeds': set()})
+                feed_def = futures[future]
+                route['feeds'].add(feed_def['url'])
+                route['stocks'].update(feed_def['stocks'])
+                route['categories'].add(feed_def['category'])
+                route['locales'].add(feed_def['locale'])
+    except FuturesTimeoutError:
+        pending = sum(1 for future in futures if not future.done())
+        deadline.degrade(
+            "URL未解決の記事を除外", f"段階の期限超過: {pending}/{len(futures)}件未完了")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     # キャッシュ保存
-    save_cache(cache)
+    if not incremental:
+        save_cache(cache)
 
     # 重複排除（URLベース）
     unique_news = []
@@ -456,22 +684,66 @@ def collect_news_from_rss(days=7):
 
     for news in processed_news:
         if news['url'] not in seen_urls:
+            route = feed_routes[news['url']]
+            news = AnnotatedNews(
+                news, {'feed_meta': {key: sorted(values) for key, values in route.items()}})
+            if scheduled and news['cached_at'] >= processing_started_at:
+                record_feed_yield(news['feed_meta']['feeds'], 'new_unique', news['signature'])
             unique_news.append(news)
             seen_urls.add(news['url'])
         else:
             STATS['duplicate_excluded'] += 1
 
+    # 近似重複の集約（転載・タイトル微修正の記事を代表1件＋別媒体リストに）
+    near_duplicate_policy = load_near_duplicate_policy()
+    if near_duplicate_policy['enabled'] and not incremental:
+        unique_news, collapsed = collapse_near_duplicates(
+            unique_news, near_duplicate_policy['max_hamming_distance'],
+            near_duplicate_index(cache, near_duplicate_policy['max_hamming_distance']))
+        STATS['near_duplicate_collapsed'] += collapsed
+        if collapsed:
+            print(f"  🧬 近似重複を集約: {collapsed}件")
+
     print(f"✅ 重複除外後: {len(unique_news)}件")
     return unique_news
 
 
-def filter_news_by_stock(news_list, stock_id, stock_info):
-    """銘柄に関連するニュースをフィルタリング（キーワードマッチ）"""
+def route_news_by_stock(news_list, stock_ids):
+    """
+    記事を取得元フィードの購読銘柄に振り分ける
+    共通業界クエリの記事は購読している全銘柄に届く
+    feed_metaのない記事（ルーティング情報なし）は全銘柄に振り分ける
+
+    Returns:
+        dict: 証券コード → 記事リスト
+    """
+    routed = {stock_id: [] for stock_id in stock_ids}
+
+    for news in news_list:
+        feed_meta = news.get('feed_meta')
+        targets = feed_meta['stocks'] if feed_meta else stock_ids
+        for stock_id in targets:
+            if stock_id in routed:
+                routed[stock_id].append(news)
+
+    routed_pairs = sum(len(items) for items in routed.values())
+    print(
+        f"🧭 銘柄ルーティング: {len(news_list)}件 × {len(routed)}銘柄 → 判定対象 {routed_pairs}件")
+    return routed
+
+
+def stock_search_keywords(stock_id, stock_info):
+    """銘柄の検索キーワード（銘柄名・証券コードを含む）"""
     keywords = stock_info.get('keywords', [])
     stock_name = stock_info.get('name', '')
 
     # 銘柄名もキーワードに追加
-    search_keywords = keywords + [stock_name, stock_id]
+    return keywords + [stock_name, stock_id]
+
+
+def filter_news_by_stock(news_list, stock_id, stock_info):
+    """銘柄に関連するニュースをフィルタリング（キーワードマッチ）"""
+    search_keywords = stock_search_keywords(stock_id, stock_info)
 
     relevant_news = []
     for news in news_list:
@@ -482,19 +754,175 @@ def filter_news_by_stock(news_list, stock_id, stock_info):
     return relevant_news
 
 
+def keyword_relevance_judge(news):
+    """
+    キーワードによる関連性判定（delayed_valuable_news）
+
+    Returns:
+        tuple: (関連あり, 判定理由, 関連スコア)
+    """
+    if is_delayed_valuable_news(news['title'], news['snippet']):
+        return True, "キーワードマッチにより関連ありと判定", 80  # デフォルトスコア
+    return False, "", 0
+
+
+# 判定器の名前（判定結果キャッシュの無効化キーに含める）
+keyword_relevance_judge.judge_name = "keyword-v1"
+
+
+def relevance_fingerprint(stock_id, stock_info, judge):
+    """
+    判定結果キャッシュの無効化キー
+    銘柄のキーワード・判定器・delayed_valuable_news のキーワードリストのいずれかが
+    変わるとハッシュが変わり、過去の判定結果は使われなくなる
+    """
+    payload = json.dumps({
+        "stock_id": stock_id,
+        "name": stock_info.get('name', ''),
+        "keywords": stock_info.get('keywords', []),
+        "judge": getattr(judge, 'judge_name', judge.__name__),
+        "delayed_valuable_keywords": keyword_fingerprint()
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def judge_relevance_cached(news, stock_id, fingerprint, cache,
+                           judge=keyword_relevance_judge):
+    """
+    関連性判定（signature + stock_id をキーにキャッシュ）
+    LLMによる判定器に差し替えた場合も、未判定の記事だけコストが発生する
+
+    Returns:
+        dict: {'relevant', 'reason', 'score', 'fingerprint', 'cached_at'}
+    """
+    cache_key = f"{news['signature']}_{stock_id}_relevance"
+    relevance_cache = cache.setdefault('relevance', {})
+
+    cached = relevance_cache.get(cache_key)
+    if cached and cached.get('fingerprint') == fingerprint:
+        STATS['relevance_cache_hit'] += 1
+        return cached
+
+    STATS['relevance_cache_miss'] += 1
+    relevant, reason, score = judge(news)
+    decision = {
+        "relevant": relevant,
+        "reason": reason,
+        "score": score,
+        "fingerprint": fingerprint,
+        "cached_at": datetime.now(TW_TZ).isoformat()
+    }
+    relevance_cache[cache_key] = decision
+    return decision
+
+
+def format_aux_news(aux_news):
+    """投資判断補助ニュースを既存のニュース形式に変換"""
+    pub_date = datetime.now(TW_TZ).strftime('%Y-%m-%d %H:%M')
+    return {
+        "topic_theme": "📉 投資判断補助（株価フェーズ整理）",
+        "title_ja": f"【{aux_news['phase']}】{aux_news['price_movement']}",
+        "title_tw": "Market Phase Analysis",  # 繁体字タイトルは英語表記で代用（または空文字）
+        "summary_ja": f"{aux_news['news_correlation']}\n\n💡 注意点: {aux_news['caution_point']}",
+        # 分析ボックス用
+        "representative_reason": aux_news['news_correlation'],
+        "source": "Market Analysis",
+        "pub_date": pub_date,
+        "url": "#",  # リンクなし
+        "related_score": 0,  # スコアなし
+        "sentiment": "neutral",
+        # テンプレート（email_template_v5）が参照する項目
+        "cluster_theme": "📉 投資判断補助（株価フェーズ整理）",
+        "title": "Market Phase Analysis",
+        "link": "#",
+        "publisher": "Market Analysis",
+        "published": pub_date,
+        "relevance_score": 0,
+        "relevance_reason": f"💡 注意点: {aux_news['caution_point']}",
+        "supplementary_news": [],
+        "supplementary_perspectives": []
+    }
+
+
+def build_stock_result(stock_id, stock_info, news, clustering_result=None):
+    """テンプレート（email_template_v5）に渡す銘柄ごとの結果を作成"""
+    if clustering_result and clustering_result['clusters']:
+        topic = " / ".join(
+            cluster['theme'] for cluster in clustering_result['clusters'][:3])
+    else:
+        topic = "関連ニュースなし（株価フェーズのみ）"
+
+    return {
+        'stock_id': stock_id,
+        'stock_name': stock_info['name'],
+        'stock_info': stock_info,
+        'topic': topic,
+        'is_single_event': bool(clustering_result and clustering_result['is_single_event']),
+        'event_description': clustering_result['event_description'] if clustering_result else None,
+        'news': news
+    }
+
+
+def get_investment_aux_news(stock_id, stock_info, news_list, cache, deadline=None):
+    """
+    投資判断補助ニュースを取得
+    休場日（土日・TWSE休場日）は新しい株価バーがないため、
+    株価取得とLLM再生成をスキップして前回の分析結果を再利用する
+    期限が迫っている場合も前回の分析結果を再利用する（なければ省略）
+    """
+    aux_cache = cache.setdefault('aux', {})
+
+    if deadline and deadline.short_of('aux_generation_min_sec'):
+        cached = aux_cache.get(stock_id)
+        if cached:
+            deadline.degrade(
+                "投資判断補助は前回の分析結果を再利用",
+                f"段階の残り時間不足（{cached['trading_day']}時点の結果）", stock_id)
+            return cached['result']
+        deadline.degrade("投資判断補助を省略", "段階の残り時間不足・前回の結果なし", stock_id)
+        return None
+
+    if not is_trading_day():
+        cached = aux_cache.get(stock_id)
+        if cached:
+            print(
+                f"  📅 休場日のため前回の株価フェーズ分析を再利用します（{cached['trading_day']}時点）")
+            return cached['result']
+        print("  📅 休場日ですが前回の分析結果がないため生成します")
+
+    aux_news = generate_investment_aux_news(
+        stock_id, stock_info, news_list, timeout=deadline.llm_timeout() if deadline else None)
+    if aux_news:
+        aux_cache[stock_id] = {
+            "result": aux_news,
+            "trading_day": last_trading_day().isoformat(),
+            "cached_at": datetime.now(TW_TZ).isoformat()
+        }
+    return aux_news
+
+
 def process_stock_news(
         stock_id,
         stock_info,
         all_news,
         cache,
-        fallback_mode=False):
+        fallback_mode=False,
+        overlay=None,
+        deadline=None):
     """
     銘柄ごとのニュース処理フロー
     1. キーワードフィルタ
-    2. LLM関連性判定（厳選）
+    2. 関連性判定（厳選）→ 関連ニュースをトークン予算内に絞り込み
     3. クラスタリング・要約
     4. 投資判断補助ニュース生成・追加（新規）
+
+    共有の記事レコードには書き込まず、銘柄ごとの注釈は overlay に保持する
+    （銘柄を並列処理しても互いの注釈が混ざらない）
+    期限が迫っている場合はクラスタリング・投資判断補助を縮退する（deadline）
     """
+    if overlay is None:
+        overlay = AnnotationOverlay()
+
     print(f"============================================================")
     print(f"📊 {stock_info['name']}（{stock_id}）")
     print(f"============================================================")
@@ -507,42 +935,41 @@ def process_stock_news(
         print("  ❌ 候補なし")
         return None
 
-    # 2. LLM関連性判定（コスト削減のため件数制限）
-    MAX_LLM_CHECK = 15 if not fallback_mode else 30
-    if len(candidates) > MAX_LLM_CHECK:
-        # 日付が新しい順にソートして上位のみチェック
-        candidates.sort(key=lambda x: x['date'], reverse=True)
-        candidates = candidates[:MAX_LLM_CHECK]
-
-    relevant_news = []
-
-    # 遅延価値判定（delayed_valuable_news.py）を使用
-    # LLM判定はコストがかかるため、ここも並列化したいが、
-    # レートリミット考慮して直列実行（または少数の並列）
-
-    # 既存のキャッシュ済み判定結果があれば利用
-    # （今回は簡易実装として、news_clustering_v51.py 内のロジックに任せるか、
-    #   ここで自前で呼ぶか。v5.2-liteではここで呼ぶ設計）
+    # 2. 関連性判定（遅延価値判定、delayed_valuable_news.py）
+    # 判定結果は signature + stock_id でキャッシュし、
+    # 銘柄キーワード・キーワードリストが変わった場合のみ再判定する
+    fingerprint = relevance_fingerprint(
+        stock_id, stock_info, keyword_relevance_judge)
 
+    decisions = {}
     for news in candidates:
-        # キャッシュキー: signature + stock_id
-        cache_key = f"{news['signature']}_{stock_id}_relevance"
+        decision = judge_relevance_cached(news, stock_id, fingerprint, cache)
+        if decision['relevant']:
+            decisions[news['signature']] = decision
 
-        # キャッシュにあれば使う（判定結果は変わらないはず）
-        # ※実装簡略化のため、ここでは毎回判定（delayed_valuable_news内でキャッシュ機構あればよいが）
-        # 今回は直接 is_delayed_valuable_news を呼ぶ
+    if not decisions:
+        print("✅ 関連ニュース: 0件")
+        return None
 
-        # 簡易判定（キーワードマッチ）
-        is_relevant = is_delayed_valuable_news(news['title'], news['snippet'])
+    # 関連ニュースだけをローカルスコア順に並べ、クラスタリングプロンプトのトークン上限内に絞り込む
+    # （キーワード一致・類型・出典・新しさ。関連なしの記事が予算を使わないように判定の後で行う）
+    # 記事はプロンプトと同じ整形で数えるため、ここで選んだ記事がそのままクラスタリングに入る
+    relevant_views = [
+        overlay.annotate(
+            stock_id, news,
+            relevance_reason=decisions[news['signature']]['reason'],
+            relevance_score=decisions[news['signature']]['score'])
+        for news in candidates if news['signature'] in decisions]
+    ranked = rank_candidates(relevant_views, stock_search_keywords(stock_id, stock_info))
+    if len(ranked) < len(decisions):
+        print(f"  ✂️ トークン予算({CLUSTER_TOTAL_TOKENS})内の上位{len(ranked)}件に絞り込み"
+              f"（関連 {len(decisions)}件）")
 
-        if is_relevant:
-            news['relevance_reason'] = "キーワードマッチにより関連ありと判定"
-            news['relevance_score'] = 80  # デフォルトスコア
-            relevant_news.append(news)
-            # print(f"  ✅ 関連あり: {news['title'][:20]}...")
-        else:
-            pass
-            # print(f"  🗑️ 除外: {news['title'][:20]}...")
+    relevant_news = []
+    for rank_score, news in ranked:
+        news['rank_score'] = rank_score
+        relevant_news.append(news)
+        record_feed_yield(news.get('feed_meta', {}).get('feeds', []), 'survived', news['signature'])
 
     print(f"✅ 関連ニュース: {len(relevant_news)}件")
 
@@ -551,157 +978,689 @@ def process_stock_news(
 
     # 3. クラスタリング・要約（v5.1のロジック再利用）
     # ここで日本語翻訳と要約が行われる
-    clustering_result = cluster_news_by_topic(
-        stock_info['name'], relevant_news)
+    if deadline and deadline.short_of('llm_clustering_min_sec'):
+        deadline.degrade(
+            "LLMクラスタリングの代わりに関連スコア順で配信", "段階の残り時間不足", stock_id)
+        clustering_result = fallback_clustering(relevant_news)
+    else:
+        clustering_result = cluster_news_by_topic(
+            stock_info['name'], relevant_news,
+            timeout=deadline.llm_timeout() if deadline else None)
     clustered_news = prepare_delivery_news(clustering_result)
 
+    # 配信された記事（代表・補足）を取得元フィードの歩留まりに加算し、
+    # テンプレートが参照するリンク・日時を注釈として付与
+    for item in clustered_news:
+        for news in [item] + item['supplementary_news']:
+            record_feed_yield(
+                news.get('feed_meta', {}).get('feeds', []), 'delivered', news['signature'])
+            news['link'] = news['url']
+            news['published'] = news['date'][:16].replace('T', ' ')
+
     # ログ出力
     print_clustering_log(stock_info['name'], clustering_result)
 
     # 4. 投資判断補助ニュース生成・追加（新規）
     # 既存のニュースリストの末尾に、ニュースと同じフォーマットで追加する
     try:
-        aux_news = generate_investment_aux_news(
-            stock_id, stock_info, relevant_news)
+        aux_news = get_investment_aux_news(
+            stock_id, stock_info, relevant_news, cache, deadline)
         if aux_news:
             # 既存のニュース形式に合わせる
-            formatted_aux_news = {
-                "topic_theme": "📉 投資判断補助（株価フェーズ整理）",
-                "title_ja": f"【{aux_news['phase']}】{aux_news['price_movement']}",
-                "title_tw": "Market Phase Analysis",  # 繁体字タイトルは英語表記で代用（または空文字）
-                "summary_ja": f"{aux_news['news_correlation']}\n\n💡 注意点: {aux_news['caution_point']}",
-                # 分析ボックス用
-                "representative_reason": aux_news['news_correlation'],
-                "source": "Market Analysis",
-                "pub_date": datetime.now(TW_TZ).strftime('%Y-%m-%d %H:%M'),
-                "url": "#",  # リンクなし
-                "related_score": 0,  # スコアなし
-                "sentiment": "neutral"
-            }
-            clustered_news.append(formatted_aux_news)
+            clustered_news.append(format_aux_news(aux_news))
             print("  ✅ 投資判断補助ニュースを追加しました")
     except Exception as e:
         print(f"  ⚠️ 投資判断補助ニュース生成エラー: {e}")
 
-    return {
-        'stock_id': stock_id,
-        'stock_name': stock_info['name'],
-        'news': clustered_news
-    }
+    return build_stock_result(
+        stock_id, stock_info, clustered_news, clustering_result)
 
 
-def main():
-    print(f"🚀 台湾株ニュース配信システム {VERSION} 起動")
-    start_time = time.time()
+def process_stock(stock_id, stock_info, routed_news, cache, overlay, deadline=None,
+                  fallback_mode=False):
+    """
+    1銘柄分の処理（並列実行用）
+    直近7日で関連ニュースがなければ NEEDS_FALLBACK を返す
+    （30日分の再収集は呼び出し側で該当銘柄分をまとめて1回行い、fallback_mode=True で再度呼ぶ）
+    フォールバックでも関連ニュースがなければ投資判断補助のみ
+    routed_news が None（フォールバックの再収集をスキップ）の場合も投資判断補助のみ
+    """
+    if deadline and deadline.expired():
+        deadline.degrade("銘柄の処理をスキップ", "段階の期限超過", stock_id)
+        return None
 
-    # 1. ニュース収集（過去7日）
-    all_news = collect_news_from_rss(days=7)
+    if routed_news is None:
+        return aux_only_result(stock_id, stock_info, cache, deadline)
 
-    # キャッシュ読み込み（プロセス内で共有）
-    cache = load_cache()
+    res = process_stock_news(
+        stock_id, stock_info, routed_news, cache,
+        fallback_mode=fallback_mode, overlay=overlay, deadline=deadline)
+    if res:
+        return res
 
-    results = {}
+    if not fallback_mode:
+        print(
+            f"⚠️ {stock_info['name']}: 直近7日間のニュースなし。フォールバックモード(30日)を実行します。")
+        return NEEDS_FALLBACK
 
-    # 2. 銘柄ごとに処理
-    for stock_id, stock_info in STOCKS.items():
-        # _commentなどはスキップ
-        if stock_id.startswith('_') or stock_id == 'stocks':
-            continue
+    print(f"❌ {stock_info['name']}: 30日間でも関連ニュースなし")
+    return aux_only_result(stock_id, stock_info, cache, deadline)
 
-        res = process_stock_news(stock_id, stock_info, all_news, cache)
 
-        if res:
-            results[stock_id] = res
-        else:
-            # フォールバックモード（過去30日）
-            print(
-                f"⚠️ {stock_info['name']}: 直近7日間のニュースなし。フォールバックモード(30日)を実行します。")
-
-            # 30日分のニュースを再収集（全件は重いので、対象銘柄のクエリだけ叩くのが理想だが、
-            # 実装簡略化のため、既存関数で30日指定で再収集。ただしキャッシュ効くので2回目は速い）
-            # ※最適化: 本当はここで「この銘柄専用のRSS」だけ叩くべきだが、
-            # RSS_FEEDSリストがフラットなので、全件叩いてしまう。
-            # v5.2-liteでは許容範囲（30件程度なら）
-
-            fallback_news = collect_news_from_rss(days=30)
-            res = process_stock_news(
-                stock_id,
-                stock_info,
-                fallback_news,
-                cache,
-                fallback_mode=True)
+def collect_fallback_news(stock_ids, cache, deadline=None):
+    """
+    直近7日で関連ニュースがなかった銘柄の30日分のニュースを1回でまとめて再収集し、銘柄に振り分ける
+    （該当銘柄を購読しているフィードのみ。キャッシュ効くので速い）
+    再取得はポーリング計画外のため、フィードの取得回数には数えない（歩留まりの分母を水増ししない）
+    銘柄の並列処理の合間に行うため、キャッシュの保存が銘柄処理と重ならない
+    期限が迫っている場合は再収集をスキップする（各銘柄の記事は None）
+
+    Returns:
+        dict: 証券コード → 記事リスト
+    """
+    if deadline and deadline.short_of('fallback_recollect_min_sec'):
+        for stock_id in stock_ids:
+            deadline.degrade("フォールバック(30日)の再収集をスキップ", "段階の残り時間不足", stock_id)
+        return {stock_id: None for stock_id in stock_ids}
 
+    print(f"⚠️ フォールバックモード(30日): {len(stock_ids)}銘柄分をまとめて再収集します")
+    fallback_news = collect_news_from_rss(
+        days=30, cache=cache, feed_plan=feed_plan_for_stocks(FEED_PLAN, stock_ids),
+        deadline=deadline, scheduled=False)
+    return route_news_by_stock(fallback_news, stock_ids)
+
+
+def process_stocks_parallel(checkpoint, stock_ids, news_by_stock, cache, overlay, deadline,
+                            results, fallback_mode=False):
+    """
+    銘柄を並列処理し、完了した銘柄から保存して results に加える
+    段階の期限までに終わらなかった銘柄は今回の配信から外す
+
+    Returns:
+        list: 30日フォールバックが必要な銘柄（銘柄順）
+    """
+    needs_fallback = set()
+    executor = ThreadPoolExecutor(max_workers=STOCK_WORKERS)
+    futures = {
+        executor.submit(
+            profiled(timed_stock),
+            stock_id,
+            process_stock,
+            stock_id,
+            STOCKS[stock_id],
+            news_by_stock[stock_id],
+            cache,
+            overlay,
+            deadline,
+            fallback_mode): stock_id for stock_id in stock_ids}
+    try:
+        for future in as_completed(futures, timeout=deadline.stage_remaining()):
+            stock_id = futures[future]
+            res = future.result()
+            if res == NEEDS_FALLBACK:
+                needs_fallback.add(stock_id)
+                continue
+            if res is None and deadline.expired():
+                # 期限切れでスキップした銘柄は完了扱いにしない
+                continue
+            checkpoint.save_stock_result(stock_id, res)
             if res:
                 results[stock_id] = res
-            else:
-                print(f"❌ {stock_info['name']}: 30日間でも関連ニュースなし")
-                # ニュースなしでも投資判断補助だけは出したい場合、ここで生成する手もあるが、
-                # 今回の要件は「企業ニュース0件を防ぐ」ではなく「以前の挙動に戻す」なので、
-                # ニュースがなければメールにも載せない（または空で載せる）
-                # ただし、投資判断補助は「必ず1本」という要件があるため、
-                # ニュースがなくても投資判断補助だけ生成して返す
-                try:
-                    aux_news = generate_investment_aux_news(
-                        stock_id, stock_info, [])
-                    if aux_news:
-                        formatted_aux_news = {
-                            "topic_theme": "📉 投資判断補助（株価フェーズ整理）",
-                            "title_ja": f"【{aux_news['phase']}】{aux_news['price_movement']}",
-                            "title_tw": "Market Phase Analysis",
-                            "summary_ja": f"{aux_news['news_correlation']}\n\n💡 注意点: {aux_news['caution_point']}",
-                            "representative_reason": aux_news['news_correlation'],
-                            "source": "Market Analysis",
-                            "pub_date": datetime.now(TW_TZ).strftime('%Y-%m-%d %H:%M'),
-                            "url": "#",
-                            "related_score": 0,
-                            "sentiment": "neutral"}
-                        results[stock_id] = {
-                            'stock_id': stock_id,
-                            'stock_name': stock_info['name'],
-                            'news': [formatted_aux_news]
-                        }
-                        print("  ✅ ニュースなしのため、投資判断補助のみ生成しました")
-                except Exception as e:
-                    print(f"  ⚠️ 投資判断補助生成エラー(フォールバック): {e}")
+    except FuturesTimeoutError:
+        for future, stock_id in futures.items():
+            if not future.done():
+                deadline.degrade("処理中の銘柄を配信から除外", "段階の期限超過", stock_id)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [stock_id for stock_id in stock_ids if stock_id in needs_fallback]
+
+
+def aux_only_result(stock_id, stock_info, cache, deadline=None):
+    """ニュースなしの銘柄の結果（投資判断補助のみ）"""
+    # ニュースなしでも投資判断補助だけは出したい場合、ここで生成する手もあるが、
+    # 今回の要件は「企業ニュース0件を防ぐ」ではなく「以前の挙動に戻す」なので、
+    # ニュースがなければメールにも載せない（または空で載せる）
+    # ただし、投資判断補助は「必ず1本」という要件があるため、
+    # ニュースがなくても投資判断補助だけ生成して返す
+    try:
+        aux_news = get_investment_aux_news(
+            stock_id, stock_info, [], cache, deadline)
+        if aux_news:
+            print("  ✅ ニュースなしのため、投資判断補助のみ生成しました")
+            return build_stock_result(
+                stock_id, stock_info, [format_aux_news(aux_news)])
+    except Exception as e:
+        print(f"  ⚠️ 投資判断補助生成エラー(フォールバック): {e}")
+    return None
 
-    # 3. メール作成・送信
-    if results:
-        from email_template_v5 import generate_html_email as create_email_body
 
-        # メール本文作成
-        taipei_now = datetime.now(TW_TZ).strftime('%Y-%m-%d %H:%M')
-        html_content = create_email_body(results, taipei_now)
+def render_delivery_emails(checkpoint, profiles, results):
+    """
+    配信プロファイルごとにメールをレンダリングし runs/<run_id>/ に書き出す
+    銘柄セクションはキャッシュを共有するため、複数のプロファイルに入る銘柄は1回だけレンダリングする
+    """
+    pending = [profile for profile in profiles
+               if not checkpoint.profile_rendered(profile['name'])
+               and profile_results(profile, results)]
+    if checkpoint.stage_done('render') or not pending:
+        print("♻️ レンダリング済みメールを再利用します")
+        return
+
+    from email_template_v5 import iter_html_email
+    from email_section_cache import (
+        SECTION_STATS, load_section_cache_policy, load_section_cache, save_section_cache)
+    from email_size_optimizer import (
+        load_email_size_policy, render_email_within_budget, print_email_size_report)
+
+    # 前回までの銘柄セクション（内容が変わっていない銘柄は再レンダリングしない）
+    # 新しいセクションは、次回以降のために保存する場合か複数プロファイルで使い回せる場合だけ保持する
+    section_policy = load_section_cache_policy()
+    load_section_cache(section_policy)
+    store_sections = section_policy['enabled'] or len(pending) > 1
+
+    # メール本文作成（断片ごとに runs/<run_id>/email*.html へ書き出す）
+    # サイズ最適化が有効なら、上限に収まるよう圧縮・掲載件数を調整してから書き出す
+    taipei_now = datetime.now(TW_TZ).strftime('%Y-%m-%d %H:%M')
+    size_policy = load_email_size_policy()
+    for profile in pending:
+        selected = profile_results(profile, results)
+        if len(profiles) > 1:
+            print(f"📮 {profile['name']}: {len(selected)}銘柄 / 宛先 {len(profile['recipients'])}件")
+        if size_policy['enabled']:
+            chunks, size_report = render_email_within_budget(
+                selected, taipei_now, size_policy, store_sections)
+            checkpoint.save_html_chunks(
+                chunks, profile['name'], stocks=len(selected), email_size=size_report)
+            print_email_size_report(size_report)
+        else:
+            checkpoint.save_html_chunks(
+                iter_html_email(selected, taipei_now, store_sections), profile['name'],
+                stocks=len(selected))
+    print(f"🧩 銘柄セクション: 再利用 {SECTION_STATS['hit']} / 生成 {SECTION_STATS['miss']}")
+    try:
+        save_section_cache(section_policy)
+    except Exception as e:
+        print(f"⚠️ セクションキャッシュ保存エラー: {e}")
+    checkpoint.mark_stage('render', profiles=len(pending))
+
 
-        # プレビュー保存
-        with open('email_preview.html', 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        print("💾 プレビューを保存しました: email_preview.html")
+def send_delivery_emails(checkpoint, profiles, results, timeout=None):
+    """
+    配信プロファイルごとにメールを送信（宛先ごとに1 personalization でまとめて送る）
+    アウトボックスが有効なら送信JSONを outbox/ に積んでから送り、
+    時間内に送れなかったもの・失敗したものは次回の実行・--drain-outbox で再送する
+    送信済みのプロファイル（直接送信の場合は送信済みのバッチ）は --resume で再送しない
 
-        # 送信
-        recipient = os.environ.get('RECIPIENT_EMAIL')
-        if recipient:
-            message = Mail(
-                from_email=recipient,  # 自分自身に送る（SendGrid Sender Identity回避）
-                to_emails=recipient,
-                subject=f"🇹🇼 台湾株ニュース配信 {datetime.now(TW_TZ).strftime('%Y/%m/%d')}",
-                html_content=html_content
-            )
+    Args:
+        timeout: 送信に使える時間（秒、実行期限の残り）
 
+    Returns:
+        dict: プロファイル名 → {'status', 'status_code'(任意), 'recipients'(任意), 'outbox_keys'(任意)}
+    """
+    subject = f"🇹🇼 台湾株ニュース配信 {datetime.now(TW_TZ).strftime('%Y/%m/%d')}"
+    outbox_policy = load_outbox_policy()
+    deliveries = {}
+    client = None
+    for profile in profiles:
+        name = profile['name']
+        if not profile_results(profile, results):
+            deliveries[name] = {'status': 'no_results'}
+        elif checkpoint.stage_done('send') or checkpoint.profile_sent(name):
+            print(f"♻️ {name}: この実行のメールは送信済みのためスキップ")
+            deliveries[name] = {'status': 'already_sent'}
+        elif not profile['recipients']:
+            if name == DEFAULT_PROFILE:
+                print("⚠️ RECIPIENT_EMAIL が設定されていないため送信スキップ")
+            else:
+                print(f"⚠️ {name}: 宛先がないため送信スキップ")
+            deliveries[name] = {'status': 'skipped'}
+        elif outbox_policy['enabled']:
+            # 積むだけ（同じ実行・プロファイルのメールは二重に積まない）
+            html_content = checkpoint.load_html(name)
+            recipients = len(profile['recipients'])
             try:
-                sg = SendGridAPIClient(os.environ.get('SENDGRID_API_KEY'))
-                response = sg.send(message)
-                print(f"✅ 送信成功！ ステータスコード: {response.status_code}")
+                keys = [enqueue(message.get(), checkpoint.run_id, name, batch,
+                                len(message.personalizations), outbox_policy)
+                        for batch, message in enumerate(
+                            build_digest_messages(profile, html_content, subject))]
+                deliveries[name] = {'status': 'queued', 'recipients': recipients, 'outbox_keys': keys}
             except Exception as e:
-                print(f"❌ 送信エラー: {e}")
+                print(f"❌ アウトボックス書き込みエラー（{name}）: {e}")
+                deliveries[name] = {'status': 'failed', 'recipients': recipients}
         else:
-            print("⚠️ RECIPIENT_EMAIL が設定されていないため送信スキップ")
+            # 送信APIには本文全体が必要なため、ここで1回だけ読み込む
+            html_content = checkpoint.load_html(name)
+            recipients = len(profile['recipients'])
+            try:
+                client = client or get_sendgrid_client()
+                sent_batches = checkpoint.batches_sent(name)
+                if sent_batches:
+                    print(f"♻️ {name}: 送信済みのバッチ {len(sent_batches)}件をスキップ")
+                status_code = send_profile_digest(
+                    client, profile, html_content, subject, sent_batches,
+                    lambda batch, code, name=name: checkpoint.mark_batch_sent(name, batch, code))
+                print(f"✅ 送信成功！ {name}（宛先 {recipients}件） ステータスコード: {status_code}")
+                checkpoint.mark_profile_sent(name, status_code=status_code, recipients=recipients)
+                deliveries[name] = {
+                    'status': 'sent', 'status_code': status_code, 'recipients': recipients}
+            except Exception as e:
+                print(f"❌ 送信エラー（{name}）: {e}")
+                deliveries[name] = {
+                    'status': 'failed', 'status_code': getattr(e, 'status_code', None),
+                    'recipients': recipients}
+
+    if not outbox_policy['enabled']:
+        return deliveries
+
+    # 前回までに残ったメールも含めて送る（時間切れ・再送待ちは outbox/pending に残る）
+    drain_timeout = outbox_policy['drain_timeout_sec']
+    if timeout is not None:
+        drain_timeout = min(drain_timeout, timeout)
+    print_outbox_stats(drain_outbox(get_sendgrid_client, outbox_policy, drain_timeout))
+
+    for name, delivery in deliveries.items():
+        if delivery['status'] != 'queued':
+            continue
+        records = [find_message(key, outbox_policy) for key in delivery['outbox_keys']]
+        states = [record['state'] if record else None for record in records]
+        if all(state == 'sent' for state in states):
+            status_code = records[-1]['status_code']
+            print(f"✅ 送信成功！ {name}（宛先 {delivery['recipients']}件） ステータスコード: {status_code}")
+            checkpoint.mark_profile_sent(
+                name, status_code=status_code, recipients=delivery['recipients'],
+                outbox_keys=delivery['outbox_keys'])
+            delivery.update(status='sent', status_code=status_code)
+        elif 'failed' in states:
+            failed = records[states.index('failed')]
+            print(f"❌ {name}: 再送を打ち切りました（outbox/failed、--drain-outbox --retry-failed で再送）")
+            delivery.update(status='failed', status_code=failed['last_error']['status_code'])
+        else:
+            print(f"📤 {name}: 再送待ち（次回の実行・--drain-outbox で送信）")
+    return deliveries
 
+
+def drain_outbox_main(retry_failed=False):
+    """アウトボックスの未送信メールだけを送る（送信予定を過ぎたものすべて）"""
+    print(f"📤 台湾株ニュース配信システム {VERSION} アウトボックス送信")
+    policy = load_outbox_policy()
+    if retry_failed:
+        print(f"♻️ 再送を打ち切ったメールを戻しました: {requeue_failed(policy)}件")
+    print_outbox_stats(drain_outbox(get_sendgrid_client, policy))
+
+
+def load_delivery_targets():
+    """
+    配信プロファイル（宛先ごとの銘柄）と、収集・分析する銘柄（全プロファイルの和集合）
+    _commentなどはスキップ
+
+    Returns:
+        tuple: (配信プロファイルのリスト, 証券コードのリスト)
+    """
+    profiles = load_delivery_profiles(
+        [stock_id for stock_id in STOCKS if not stock_id.startswith('_') and stock_id != 'stocks'])
+    return profiles, union_stock_ids(profiles, STOCKS)
+
+
+def main(resume=None, profile=False, cache=None, collected_news=None):
+    """
+    配信処理（収集 → 銘柄ごとの処理 → レンダリング → 送信）
+    各段階の出力は runs/<run_id>/ に保存する
+
+    Args:
+        resume: 再開する実行ID（'' なら未完了の最新の実行、None なら新規実行）
+        profile: 段階ごとに cProfile / tracemalloc で計測し runs/<run_id>/profile/ に保存
+        cache: メモリ上のキャッシュ（常駐モード、省略時はファイルから読み込む）
+        collected_news: 収集済みの記事（常駐モードのポーリング結果、省略時はRSSから収集）
+    """
+    print(f"🚀 台湾株ニュース配信システム {VERSION} 起動")
+    start_time = time.time()
+
+    checkpoint = None
+    if resume is not None:
+        checkpoint = RunCheckpoint.resume(resume or None)
+        if checkpoint:
+            print(f"♻️ 実行 {checkpoint.run_id} を再開します")
+        else:
+            print("⚠️ 再開できる実行がないため新規に実行します")
+    if checkpoint is None:
+        checkpoint = RunCheckpoint.create(version=VERSION)
+        print(f"🆔 実行ID: {checkpoint.run_id}")
+
+    if profile:
+        enable_profiling(checkpoint.path('profile'))
+
+    # 実行期限（段階ごとの予算、足りない場合は縮退）
+    deadline = RunDeadline()
+
+    # キャッシュ読み込み（プロセス内で共有）
+    if cache is None:
+        cache = clean_cache(load_cache())
+
+    # 配信プロファイル（宛先ごとの銘柄）、収集・分析は全プロファイルの銘柄の和集合で1回だけ行う
+    profiles, stock_ids = load_delivery_targets()
+    if [delivery_profile['name'] for delivery_profile in profiles] != [DEFAULT_PROFILE]:
+        print(f"📮 配信プロファイル: {len(profiles)}件（対象銘柄 {len(stock_ids)}銘柄）")
+
+    # 1. ニュース収集（過去7日、歩留まりの低いフィードは間隔を空けて取得）
+    feed_stats = load_feed_stats()
+    polling_policy = load_polling_policy()
+    collected = not checkpoint.stage_done('collect')
+    deadline.begin_stage('collect')
+    with stage_timer('collect'), profile_stage('collect'):
+        if collected and collected_news is not None:
+            # 常駐モード: ポーリングで集めた記事を使う（フィード統計は常駐側で反映する）
+            all_news = collected_news
+            checkpoint.save_collected(all_news)
+            collected = False
+        elif collected:
+            poll_plan = select_feeds_to_poll(
+                feed_plan_for_stocks(FEED_PLAN, stock_ids), feed_stats, polling_policy)
+            all_news = collect_news_from_rss(
+                days=7, cache=cache, feed_plan=poll_plan, deadline=deadline)
+            checkpoint.save_collected(all_news)
+            save_cache(cache)
+        else:
+            all_news = checkpoint.load_collected()
+            print(f"♻️ 収集済みニュースを読み込みました: {len(all_news)}件")
+
+    # 記事を購読銘柄に振り分け
+    routed_news = route_news_by_stock(all_news, stock_ids)
+
+    # 銘柄×記事ごとの注釈（共有の記事レコードは変更しない）
+    overlay = AnnotationOverlay()
+
+    # 2. 銘柄ごとに処理（並列、完了した銘柄から保存し、結果は銘柄順に並べる）
+    # 直近7日で関連ニュースがなかった銘柄は、30日分をまとめて再収集してからもう一度並列処理する
+    # 段階の期限までに終わらなかった銘柄は今回の配信から外す
+    deadline.begin_stage('stocks')
+    results = {}
+    with stage_timer('stocks'), profile_stage('stocks'):
+        done_ids = [stock_id for stock_id in stock_ids if checkpoint.stock_done(stock_id)]
+        for stock_id in done_ids:
+            res = checkpoint.load_stock_result(stock_id)
+            if res:
+                results[stock_id] = res
+        if done_ids:
+            print(f"♻️ 処理済み銘柄を読み込みました: {len(done_ids)}銘柄")
+
+        pending_ids = [stock_id for stock_id in stock_ids if stock_id not in done_ids]
+        fallback_ids = process_stocks_parallel(
+            checkpoint, pending_ids, routed_news, cache, overlay, deadline, results)
+        if fallback_ids:
+            fallback_routed = collect_fallback_news(fallback_ids, cache, deadline)
+            process_stocks_parallel(
+                checkpoint, fallback_ids, fallback_routed, cache, overlay, deadline, results,
+                fallback_mode=True)
+
+    results = {stock_id: results[stock_id] for stock_id in stock_ids if stock_id in results}
+    if not checkpoint.stage_done('stocks') and all(
+            checkpoint.stock_done(stock_id) for stock_id in stock_ids):
+        checkpoint.mark_stage('stocks', delivered=len(results))
+
+    # 投資判断補助の分析結果を含めてキャッシュ保存
+    save_cache(cache)
+
+    # フィード歩留まり統計を更新（今回収集した場合のみ）
+    if collected:
+        save_feed_stats(update_feed_stats(feed_stats, polling_policy))
+
+    # 3. メール作成・送信（期限までに準備できた銘柄だけで送る）
+    deadline.begin_stage('render_send')
+    if deadline.degradations:
+        checkpoint.manifest.setdefault('degradations', []).extend(deadline.degradations)
+        checkpoint.save_manifest()
+        print(f"⏳ 縮退: {len(deadline.degradations)}件（runs/{checkpoint.run_id}/manifest.json に記録）")
+
+    deliveries = {}
+    if results:
+        with stage_timer('render'), profile_stage('render'):
+            render_delivery_emails(checkpoint, profiles, results)
+
+        # プレビュー保存（レンダリング済みファイルを複製）
+        for name in [delivery_profile['name'] for delivery_profile in profiles]:
+            if checkpoint.profile_rendered(name):
+                preview = html_filename(name).replace('email', 'email_preview', 1)
+                shutil.copyfile(checkpoint.path(html_filename(name)), preview)
+                print(f"💾 プレビューを保存しました: {preview}")
+
+        # 送信
+        with stage_timer('send'), profile_stage('send'):
+            deliveries = send_delivery_emails(
+                checkpoint, profiles, results, deadline.stage_remaining())
     else:
         print("❌ 配信対象ニュースがありませんでした")
 
+    delivery = summarize_deliveries(deliveries)
+    if delivery['status'] == 'sent':
+        checkpoint.mark_stage('send', status_code=delivery.get('status_code'),
+                              profiles=len(deliveries))
+    outbox_policy = load_outbox_policy()
+    if outbox_policy['enabled']:
+        delivery['outbox'] = outbox_counts(outbox_policy)
+
+    # 送信エラー以外は実行完了（送信エラー時は --resume で失敗したプロファイルだけ再送できる）
+    # アウトボックスに積んだメールは --resume ではなく次回の実行・--drain-outbox で再送する
+    if not [name for name, profile_delivery in deliveries.items()
+            if profile_delivery['status'] == 'failed' and not profile_delivery.get('outbox_keys')]:
+        checkpoint.mark_completed()
+
+    print_llm_usage_summary()
+    finish_profiling()
+
+    # 実行レポート（段階ごとの時間・レイテンシ・キャッシュヒット率）
+    report = build_run_report(
+        checkpoint.run_id, VERSION, STATS, results, deadline.degradations, delivery)
+    write_run_report(report)
+    print_run_report_summary(report)
+    print(f"📝 実行レポートを保存しました: {RUN_REPORT_FILE}")
+
+    # Prometheusメトリクス（node_exporter textfile collector 用）
+    try:
+        metrics_path = write_textfile(report)
+        if metrics_path:
+            print(f"📊 メトリクスを書き出しました: {metrics_path}")
+    except Exception as e:
+        print(f"⚠️ メトリクス書き出しエラー: {e}")
+
     elapsed = time.time() - start_time
     print(f"⏱️ 処理時間: {elapsed:.2f}秒")
 
 
+def merge_polled_news(store, news_list):
+    """
+    ポーリングで取得した記事を保持中の記事（記事URL → {'article', 'feed_meta'}）に統合
+    同じ記事が別のフィードから届いた場合は取得元フィードのメタデータを合わせる
+    記事はキャッシュと共有の記事レコードのまま保持し、メタデータは別に持つ
+
+    Returns:
+        int: 新しく保持した記事数
+    """
+    added = 0
+    for news in news_list:
+        entry = store.get(news['url'])
+        if entry is None:
+            store[news['url']] = {'article': source_article(news), 'feed_meta': news['feed_meta']}
+            added += 1
+        else:
+            entry['feed_meta'] = {
+                key: sorted(set(entry['feed_meta'].get(key, [])) | set(values))
+                for key, values in news['feed_meta'].items()}
+    return added
+
+
+def delivery_window(store, cache, days):
+    """
+    配信に使う記事（過去days日、キャッシュから削除された記事は保持もやめる）
+    近似重複の集約はポーリングをまたいで配信時に1回行う
+    保持中の記事レコードは何日も共有するため、取得元メタデータは配信ごとのビューに重ねる
+    """
+    cutoff = datetime.now(TW_TZ) - timedelta(days=days)
+    for url, entry in list(store.items()):
+        article = entry['article']
+        try:
+            expired = datetime.fromisoformat(article['date']) < cutoff
+        except (TypeError, ValueError):
+            expired = False
+        if expired or article['signature'] not in cache['news']:
+            del store[url]
+
+    news_list = [AnnotatedNews(entry['article'], {'feed_meta': entry['feed_meta']})
+                 for entry in store.values()]
+
+    near_duplicate_policy = load_near_duplicate_policy()
+    if near_duplicate_policy['enabled']:
+        news_list, collapsed = collapse_near_duplicates(
+            news_list, near_duplicate_policy['max_hamming_distance'],
+            near_duplicate_index(cache, near_duplicate_policy['max_hamming_distance']))
+        STATS['near_duplicate_collapsed'] += collapsed
+        if collapsed:
+            print(f"  🧬 近似重複を集約: {collapsed}件")
+    return news_list
+
+
+def poll_feeds_once(cache, store, feed_stats, polling_policy, feed_plan, days=7):
+    """
+    常駐モードの1回のポーリング（取り込み済みの記事はURL解決せず、新しい記事だけ処理する）
+
+    Returns:
+        int: 新しく保持した記事数
+    """
+    started = time.perf_counter()
+    poll_plan = select_feeds_to_poll(feed_plan, feed_stats, polling_policy)
+    news_list = collect_news_from_rss(
+        days=days, cache=cache, feed_plan=poll_plan, incremental=True)
+    mark_feeds_polled(feed_stats)
+    added = merge_polled_news(store, news_list)
+    print(f"🔄 ポーリング: 新規 {added}件 / 保持 {len(store)}件（{time.perf_counter() - started:.2f}秒）")
+    return added
+
+
+def reset_run_state():
+    """実行ごとの統計をクリア（常駐モードで配信ごとに実行レポートを分ける）"""
+    from email_section_cache import SECTION_STATS
+
+    for key in STATS:
+        STATS[key] = 0
+    for key in SECTION_STATS:
+        SECTION_STATS[key] = 0
+    reset_metrics()
+
+
+def run_daemon():
+    """
+    常駐モード: 記事・URL索引・HTTP接続・株価をメモリに保持したまま、
+    poll_interval_min ごとにフィードをポーリングして新しい記事だけを取り込み、
+    配信時刻（daemon_policy の delivery_times）に配信処理を行う
+    SIGTERM / Ctrl+C でキャッシュを保存して終了する
+    """
+    print(f"🛰️ 台湾株ニュース配信システム {VERSION} 常駐モード起動")
+    policy = load_daemon_policy()
+    polling_policy = load_polling_policy()
+    outbox_policy = load_outbox_policy()
+
+    cache = clean_cache(load_cache())
+    feed_stats = load_feed_stats()
+    _, stock_ids = load_delivery_targets()
+    # 記事URL → {'article', 'feed_meta'}（配信対象の期間だけ保持）
+    store = {}
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    next_delivery = next_delivery_time(policy)
+    next_poll = time.monotonic()
+    last_cleaned = last_saved = time.monotonic()
+    if next_delivery:
+        print(f"⏰ 次回配信: {next_delivery.strftime('%Y-%m-%d %H:%M')}")
+    else:
+        print("⚠️ 配信時刻（daemon_policy.delivery_times）が未設定のためポーリングのみ行います")
+
+    try:
+        while not stop.is_set():
+            delivery_due = next_delivery is not None and datetime.now(TW_TZ) >= next_delivery
+
+            # 1. ポーリング（配信時刻には配信前に必ず取得する）
+            if delivery_due or time.monotonic() >= next_poll:
+                try:
+                    poll_feeds_once(cache, store, feed_stats, polling_policy,
+                                    feed_plan_for_stocks(FEED_PLAN, stock_ids),
+                                    policy['retention_days'])
+                except Exception as e:
+                    print(f"⚠️ ポーリングエラー: {e}")
+                next_poll = time.monotonic() + policy['poll_interval_min'] * 60
+
+            # 2. 配信（銘柄ごとの処理・レンダリング・送信は通常の実行と同じ）
+            if delivery_due:
+                try:
+                    main(cache=cache,
+                         collected_news=delivery_window(store, cache, policy['retention_days']))
+                    save_feed_stats(update_feed_stats(feed_stats, polling_policy))
+                    last_saved = time.monotonic()
+                except Exception as e:
+                    print(f"❌ 配信処理エラー: {e}")
+                reset_run_yield()
+                reset_run_state()
+                # 配信プロファイルの変更は次の配信から反映する
+                _, stock_ids = load_delivery_targets()
+                next_delivery = next_delivery_time(policy)
+                if next_delivery:
+                    print(f"⏰ 次回配信: {next_delivery.strftime('%Y-%m-%d %H:%M')}")
+
+            # 3. 再送待ちのメール
+            if outbox_policy['enabled']:
+                try:
+                    outbox_stats = drain_outbox(
+                        get_sendgrid_client, outbox_policy, outbox_policy['drain_timeout_sec'])
+                    if outbox_stats['sent'] or outbox_stats['retry'] or outbox_stats['failed']:
+                        print_outbox_stats(outbox_stats)
+                except Exception as e:
+                    print(f"⚠️ アウトボックス送信エラー: {e}")
+
+            # 4. キャッシュの期限切れ削除・保存
+            if time.monotonic() - last_cleaned >= policy['cache_clean_interval_hours'] * 3600:
+                clean_cache(cache)
+                last_cleaned = time.monotonic()
+            if time.monotonic() - last_saved >= policy['cache_save_interval_min'] * 60:
+                save_cache(cache)
+                save_feed_stats(feed_stats)
+                last_saved = time.monotonic()
+
+            # 次のポーリング・配信まで待つ
+            wait = next_poll - time.monotonic()
+            if next_delivery is not None:
+                wait = min(wait, (next_delivery - datetime.now(TW_TZ)).total_seconds())
+            stop.wait(max(1.0, wait))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        save_cache(cache)
+        save_feed_stats(feed_stats)
+        print("🛑 常駐モードを終了しました（キャッシュを保存しました）")
+
+
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="台湾株ニュース配信システム")
+    arg_parser.add_argument(
+        '--resume', nargs='?', const='', default=None, metavar='RUN_ID',
+        help="途中終了した実行を再開（RUN_ID省略時は未完了の最新の実行）")
+    arg_parser.add_argument(
+        '--profile', action='store_true',
+        help="段階ごとに cProfile / tracemalloc で計測（runs/<RUN_ID>/profile/ に保存）")
+    arg_parser.add_argument(
+        '--daemon', action='store_true',
+        help="常駐モード（フィードを定期的にポーリングし、配信時刻に配信する）")
+    arg_parser.add_argument(
+        '--drain-outbox', action='store_true',
+        help="収集・分析は行わず、アウトボックスの未送信メールだけを送る")
+    arg_parser.add_argument(
+        '--retry-failed', action='store_true',
+        help="--drain-outbox で、再送を打ち切ったメール（outbox/failed）も送り直す")
+    args = arg_parser.parse_args()
+    if args.daemon:
+        run_daemon()
+    elif args.drain_outbox:
+        drain_outbox_main(retry_failed=args.retry_failed)
+    else:
+        main(resume=args.resume, profile=args.profile)
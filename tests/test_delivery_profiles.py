@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配信プロファイルの送信ペイロードの検証
+SendGridStandInServer（benchmarks/offline_backends.py）に送り、受け取った personalizations を確認する
+
+使い方:
+    python -m unittest discover tests
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+import delivery_profiles
+from delivery_profiles import DEFAULT_PROFILE, profile_sender, send_profile_digest
+
+HAS_SENDGRID = importlib.util.find_spec('sendgrid') is not None
+
+
+def make_profile(recipients, sender='digest@example.com', name='watchlist'):
+    profile = {'name': name, 'recipients': recipients, 'stocks': ['2330']}
+    if sender:
+        profile['sender'] = sender
+    return profile
+
+
+class ProfileSenderTest(unittest.TestCase):
+
+    def test_profile_sender_prefers_profile_then_env(self):
+        with mock.patch.dict(os.environ, {'SENDER_EMAIL': 'env@example.com'}):
+            self.assertEqual(profile_sender(make_profile(['a@example.com'])), 'digest@example.com')
+            self.assertEqual(
+                profile_sender(make_profile(['a@example.com'], sender=None)), 'env@example.com')
+
+    def test_named_profile_without_sender_is_rejected(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            with self.assertRaises(ValueError):
+                profile_sender(make_profile(['a@example.com'], sender=None))
+            # 既定のプロファイルだけは RECIPIENT_EMAIL 自身から送る
+            self.assertEqual(
+                profile_sender(make_profile(['me@example.com'], None, DEFAULT_PROFILE)),
+                'me@example.com')
+
+
+@unittest.skipUnless(HAS_SENDGRID, "sendgrid がインストールされていません")
+class DigestPayloadTest(unittest.TestCase):
+
+    def setUp(self):
+        from offline_backends import SendGridStandInServer
+        from sendgrid import SendGridAPIClient
+        self.server = SendGridStandInServer().start()
+        self.client = SendGridAPIClient('SG.test', host=self.server.base_url)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_one_personalization_per_recipient(self):
+        recipients = [f"reader{i}@example.com" for i in range(3)]
+        status_code = send_profile_digest(
+            self.client, make_profile(recipients), '<p>digest</p>', 'subject')
+
+        self.assertEqual(status_code, 202)
+        self.assertEqual(len(self.server.sent), 1)
+        payload = self.server.sent[0]
+        self.assertEqual(payload['from']['email'], 'digest@example.com')
+        self.assertEqual(payload['subject'], 'subject')
+        # 宛先同士が見えないよう、personalization ごとに宛先は1件
+        self.assertEqual([[to['email'] for to in personalization['to']]
+                          for personalization in payload['personalizations']],
+                         [[recipient] for recipient in recipients])
+        self.assertEqual(payload['content'][0]['value'], '<p>digest</p>')
+
+    def test_batches_split_at_limit_and_skip_sent(self):
+        recipients = [f"reader{i}@example.com" for i in range(5)]
+        sent = []
+        with mock.patch.object(delivery_profiles, 'MAX_PERSONALIZATIONS', 2):
+            send_profile_digest(
+                self.client, make_profile(recipients), '<p>digest</p>', 'subject',
+                sent_batches={0}, on_sent=lambda batch, code: sent.append((batch, code)))
+
+        self.assertEqual(sent, [(1, 202), (2, 202)])
+        self.assertEqual(sorted(self.server.recipients()), recipients[2:])
+        self.assertEqual([len(payload['personalizations']) for payload in self.server.sent], [2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
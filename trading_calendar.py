@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TWSE 取引カレンダーモジュール
+twse_calendar.json（同梱データ）から休場日を読み込み、営業日判定を行う
+- 土日・休場日は株価更新と投資判断補助の再生成をスキップするために使用
+- 連休明けの「前営業日終値」の特定に使用
+"""
+
+import json
+from datetime import datetime, date, timedelta
+import pytz
+
+# 台湾時間
+TW_TZ = pytz.timezone('Asia/Taipei')
+
+CALENDAR_FILE = 'twse_calendar.json'
+
+# 営業日探索の上限（春節などの長期休場でも十分な日数）
+MAX_LOOKBACK_DAYS = 30
+
+_calendar = None
+
+# 休場日が未登録の年（警告は年ごとに1回だけ出す）
+_warned_years = set()
+
+
+def load_trading_calendar():
+    """twse_calendar.jsonから休場日・補行交易日を読み込む（初回のみ）"""
+    global _calendar
+    if _calendar is not None:
+        return _calendar
+
+    holidays = set()
+    extra_trading_days = set()
+    years = set()
+    try:
+        with open(CALENDAR_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for year, days in data.get('holidays', {}).items():
+            years.add(int(year))
+            holidays.update(date.fromisoformat(d) for d in days)
+        extra_trading_days.update(
+            date.fromisoformat(d) for d in data.get('extra_trading_days', []))
+    except FileNotFoundError:
+        print(f"⚠️ {CALENDAR_FILE} が見つかりません（土日のみで営業日判定します）")
+    except (json.JSONDecodeError, ValueError) as e:
+        print(f"⚠️ {CALENDAR_FILE} の形式が不正です: {e}（土日のみで営業日判定します）")
+
+    _calendar = {
+        'holidays': holidays,
+        'extra_trading_days': extra_trading_days,
+        'years': years
+    }
+    return _calendar
+
+
+def _to_date(day):
+    """date / datetime / None（台湾時間の今日）をdateに変換"""
+    if day is None:
+        return datetime.now(TW_TZ).date()
+    if isinstance(day, datetime):
+        if day.tzinfo is not None:
+            day = day.astimezone(TW_TZ)
+        return day.date()
+    return day
+
+
+def is_trading_day(day=None):
+    """
+    指定日がTWSEの営業日かどうかを判定する
+
+    Args:
+        day: date / datetime（省略時は台湾時間の今日）
+
+    Returns:
+        True / False
+    """
+    day = _to_date(day)
+    calendar = load_trading_calendar()
+
+    if day in calendar['extra_trading_days']:
+        return True
+    if day.weekday() >= 5:
+        return False
+    if calendar['years'] and day.year not in calendar['years'] \
+            and day.year not in _warned_years:
+        print(f"⚠️ {day.year}年の休場日が {CALENDAR_FILE} に未登録です（土日のみで判定）")
+        _warned_years.add(day.year)
+    return day not in calendar['holidays']
+
+
+def previous_trading_day(day=None):
+    """指定日より前の直近営業日を返す"""
+    day = _to_date(day)
+    for _ in range(MAX_LOOKBACK_DAYS):
+        day -= timedelta(days=1)
+        if is_trading_day(day):
+            return day
+    return day
+
+
+def last_trading_day(day=None):
+    """指定日が営業日ならその日、休場日なら直前の営業日を返す"""
+    day = _to_date(day)
+    if is_trading_day(day):
+        return day
+    return previous_trading_day(day)